@@ -15,6 +15,7 @@ from datetime import timedelta
 import dj_database_url
 from decouple import config
 import os
+import tempfile
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -93,6 +94,11 @@ if USE_SQLITE:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Lets sharded fetch_video_data workers wait for each other's writes instead of failing
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 30,
+            },
         }
     }
 else:
@@ -100,6 +106,9 @@ else:
         'default': dj_database_url.config(default=config('DATABASE_URL'))
     }
 
+# PostgreSQL only: store MonthlyViews partitioned by year (see the partition_monthly_views command)
+PARTITION_MONTHLY_VIEWS = os.getenv("PARTITION_MONTHLY_VIEWS", "False") == "True"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,6 +146,13 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Exports proxied from the HiHaHo API, keyed by each video's last-ingested payload fingerprints. Kept out of the
+# source tree, exports unused for EXPORT_CACHE_MAX_AGE_DAYS are dropped and then the least recently used ones
+# while the cache is over EXPORT_CACHE_MAX_MB
+EXPORT_CACHE_DIR = os.getenv('EXPORT_CACHE_DIR', Path(tempfile.gettempdir()) / 'video_stats_export_cache')
+EXPORT_CACHE_MAX_BYTES = int(os.getenv('EXPORT_CACHE_MAX_MB', '1024')) * 1024 * 1024
+EXPORT_CACHE_MAX_AGE_DAYS = int(os.getenv('EXPORT_CACHE_MAX_AGE_DAYS', '30'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
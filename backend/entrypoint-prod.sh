@@ -17,11 +17,19 @@ done
 
 if [ "$RUN_FETCH_ONLY" = "1" ]; then
   echo "=== Starting fetch job ==="
-  python manage.py fetch_video_data
+  if [ "$PARTITION_MONTHLY_VIEWS" = "True" ]; then
+    python manage.py partition_monthly_views ${MONTHLY_VIEWS_KEEP_YEARS:+--keep-years "$MONTHLY_VIEWS_KEEP_YEARS"}
+  fi
+  python manage.py fetch_video_data --concurrency "${FETCH_CONCURRENCY:-1}" ${FETCH_SHARD:+--shard "$FETCH_SHARD"} ${FETCH_WORKERS:+--workers "$FETCH_WORKERS"} ${FETCH_SNAPSHOT:+--snapshot}
   echo "=== Fetch job complete ==="
   exit 0
 fi
 
+if [ "$RUN_INGEST_DAEMON" = "1" ]; then
+  echo "=== Starting ingestion daemon ==="
+  exec python manage.py ingest_daemon --concurrency "${FETCH_CONCURRENCY:-4}"
+fi
+
 echo "Database is ready. Running Django setup..."
 
 python manage.py makemigrations
@@ -0,0 +1,30 @@
+def bulk_upsert(model, objs, unique_fields, update_fields=None):
+    """Inserts or updates every object in one INSERT ... ON CONFLICT DO UPDATE statement.
+    update_fields defaults to every concrete field outside the unique key, so pass a narrower
+    list to leave columns of already existing rows untouched."""
+    if not objs:
+        return []
+
+    if update_fields is None:
+        update_fields = [
+            field.name for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in unique_fields
+        ]
+
+    return model.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=unique_fields,
+        update_fields=update_fields,
+    )
+
+def dedupe(objs, *key_fields):
+    """Keeps the last object per key, since one upsert statement can't touch the same row twice"""
+    by_key = {}
+    for obj in objs:
+        by_key[tuple(getattr(obj, field) for field in key_fields)] = obj
+    return list(by_key.values())
+
+def delete_stale(queryset, key_field, keep_keys):
+    """Deletes, in one statement, the rows of queryset whose key_field isn't in keep_keys"""
+    return queryset.exclude(**{f"{key_field}__in": list(keep_keys)}).delete()
@@ -0,0 +1,77 @@
+from django.conf import settings
+from pathlib import Path
+import tempfile
+import hashlib
+import time
+import os
+
+from .models import PayloadFingerprint
+
+CHUNK_SIZE = 64 * 1024
+
+def export_cache_dir():
+    return Path(settings.EXPORT_CACHE_DIR)
+
+def export_key(video_id):
+    """Combines the video's last-ingested payload fingerprints, so a cached export is dropped as soon as a fetch
+    sees the video change. None when the video has never been ingested and there's nothing to key on."""
+    digests = PayloadFingerprint.objects.filter(video__video_id=video_id).order_by("endpoint").values_list("endpoint", "digest")
+    if not digests:
+        return None
+    return hashlib.sha256("".join(f"{endpoint}:{digest};" for endpoint, digest in digests).encode()).hexdigest()[:32]
+
+def cached_export(video_id, key):
+    """Returns the path of the cached export for this key, or None. Marks it as used, for prune_cache()"""
+    path = export_cache_dir() / f"{video_id}-{key}.json"
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+def prune_cache(cache_dir):
+    """Removes files not used for EXPORT_CACHE_MAX_AGE_DAYS, including temp files of interrupted writes, and then
+    the least recently used exports until the rest fits in EXPORT_CACHE_MAX_BYTES"""
+    unused_since = time.time() - settings.EXPORT_CACHE_MAX_AGE_DAYS * 24 * 3600
+    exports = []
+    for path in cache_dir.iterdir():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue # Removed by another worker in the meantime
+        if stat.st_mtime < unused_since:
+            path.unlink(missing_ok=True)
+        elif path.suffix == ".json":
+            exports.append((stat.st_mtime, stat.st_size, path))
+
+    size = sum(file_size for _, file_size, _ in exports)
+    for _, file_size, path in sorted(exports):
+        if size <= settings.EXPORT_CACHE_MAX_BYTES:
+            break
+        path.unlink(missing_ok=True)
+        size -= file_size
+
+def stream_and_cache(response, video_id, key):
+    """Yields the upstream body as it arrives, writing it to the cache at the same time.
+    The file only becomes visible once the whole body was received, and older exports of the video are removed,
+    as well as whatever prune_cache() finds over the limits."""
+    cache_dir = export_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    temp = tempfile.NamedTemporaryFile(dir=cache_dir, prefix=f".{video_id}-", suffix=".tmp", delete=False)
+    complete = False
+    try:
+        with temp:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                temp.write(chunk)
+                yield chunk
+        complete = True
+    finally:
+        response.close()
+        if complete:
+            for old in cache_dir.glob(f"{video_id}-*.json"):
+                old.unlink(missing_ok=True)
+            os.replace(temp.name, cache_dir / f"{video_id}-{key}.json")
+            prune_cache(cache_dir)
+        else:
+            # Client went away or the upstream failed mid-body
+            os.unlink(temp.name)
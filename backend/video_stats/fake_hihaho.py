@@ -0,0 +1,306 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from dateutil.relativedelta import relativedelta
+from datetime import date, datetime, timedelta
+from collections import Counter
+import threading
+import random
+import json
+import time
+import re
+
+from .hihaho_client import endpoint_name
+
+USER_AGENT_TEMPLATES = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{major}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{minor}.1 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS {minor}_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{minor}.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android {minor}; SM-S911B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{major}.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{major}.0) Gecko/20100101 Firefox/{major}.0",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+]
+
+class FakeCatalog:
+    """Synthetic, deterministic HiHaHo catalog. Every video's payloads are derived from the seed and
+    the video id on request, so memory stays flat however many videos are configured."""
+
+    def __init__(self, videos=100, interactions=5, questions=3, user_agents=200, page_size=50, seed=0, today=None):
+        self.videos = videos
+        self.interactions = interactions
+        self.questions = questions
+        self.page_size = page_size
+        self.seed = seed
+        self.today = today or date.today()
+
+        # A bounded pool of distinct strings that repeat across videos, like real traffic
+        rng = random.Random(seed)
+        self.user_agents = [
+            rng.choice(USER_AGENT_TEMPLATES).format(major=rng.randint(100, 130), minor=rng.randint(12, 18)) + f" build/{i}"
+            for i in range(user_agents)
+        ]
+
+    def _rng(self, video_id, salt=""):
+        return random.Random(f"{self.seed}:{video_id}:{salt}")
+
+    def video_ids(self):
+        return range(1, self.videos + 1)
+
+    def created_at(self, video_id):
+        days_old = self._rng(video_id, "created").randint(0, 5 * 365)
+        return datetime.combine(self.today, datetime.min.time()) - timedelta(days=days_old)
+
+    def listing_entry(self, video_id):
+        folder = video_id % 7
+        return {
+            "id": video_id,
+            "uuid": f"00000000-0000-0000-0000-{video_id:012d}",
+            "display_name": f"Synthetic video {video_id}",
+            "status": video_id % 5,
+            "video_container_id": folder,
+            "video_container": {"id": folder, "name": f"Folder {folder}"},
+            "created_at": self.created_at(video_id).strftime("%Y-%m-%dT%H:%M:%S.000000Z"),
+        }
+
+    def listing_page(self, page):
+        start = (page - 1) * self.page_size + 1
+        end = min(start + self.page_size, self.videos + 1)
+        return {
+            "data": [self.listing_entry(video_id) for video_id in range(start, end)],
+            "links": {"next": f"/v2/video?page={page + 1}" if end <= self.videos else None},
+            "meta": {"current_page": page, "per_page": self.page_size, "total": self.videos},
+        }
+
+    def video(self, video_id):
+        return {"data": {"id": video_id, "duration": self._rng(video_id, "duration").randint(30, 1800) * 1000}}
+
+    def interaction_ids(self, video_id):
+        return [video_id * 1000 + i for i in range(self.interactions)]
+
+    def question_ids(self, video_id):
+        return [video_id * 1000 + 500 + i for i in range(self.questions)]
+
+    def aggregated_statistics(self, video_id):
+        rng = self._rng(video_id, "aggregated")
+        views = rng.randint(0, 5000)
+        created_at = self.created_at(video_id).strftime("%Y-%m-%dT%H:%M:%S.000000Z")
+        interactions = [
+            {
+                "id": interaction_id,
+                "title": f"Interaction {interaction_id}",
+                "type": rng.choice(["button", "hotspot", "text", "image"]),
+                "action_type": rng.choice(["link", "jump", "none"]),
+                "start_time": i * 10.0,
+                "end_time": i * 10.0 + 5,
+                "duration": 5.0,
+                "link": "https://example.com",
+                "total_clicks": rng.randint(0, 500),
+                "created_at": created_at,
+            }
+            for i, interaction_id in enumerate(self.interaction_ids(video_id))
+        ]
+        questions = [
+            {
+                "id": question_id,
+                "title": f"<!--TINYMCE--><p>Question {question_id}?</p>",
+                "type": "rating" if i == self.questions - 1 else "mc",
+                "active_at": i * 20.0,
+                "amount_answers": rng.randint(0, 300),
+                "amount_correct_answers": rng.randint(0, 100),
+                "created_at": created_at,
+            }
+            for i, question_id in enumerate(self.question_ids(video_id))
+        ]
+        return {"data": {"aggregated_statistics": {
+            "views": views,
+            "started_views": views // 2,
+            "finished_views": views // 4,
+            "interactions": {"total_clicks": sum(i["total_clicks"] for i in interactions), "details": interactions},
+            "questions": {"count": len(questions), "details": questions},
+        }}}
+
+    def monthly_views(self, video_id, start_date=None, end_date=None):
+        first = self.created_at(video_id).date().replace(day=1)
+        last = self.today.replace(day=1)
+        if start_date:
+            first = max(first, datetime.strptime(start_date[:10], "%Y-%m-%d").date().replace(day=1))
+        if end_date:
+            last = min(last, datetime.strptime(end_date[:10], "%Y-%m-%d").date().replace(day=1))
+
+        months = []
+        month = first
+        while month <= last:
+            rng = self._rng(video_id, month.isoformat())
+            total = rng.randint(0, 300)
+            months.append({
+                "period": month.strftime("%Y-%m"),
+                "total": total,
+                "started": total // 2,
+                "finished": total // 3,
+                "passed": total // 5,
+                "failed": total // 10,
+                "unfinished": total - total // 3,
+            })
+            month += relativedelta(months=1)
+        return {"data": months}
+
+    def views_by_user_agent(self, video_id):
+        rng = self._rng(video_id, "agents")
+        agents = {ua: rng.randint(1, 50) for ua in rng.sample(self.user_agents, min(10, len(self.user_agents)))}
+        agents["unknown"] = rng.randint(0, 5)
+        return {"data": agents}
+
+    def interactions_stats(self, video_id):
+        rng = self._rng(video_id, "interactions")
+        return {"data": [
+            {
+                "id": interaction_id,
+                "title": f"Interaction {interaction_id}",
+                "start_time": i * 10.0,
+                "end_time": i * 10.0 + 5,
+                "link": "https://example.com",
+                "total_times_clicked": rng.randint(0, 500),
+            }
+            for i, interaction_id in enumerate(self.interaction_ids(video_id))
+        ]}
+
+    def questions_stats(self, video_id):
+        rng = self._rng(video_id, "questions")
+        questions = []
+        for i, question_id in enumerate(self.question_ids(video_id)):
+            if i == self.questions - 1:
+                answers = [{"label": str(star), "answered_count": rng.randint(0, 40), "is_correct_answer": False} for star in range(1, 6)]
+                questions.append({
+                    "id": question_id,
+                    "question_text": "How would you rate this video?",
+                    "question_type": "rating",
+                    "video_time": i * 20.0,
+                    "average_answer_time_seconds": rng.uniform(1, 10),
+                    "average_rating": round(rng.uniform(1, 5), 2),
+                    "total_given_answers": sum(a["answered_count"] for a in answers),
+                    "total_correct_answers": 0,
+                    "answers": answers,
+                })
+                continue
+
+            answers = [{"label": label, "answered_count": rng.randint(0, 100), "is_correct_answer": label == "A"} for label in "ABCD"]
+            # The real API sometimes repeats the correct answer with a zero count
+            answers.append({"label": "A", "answered_count": 0, "is_correct_answer": True})
+            questions.append({
+                "id": question_id,
+                "question_text": f"<!--TINYMCE--><p>Question {question_id}?</p>",
+                "question_type": "mc",
+                "video_time": i * 20.0,
+                "average_answer_time_seconds": rng.uniform(1, 10),
+                "total_given_answers": sum(a["answered_count"] for a in answers),
+                "total_correct_answers": answers[0]["answered_count"],
+                "answers": answers,
+            })
+        return {"data": questions}
+
+    def export(self, video_id):
+        return {
+            "video": self.listing_entry(video_id),
+            "interactions": self.aggregated_statistics(video_id)["data"]["aggregated_statistics"]["interactions"]["details"],
+            "questions": self.questions_stats(video_id)["data"],
+        }
+
+VIDEO_ROUTES = {
+    "": "video",
+    "/aggregated-statistics": "aggregated_statistics",
+    "/stats/views": "monthly_views",
+    "/stats/views-by-user-agent": "views_by_user_agent",
+    "/stats/interactions": "interactions_stats",
+    "/stats/questions": "questions_stats",
+    "/export": "export",
+}
+
+class FakeHihahoHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        path = url.path.removeprefix("/v2").rstrip("/")
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        server.count(endpoint_name(path))
+
+        latency = server.latency + server.rng_uniform(0, server.jitter)
+        if latency:
+            time.sleep(latency)
+
+        status = server.fail(endpoint_name(path), params) if server.fail else None
+        if status:
+            return self.send_json(status, {"message": "Injected failure"})
+
+        if server.error_rate and server.rng_uniform(0, 1) < server.error_rate:
+            if server.rng_uniform(0, 1) < 0.5:
+                return self.send_json(429, {"message": "Too Many Attempts."}, {"Retry-After": "0"})
+            return self.send_json(503, {"message": "Service Unavailable"})
+
+        catalog = server.catalog
+        if path == "/video":
+            return self.send_json(200, catalog.listing_page(int(params.get("page", 1))))
+
+        match = re.fullmatch(r"/video/(\d+)(/.*)?", path)
+        route = VIDEO_ROUTES.get(match.group(2) or "") if match else None
+        video_id = int(match.group(1)) if match else None
+        if route is None or not 1 <= video_id <= catalog.videos:
+            return self.send_json(404, {"message": "Not found"})
+
+        if route == "monthly_views":
+            return self.send_json(200, catalog.monthly_views(video_id, params.get("start_date"), params.get("end_date")))
+        return self.send_json(200, getattr(catalog, route)(video_id))
+
+class FakeHihahoServer(ThreadingHTTPServer):
+    """Local stand-in for the HiHaHo v2 API serving a FakeCatalog, with injectable latency and errors.
+    fail, when set, is called with the endpoint name and query params and returns an HTTP status to answer with
+    instead, or None, for failures on chosen endpoints."""
+    daemon_threads = True
+
+    def __init__(self, catalog, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, fail=None):
+        super().__init__((host, port), FakeHihahoHandler)
+        self.catalog = catalog
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fail = fail
+        self.request_counts = Counter()
+        self._lock = threading.Lock()
+        self._rng = random.Random(catalog.seed)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v2"
+
+    def count(self, endpoint):
+        with self._lock:
+            self.request_counts[endpoint] += 1
+
+    def rng_uniform(self, low, high):
+        with self._lock:
+            return self._rng.uniform(low, high)
+
+    def start(self):
+        """Serves from a background thread, for use inside another process"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
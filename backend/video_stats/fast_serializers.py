@@ -0,0 +1,76 @@
+from rest_framework import serializers
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError: # FastJSONRenderer falls back to DRF's json encoding
+    orjson = None
+
+# Fields whose output is the database value as it comes out of values_list(), or a plain cast of it
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.BooleanField)
+CAST_FIELDS = ((serializers.IntegerField, int), (serializers.FloatField, float))
+ITERATOR_CHUNK_SIZE = 2000
+
+class ValuesPlan:
+    """Flattens a ModelSerializer, nested serializers included, into the values_list() lookups it reads,
+    and builds the same output from the returned tuples without model instances or DRF field calls per value."""
+
+    def __init__(self, serializer_class):
+        self.lookups = []
+        self.shape = self._compile(serializer_class(), "")
+
+    def _compile(self, serializer, prefix):
+        shape = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == "*" or isinstance(field, serializers.ListSerializer):
+                raise ValueError(f"{type(serializer).__name__}.{name} can't be read with values_list()")
+            lookup = prefix + field.source.replace(".", "__")
+            if isinstance(field, serializers.BaseSerializer):
+                shape.append((name, None, self._compile(field, lookup + "__")))
+            else:
+                self.lookups.append(lookup)
+                # Only values that need formatting, like dates, go through the DRF field
+                convert = next((cast for field_class, cast in CAST_FIELDS if isinstance(field, field_class)), None)
+                if convert is None and not isinstance(field, PASSTHROUGH_FIELDS):
+                    convert = field.to_representation
+                shape.append((name, len(self.lookups) - 1, convert))
+        return shape
+
+    def row(self, values, shape=None):
+        row = {}
+        for name, index, convert in shape or self.shape:
+            if index is None:
+                row[name] = self.row(values, convert)
+            else:
+                value = values[index]
+                row[name] = value if convert is None or value is None else convert(value)
+        return row
+
+@lru_cache(maxsize=None)
+def values_plan(serializer_class):
+    return ValuesPlan(serializer_class)
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when it's installed, producing the same compact JSON"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=self.encoder_class().default)
+
+class ValuesListMixin:
+    """For ListAPIViews: reads the page straight into serializer_class's output with one values_list() query,
+    joins included, instead of loading model instances and querying each nested relation per row"""
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        plan = values_plan(self.get_serializer_class())
+        queryset = self.filter_queryset(self.get_queryset()).values_list(*plan.lookups)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response([plan.row(values) for values in page])
+        return Response([plan.row(values) for values in queryset.iterator(chunk_size=ITERATOR_CHUNK_SIZE)])
@@ -0,0 +1,96 @@
+from datetime import date, datetime
+from django.db.models import CharField, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from .search import search_terms, search_text
+
+ORDERING_PARAM = "ordering"
+
+def parse_bool(value):
+    if value.lower() in ("true", "1", "yes"):
+        return True
+    if value.lower() in ("false", "0", "no"):
+        return False
+    raise ValueError(value)
+
+def parse_day(value, end=False):
+    """Start, or last moment, of a YYYY-MM-DD day in the default timezone"""
+    day = date.fromisoformat(value)
+    return timezone.make_aware(datetime.combine(day, datetime.max.time() if end else datetime.min.time()))
+
+class ListFilter(BaseFilterBackend):
+    """Filters and sorts a list view by its query parameters, as declared on the view:
+    search_fields: lookups ?search= terms are matched in (case-insensitive contains, any term matches). Lookups of a
+        search_title column are matched with the terms in search_text() form, the way title search matches them
+    search_id_field: lookup numeric ?search= terms also match, anywhere in its digits like the frontend's search did
+    date_field: lookup ?start_date= and ?end_date= (YYYY-MM-DD, inclusive) apply to
+    range_fields: {name: (lookup, type)} for ?min_<name>= and ?max_<name>=
+    choice_fields: {name: (lookup, type)} for ?<name>=, repeatable to allow several values
+    ordering_fields: {name: lookup} for ?ordering=name,-name, always ending with id to keep the order stable"""
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        try:
+            queryset = self.search(queryset, params.get("search", ""), view)
+            queryset = self.filter_fields(queryset, params, view)
+        except ValueError:
+            raise ValidationError({"error": (
+                "Dates must look like YYYY-MM-DD, ranges must be numbers and choices must match the field "
+                "(numbers, or true/false for yes/no fields)"
+            )})
+        return self.order(queryset, params.get(ORDERING_PARAM), view)
+
+    def search(self, queryset, query, view):
+        terms = search_terms(query)
+        if not terms:
+            return queryset
+        search_fields = getattr(view, "search_fields", ())
+        id_field = getattr(view, "search_id_field", None)
+        if id_field and any(term.isdigit() for term in terms):
+            queryset = queryset.alias(search_id=Cast(id_field, CharField()))
+        condition = Q()
+        for term in terms:
+            normalized = search_text(term)
+            for field in search_fields:
+                if field.split("__")[-1] != "search_title":
+                    condition |= Q(**{f"{field}__icontains": term})
+                elif normalized:
+                    condition |= Q(**{f"{field}__contains": normalized})
+            if id_field and term.isdigit():
+                condition |= Q(search_id__contains=term)
+        return queryset.filter(condition)
+
+    def filter_fields(self, queryset, params, view):
+        date_field = getattr(view, "date_field", None)
+        if date_field and params.get("start_date"):
+            queryset = queryset.filter(**{f"{date_field}__gte": parse_day(params["start_date"])})
+        if date_field and params.get("end_date"):
+            queryset = queryset.filter(**{f"{date_field}__lte": parse_day(params["end_date"], end=True)})
+
+        for name, (lookup, cast) in getattr(view, "range_fields", {}).items():
+            if params.get(f"min_{name}"):
+                queryset = queryset.filter(**{f"{lookup}__gte": cast(params[f"min_{name}"])})
+            if params.get(f"max_{name}"):
+                queryset = queryset.filter(**{f"{lookup}__lte": cast(params[f"max_{name}"])})
+
+        for name, (lookup, cast) in getattr(view, "choice_fields", {}).items():
+            values = [cast(value) for value in params.getlist(name) if value != ""]
+            if values:
+                queryset = queryset.filter(**{f"{lookup}__in": values})
+        return queryset
+
+    def order(self, queryset, ordering, view):
+        if not ordering:
+            return queryset
+        ordering_fields = getattr(view, "ordering_fields", {})
+        order_by = []
+        for name in ordering.split(","):
+            name = name.strip()
+            if name.lstrip("-") not in ordering_fields:
+                raise ValidationError({"error": f"ordering must be made of {', '.join(ordering_fields)}, optionally prefixed with -"})
+            order_by.append(("-" if name.startswith("-") else "") + ordering_fields[name.lstrip("-")])
+        if order_by[-1].lstrip("-") != "id":
+            order_by.append("id")
+        return queryset.order_by(*order_by)
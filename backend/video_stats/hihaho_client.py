@@ -0,0 +1,176 @@
+from requests.adapters import HTTPAdapter
+from email.utils import parsedate_to_datetime
+from collections import Counter
+from datetime import datetime, timezone
+import threading
+import requests
+import random
+import time
+import re
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+BASE_URL = os.getenv("HIHAHO_API_URL", "https://api.hihaho.com/v2")
+CONNECT_TIMEOUT = float(os.getenv("HIHAHO_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HIHAHO_READ_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("HIHAHO_MAX_RETRIES", "5"))
+# Requests made while a user waits on a web worker, like the JSON export, give up much sooner
+INTERACTIVE_READ_TIMEOUT = float(os.getenv("HIHAHO_INTERACTIVE_READ_TIMEOUT", "10"))
+INTERACTIVE_MAX_RETRIES = int(os.getenv("HIHAHO_INTERACTIVE_MAX_RETRIES", "1"))
+INTERACTIVE_BACKOFF_MAX = 2.0
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class HihahoAPIError(Exception):
+    """Raised when a request still fails after every retry, so callers can tell
+    an upstream outage apart from an endpoint that simply has no data."""
+    def __init__(self, endpoint, message, status_code=None):
+        super().__init__(f"{endpoint}: {message}")
+        self.endpoint = endpoint
+        self.status_code = status_code
+
+def endpoint_name(path):
+    """Collapses ids out of a path so counters group by endpoint, e.g. /video/{id}/stats/views"""
+    return re.sub(r"/\d+", "/{id}", path.split("?")[0].rstrip("/")) or "/"
+
+class HihahoClient:
+    """Pooled, thread-safe client for the HiHaHo v2 API with timeouts and retry/backoff.
+    One instance should be shared by everything in a process so connections are kept alive."""
+
+    def __init__(self, token=None, base_url=BASE_URL, pool_size=10,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_base=0.5, backoff_max=30.0, telemetry=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.telemetry = telemetry
+
+        self.session = requests.Session()
+        # Retries are handled in get() so Retry-After and the counters see every attempt
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Authorization"] = f"Bearer {token if token is not None else os.getenv('API_KEY')}"
+
+        self._lock = threading.Lock()
+        self.request_counts = Counter()
+        self.error_counts = Counter()
+        self.retry_counts = Counter()
+
+    def _count(self, counter, endpoint):
+        with self._lock:
+            counter[endpoint] += 1
+
+    def _backoff_seconds(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), self.backoff_max)
+            except ValueError:
+                try:
+                    retry_at = parsedate_to_datetime(retry_after)
+                    wait = (retry_at - datetime.now(timezone.utc)).total_seconds()
+                    return min(max(wait, 0.0), self.backoff_max)
+                except (TypeError, ValueError):
+                    pass
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get(self, path, params=None, stream=False):
+        """GETs a path relative to the base URL and returns the Response.
+        Retries connection errors, timeouts, 429 and 5xx responses, raising HihahoAPIError when they run out.
+        Other 4xx responses are returned as is."""
+        endpoint = endpoint_name(path)
+        url = f"{self.base_url}/{path.lstrip('/')}"
+
+        attempt = 0
+        while True:
+            self._count(self.request_counts, endpoint)
+            response = None
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+                if self.telemetry:
+                    self.telemetry.record_request(
+                        endpoint,
+                        time.perf_counter() - start,
+                        response.status_code,
+                        0 if stream else len(response.content),
+                    )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if response.status_code >= 400:
+                        self._count(self.error_counts, endpoint)
+                    return response
+                error = f"HTTP {response.status_code}"
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+                if self.telemetry:
+                    self.telemetry.record_request(endpoint, time.perf_counter() - start, type(e).__name__)
+
+            self._count(self.error_counts, endpoint)
+            if attempt >= self.max_retries:
+                raise HihahoAPIError(
+                    endpoint,
+                    f"{error} after {attempt + 1} attempts",
+                    status_code=response.status_code if response is not None else None,
+                )
+
+            self._count(self.retry_counts, endpoint)
+            time.sleep(self._backoff_seconds(attempt, response))
+            attempt += 1
+
+    def get_json(self, path, params=None, raise_errors=False):
+        """Returns the decoded JSON body, or None when the endpoint answers with a non-retryable error or invalid JSON.
+        With raise_errors a 4xx response raises HihahoAPIError instead, for callers that must not mistake it for no data."""
+        response = self.get(path, params=params)
+        if response.status_code >= 400:
+            if raise_errors:
+                raise HihahoAPIError(endpoint_name(path), f"HTTP {response.status_code}", status_code=response.status_code)
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            self._count(self.error_counts, endpoint_name(path))
+            return None
+
+    def get_data(self, path, params=None, raise_errors=False):
+        """Returns the "data" member of the JSON body, or None when there is none"""
+        json_data = self.get_json(path, params=params, raise_errors=raise_errors)
+        if not isinstance(json_data, dict):
+            return None
+        return json_data.get("data") or None
+
+    def error_summary(self):
+        """Returns {endpoint: {"requests", "errors", "retries"}} for every endpoint called so far"""
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": self.request_counts[endpoint],
+                    "errors": self.error_counts[endpoint],
+                    "retries": self.retry_counts[endpoint],
+                }
+                for endpoint in sorted(self.request_counts)
+            }
+
+    def close(self):
+        self.session.close()
+
+_interactive_client = None
+_interactive_client_lock = threading.Lock()
+
+def get_interactive_client():
+    """Returns the process-wide client for requests served to a waiting user: a short read timeout, one retry by
+    default and a Retry-After capped at a couple of seconds, so a slow API can't tie up a web worker for minutes"""
+    global _interactive_client
+    with _interactive_client_lock:
+        if _interactive_client is None:
+            _interactive_client = HihahoClient(
+                read_timeout=INTERACTIVE_READ_TIMEOUT,
+                max_retries=INTERACTIVE_MAX_RETRIES,
+                backoff_max=INTERACTIVE_BACKOFF_MAX,
+            )
+        return _interactive_client
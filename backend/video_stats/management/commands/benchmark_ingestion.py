@@ -0,0 +1,107 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from video_stats.management.commands.run_fake_hihaho import add_catalog_arguments, build_server
+from video_stats.models import FetchRun
+from contextlib import redirect_stdout
+from io import StringIO
+import tracemalloc
+import json
+import time
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+class QueryCounter:
+    """Database execute wrapper that counts queries and the time spent in them"""
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - start
+
+class Command(BaseCommand):
+    help = ("Runs fetch_video_data against a local fake HiHaHo API in a throwaway test database "
+            "and reports wall time, HTTP calls, SQL queries and peak memory per run")
+
+    def add_arguments(self, parser):
+        add_catalog_arguments(parser)
+        parser.add_argument("--concurrency", type=int, default=8, help="Passed on to fetch_video_data")
+        parser.add_argument("--runs", type=int, default=2, help="Consecutive runs, the first one starts from an empty database")
+        parser.add_argument("--full", action="store_true", help="Pass --full to every run, not just the first")
+        parser.add_argument("--trace-memory", action="store_true", help="Also measure peak Python allocations with tracemalloc (slower)")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the benchmark database between invocations")
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        server = build_server(options).start()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+
+        results = []
+        try:
+            for run in range(options["runs"]):
+                server.request_counts.clear()
+                counter = QueryCounter()
+                if options["trace_memory"]:
+                    tracemalloc.start()
+
+                start = time.perf_counter()
+                # fetch_video_data prints every video id, keep that out of the report
+                with connection.execute_wrapper(counter), redirect_stdout(StringIO()):
+                    call_command(
+                        "fetch_video_data",
+                        api_url=server.base_url,
+                        concurrency=options["concurrency"],
+                        full=options["full"] or run == 0,
+                        ua_cache=None,
+                        stdout=StringIO(),
+                        stderr=StringIO(),
+                    )
+                wall_seconds = time.perf_counter() - start
+
+                result = {
+                    "run": run + 1,
+                    "wall_seconds": round(wall_seconds, 3),
+                    "http_requests": sum(server.request_counts.values()),
+                    "http_requests_by_endpoint": dict(sorted(server.request_counts.items())),
+                    "sql_queries": counter.queries,
+                    "sql_seconds": round(counter.seconds, 3),
+                    "summary": FetchRun.objects.exclude(finished_at=None).latest("finished_at").summary,
+                }
+                if options["trace_memory"]:
+                    result["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                if resource:
+                    # ru_maxrss is in kilobytes on Linux and the high-water mark of the whole process
+                    result["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                results.append(result)
+
+                self.stdout.write(
+                    f"Run {run + 1}: {result['wall_seconds']}s, {result['http_requests']} HTTP requests, "
+                    f"{result['sql_queries']} SQL queries ({result['sql_seconds']}s)"
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+            server.stop()
+
+        report = {
+            "catalog": {key: options[key] for key in ("videos", "interactions", "questions", "user_agents", "page_size", "seed")},
+            "latency_ms": options["latency_ms"],
+            "jitter_ms": options["jitter_ms"],
+            "error_rate": options["error_rate"],
+            "concurrency": options["concurrency"],
+            "runs": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        self.stdout.write(json.dumps(report, indent=2))
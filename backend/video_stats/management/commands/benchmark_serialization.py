@@ -0,0 +1,134 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from video_stats.fast_serializers import FastJSONRenderer, values_plan
+from video_stats.management.commands.benchmark_ingestion import QueryCounter
+from video_stats.models import InteractionStats, QuestionAnswer, QuestionStats, UserAgentProfile, Video, ViewSession
+from video_stats.serializers import InteractionStatsSerializer, QuestionAnswerSerializer, ViewSessionSerializer
+from video_stats.views import InteractionStatsListView, QuestionAnswerListView, ViewSessionListView
+import json
+import time
+
+ROWS_PER_VIDEO = 100
+ANSWERS_PER_QUESTION = 4
+BATCH_SIZE = 5000
+
+# Table: (model, serializer it's listed with, list view)
+TABLES = {
+    "view_sessions": (ViewSession, ViewSessionSerializer, ViewSessionListView),
+    "interactions": (InteractionStats, InteractionStatsSerializer, InteractionStatsListView),
+    "question_answers": (QuestionAnswer, QuestionAnswerSerializer, QuestionAnswerListView),
+}
+
+class Command(BaseCommand):
+    help = ("Fills a throwaway test database with synthetic rows and compares query count and latency of serializing "
+            "them with the nested DRF serializers against the values_list() path the list views use")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000], help="Row counts to measure (default 1000 10000 100000)")
+        parser.add_argument("--tables", nargs="+", choices=TABLES, default=list(TABLES), help="Tables to measure (default all)")
+        parser.add_argument("--skip-drf", action="store_true", help="Leave out the DRF serializer path, which runs a query per row")
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        user = get_user_model()(username="benchmark")
+
+        results = []
+        try:
+            for rows in options["rows"]:
+                # Every size starts from an empty database
+                with transaction.atomic():
+                    seed(rows)
+                    for table in options["tables"]:
+                        result = {"table": table, "rows": rows, **self.measure(table, user, options["skip_drf"])}
+                        results.append(result)
+                        self.stdout.write(
+                            f"{table} x {rows}: " + ", ".join(
+                                f"{path} {timing['ms']}ms / {timing['queries']} queries"
+                                for path, timing in result.items() if isinstance(timing, dict)
+                            )
+                        )
+                    transaction.set_rollback(True)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {"database": connection.vendor, "results": results}
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def measure(self, table, user, skip_drf):
+        model, serializer_class, view_class = TABLES[table]
+        timings = {}
+
+        if not skip_drf:
+            # What the list views did before: model instances, one query per nested relation and row
+            timings["drf"] = timed(lambda: JSONRenderer().render(serializer_class(model.objects.all(), many=True).data))
+
+        def values_path():
+            plan = values_plan(serializer_class)
+            rows = [plan.row(values) for values in model.objects.values_list(*plan.lookups).iterator(chunk_size=2000)]
+            return FastJSONRenderer().render(rows)
+        timings["values"] = timed(values_path)
+
+        # One page through the list view itself, pagination included
+        @override_settings(ALLOWED_HOSTS=["testserver"]) # Host of the next page links
+        def view_page():
+            request = APIRequestFactory().get("/")
+            force_authenticate(request, user=user)
+            return view_class.as_view()(request).render()
+        timings["view_page"] = timed(view_page)
+        return timings
+
+def timed(function):
+    counter = QueryCounter()
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        body = function()
+    return {
+        "ms": round((time.perf_counter() - start) * 1000, 1),
+        "queries": counter.queries,
+        "bytes": len(body.content if hasattr(body, "content") else body),
+    }
+
+def seed(rows):
+    """Creates rows view sessions, interactions and question answers, ROWS_PER_VIDEO of each per video"""
+    now = timezone.now()
+    videos = Video.objects.bulk_create([
+        Video(video_id=index, uuid=f"video-{index}", title=f"Video {index}", status=index % 5,
+              folder_name=f"Folder {index % 10}", folder_number=index % 10, created_date=now)
+        for index in range(max(1, rows // ROWS_PER_VIDEO))
+    ])
+    profiles = UserAgentProfile.objects.bulk_create([
+        UserAgentProfile(viewer_os=os_name, os_version=str(version), viewer_browser=browser, browser_version=f"{version}.0",
+                         viewer_device="N/A", viewer_mobile=os_name in ("iOS", "Android"), is_bot=False)
+        for os_name in ("Windows", "Mac OS X", "iOS", "Android") for browser in ("Chrome", "Firefox", "Safari") for version in range(5)
+    ])
+
+    ViewSession.objects.bulk_create([
+        ViewSession(video=videos[index % len(videos)], object_id=index, profile=profiles[index % len(profiles)], viewer_count=index % 50)
+        for index in range(rows)
+    ], batch_size=BATCH_SIZE)
+    InteractionStats.objects.bulk_create([
+        InteractionStats(video=videos[index % len(videos)], interaction_id=index, title=f"Interaction {index}", type="link",
+                         action_type="open_link", start_time_seconds=1.5, end_time_seconds=4.5, duration_seconds=3.0,
+                         link="https://example.com", total_clicks=index % 100, created_at=now)
+        for index in range(rows)
+    ], batch_size=BATCH_SIZE)
+    questions = QuestionStats.objects.bulk_create([
+        QuestionStats(video=videos[index % len(videos)], question_id=index, title=f"Question {index}", type="multiple_choice",
+                      video_time_seconds=10.0, average_answer_time_seconds=4.2, total_answered=index % 100,
+                      total_correctly_answered=index % 50, created_at=now)
+        for index in range(max(1, rows // ANSWERS_PER_QUESTION))
+    ], batch_size=BATCH_SIZE)
+    QuestionAnswer.objects.bulk_create([
+        QuestionAnswer(question=question, label=f"Answer {answer}", answered_count=answer, is_correct_answer=answer == 0)
+        for question in questions for answer in range(ANSWERS_PER_QUESTION)
+    ], batch_size=BATCH_SIZE)
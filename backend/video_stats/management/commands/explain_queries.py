@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.urls import URLPattern
+from rest_framework.generics import GenericAPIView
+from rest_framework.test import APIRequestFactory
+from video_stats.fast_serializers import ValuesListMixin, values_plan
+from video_stats.models import QuestionStats, Video
+from video_stats.urls import urlpatterns
+
+class Command(BaseCommand):
+    help = "Prints the database's EXPLAIN plan for the query behind every list API view, to check which indexes are used"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--video-id", type=int, help="HiHaHo video id for the per-video views (default: the first stored video)")
+        parser.add_argument("--question-id", type=int, help="HiHaHo question id for the per-question views (default: the first stored question)")
+        parser.add_argument("--view", help="Only explain the URL pattern with this name, e.g. video_interactions")
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Run the queries and show actual row counts and timings (PostgreSQL EXPLAIN ANALYZE)",
+        )
+
+    def handle(self, *args, **options):
+        sample_kwargs = {
+            "video_id": options["video_id"] or Video.objects.order_by("video_id").values_list("video_id", flat=True).first() or 0,
+            "question_id": options["question_id"] or QuestionStats.objects.order_by("question_id").values_list("question_id", flat=True).first() or 0,
+        }
+        explain_options = {"analyze": True} if options["analyze"] and connection.vendor == "postgresql" else {}
+        request = APIRequestFactory().get("/")
+
+        for pattern in urlpatterns:
+            if not isinstance(pattern, URLPattern) or (options["view"] and pattern.name != options["view"]):
+                continue
+            view_class = getattr(pattern.callback, "view_class", None)
+            if view_class is None or not issubclass(view_class, GenericAPIView):
+                continue
+
+            kwargs = {name: sample_kwargs.get(name) for name in pattern.pattern.converters}
+            view = view_class(args=(), kwargs=kwargs, format_kwarg=None)
+            # The DRF Request the view would get, filter backends read its query_params
+            view.request = view.initialize_request(request)
+            queryset = view.filter_queryset(view.get_queryset())
+            if isinstance(view, ValuesListMixin):
+                queryset = queryset.values_list(*values_plan(view.get_serializer_class()).lookups)
+            # Paginated views only read one page per request
+            if view.paginator is not None:
+                queryset = queryset[:view.paginator.page_size]
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{pattern.name} ({view_class.__name__}) {kwargs or ''}"))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
@@ -1,29 +1,137 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
 from video_stats.models import *
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, deque
 from dateutil import parser
 from datetime import date
-from user_agents import parse
-import requests
+from dateutil.relativedelta import relativedelta
+from contextlib import nullcontext
+from io import StringIO
+from video_stats.hihaho_client import BASE_URL, HihahoAPIError, HihahoClient
+from video_stats.bulk_writer import bulk_upsert, dedupe, delete_stale
+from video_stats.ua_cache import UserAgentCache
+from video_stats.telemetry import RunTelemetry
+from video_stats.refresh_schedule import RefreshPolicy
+from video_stats.snapshot import SnapshotError, StagingSnapshot
+from video_stats.rollups import refresh_rollups
+from video_stats.search import search_text
+import subprocess
+import cProfile
+import pstats
+import time
+import threading
+import argparse
 import warnings
+import hashlib
+import json
+import sys
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
-token = os.getenv('API_KEY')
-BASE_URL = "https://api.hihaho.com/v2"
-headers = {"Authorization": f"Bearer {token}"}
+def last_finalized_month(today=None):
+    """Months before the previous one are closed and their views no longer change"""
+    today = today or date.today()
+    return (today.replace(day=1) - relativedelta(months=2)).strftime("%Y-%m")
 
-def get_data_safe(url, params=None):
+def period_month(period):
+    """Turns a 'YYYY-MM' period from stats/views into the first day of that month"""
+    year, month = map(int, period.split("-")[:2])
+    return date(year, month, 1)
+
+def payload_digest(data):
+    """Stable hash of a decoded payload, independent of key order"""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def parse_shard(value):
+    """Parses a K/N shard spec into (K, N)"""
     try:
-        response = requests.get(url, headers=headers, params=params)
-        json_data = response.json()
-        data = json_data.get("data")
-        if not data:
-            return None
-        return data
-    except Exception as e:
-        print(f"Failed to fetch from {url}: {e}")
-        return None
+        index, count = map(int, value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like K/N, got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard {value!r} needs 0 <= K < N")
+    return index, count
+
+def merge_summaries(summaries):
+    """Adds up the counters of several run summaries, nested dicts included"""
+    merged = {}
+    for summary in summaries:
+        for key, value in summary.items():
+            if isinstance(value, dict):
+                merged[key] = merge_summaries([merged.get(key, {}), value])
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+def iter_videos(client):
+    """Yields videos from the paginated /video listing as each page arrives, stopping after the last or an empty page.
+    Raises HihahoAPIError when a page fails, since the videos after it would silently go missing otherwise."""
+    page_count = 1
+    while True:
+        response = client.get_json("/video",
+            params={
+                "page": page_count,
+                "order": "asc",
+            })
+        page_count += 1
+
+        if not isinstance(response, dict):
+            raise HihahoAPIError("/video", f"no valid response for page {page_count - 1}")
+
+        page = response.get("data")
+        if not page:
+            return
+
+        yield from page
+
+        if not (response.get("links") or {}).get("next"):
+            return
+
+# Columns stats/interactions and stats/questions fill in
+INTERACTION_STATS_FIELDS = ("title", "start_time_seconds", "end_time_seconds", "duration_seconds", "link", "total_clicks")
+QUESTION_STATS_FIELDS = ("title", "search_title", "type", "video_time_seconds", "average_answer_time_seconds", "total_answered", "total_correctly_answered")
+
+VIDEO_ENDPOINT_NAMES = (
+    "video",
+    "aggregated_statistics",
+    "monthly_views",
+    "views_by_user_agent",
+    "interactions",
+    "questions",
+)
+
+def video_endpoints(v, finalized_month=None):
+    """Returns the (path, params) of every per-video endpoint, keyed by name.
+    None of these calls depend on each other, so they can all be fetched at once.
+    With a finalized_month watermark only the months after it are requested from stats/views."""
+    video_id = v.get("id")
+
+    # Start and end dates
+    today = date.today()
+    raw_start = v.get("created_at")
+    start_date = raw_start.split("T")[0] + " 00:00:00"
+    end_date = today.strftime("%Y-%m-%d") + " 23:59:59"
+
+    if finalized_month:
+        year, month = map(int, finalized_month.split("-"))
+        window_start = (date(year, month, 1) + relativedelta(months=1)).strftime("%Y-%m-%d") + " 00:00:00"
+        start_date = max(start_date, window_start)
+
+    return {
+        "video": (f"/video/{video_id}", None),
+        "aggregated_statistics": (f"/video/{video_id}/aggregated-statistics", None),
+        "monthly_views": (f"/video/{video_id}/stats/views", {
+            "group_by": "month",
+            "start_date": start_date,
+            "end_date": end_date
+        }),
+        "views_by_user_agent": (f"/video/{video_id}/stats/views-by-user-agent", None),
+        "interactions": (f"/video/{video_id}/stats/interactions/", None),
+        "questions": (f"/video/{video_id}/stats/questions/", None),
+    }
 
 class Command(BaseCommand):
     warnings.filterwarnings(
@@ -33,290 +141,666 @@ class Command(BaseCommand):
         module='django.db.models.fields'
     )
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Number of HiHaHo API requests to run at the same time (default 1, sequential)",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Re-fetch monthly views for every month since each video was created instead of only the open months, "
+                 "and rewrite every video even when its payloads are unchanged",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue the last run that didn't finish, skipping the videos it already completed",
+        )
+        parser.add_argument(
+            "--ua-cache",
+            default=os.getenv("UA_CACHE_PATH"),
+            help="File to keep parsed user agents in between runs (default $UA_CACHE_PATH, in memory only if unset)",
+        )
+        parser.add_argument(
+            "--shard",
+            type=parse_shard,
+            default=None,
+            help="Only fetch the videos whose id %% N == K, given as K/N, e.g. 0/4",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Start this many local worker processes, one shard each, and merge their summaries",
+        )
+        parser.add_argument(
+            "--api-url",
+            default=BASE_URL,
+            help="HiHaHo API base URL (default $HIHAHO_API_URL or the production API)",
+        )
+        parser.add_argument(
+            "--report",
+            help="Write a JSON telemetry report (HTTP latency per endpoint, SQL per model, time per video, memory) to this file",
+        )
+        parser.add_argument(
+            "--trace-memory",
+            action="store_true",
+            help="Include peak Python allocations from tracemalloc in the report (slower)",
+        )
+        parser.add_argument(
+            "--profile",
+            help="Run under cProfile, save the stats to this file and print the top functions",
+        )
+        parser.add_argument(
+            "--snapshot",
+            action="store_true",
+            help="Load the run into staging tables and publish them all at once at the end, "
+                 "so the dashboard never reads a half-updated database",
+        )
+        parser.add_argument("--coordinator-run", type=int, default=None, help=argparse.SUPPRESS)
+
     def handle(self, *args, **kwargs):
-        videos = []
-
-        page_count = 1
-        while True:
-            response = requests.get(f"{BASE_URL}/video",
-                headers=headers,
-                params={
-                    "page": page_count,
-                    "order": "asc",
-                }).json()
-            page_count += 1
-
-            if response.get("data"):
-                videos = videos + response.get("data", {})
-
-            if response.get("links") and response.get("links", {}).get("next") is None:
-                break
-
-        for v in videos:
-            video_id = v.get("id")
-            title = v.get("display_name", "")
-            container = v.get("video_container")
-            container_name = ""
-            container_id = 0
-            if container:
-                container_name = container.get("name")
-                container_id = container.get("id")
-
-            video_obj, _ = Video.objects.update_or_create(
-                video_id=video_id, # lookup field for updating
-                defaults={
-                    "uuid": v.get("uuid"),
-                    "title": title,
-                    "status": v.get("status"),
-                    "folder_name":container_name,
-                    "folder_number":container_id,
-                    "created_date":parser.parse(v.get("created_at")),
+        if kwargs.get("snapshot") and (kwargs.get("shard") or kwargs.get("workers", 1) > 1):
+            raise CommandError("--snapshot loads one set of staging tables and can't be combined with --shard or --workers")
+        if kwargs.get("workers", 1) > 1:
+            if kwargs.get("shard"):
+                raise CommandError("--workers starts its own shards and can't be combined with --shard")
+            return self.coordinate(kwargs)
+
+        if not kwargs.get("profile"):
+            return self.fetch(kwargs)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(self.fetch, kwargs)
+        finally:
+            profiler.dump_stats(kwargs["profile"])
+            self.stdout.write(f"Profile saved to {kwargs['profile']}, top functions by cumulative time:")
+            output = StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(25)
+            self.stdout.write(output.getvalue())
+
+    def fetch(self, kwargs):
+        shard = kwargs.get("shard")
+        shard_label = f"{shard[0]}/{shard[1]}" if shard else ""
+        concurrency = max(1, kwargs.get("concurrency") or 1)
+        telemetry = RunTelemetry(trace_memory=kwargs.get("trace_memory"))
+        client = HihahoClient(base_url=kwargs.get("api_url") or BASE_URL, pool_size=concurrency, telemetry=telemetry)
+        self.ua_cache = UserAgentCache(path=kwargs.get("ua_cache"))
+
+        run = None
+        completed_videos = set()
+        if kwargs.get("resume"):
+            run = FetchRun.objects.filter(finished_at=None, shard=shard_label).order_by("-started_at").first()
+            if run is None:
+                self.stdout.write("No unfinished run to resume, starting a new one")
+            else:
+                completed_videos = {
+                    video_id
+                    for video_id, endpoints in run.checkpoints.values_list("video_id", "completed_endpoints")
+                    if set(endpoints) >= set(VIDEO_ENDPOINT_NAMES)
                 }
+                self.stdout.write(f"Resuming run {run.id} started at {run.started_at}, {len(completed_videos)} videos already completed")
+                if kwargs.get("coordinator_run"):
+                    run.coordinator_id = kwargs["coordinator_run"]
+                    run.save(update_fields=["coordinator"])
+        if run is None:
+            run = FetchRun.objects.create(
+                full=bool(kwargs.get("full")),
+                snapshot=bool(kwargs.get("snapshot")),
+                shard=shard_label,
+                coordinator_id=kwargs.get("coordinator_run"),
             )
-            print(f"{video_id} {v.get("video_container_id")}")
 
-            v_data = get_data_safe(f"{BASE_URL}/video/{video_id}")
-            if v_data:
-                v_duration = v_data.get("duration")
-                # Initialize VideoStats object even when no aggregated stats
-                VideoStats.objects.update_or_create(
-                    video=video_obj,
-                    defaults={
-                        "total_views":0,
-                        "started_views":0,
-                        "finished_views":0,
-                        "interaction_clicks":0,
-                        "num_questions":0,
-                        "video_duration_seconds":round(v_duration/1000, 2) or 11.11,
+        snapshot = None
+        if run.snapshot:
+            try:
+                snapshot = StagingSnapshot()
+            except SnapshotError as e:
+                raise CommandError(str(e))
+            if not (completed_videos and snapshot.exists()):
+                if completed_videos:
+                    self.stdout.write("The staging tables of the resumed run are gone, fetching every video again")
+                    completed_videos = set()
+                snapshot.create()
+
+        with snapshot.redirect() if snapshot else nullcontext():
+            self.prepare(run)
+            videos = (
+                v for v in iter_videos(client)
+                if (not shard or v.get("id") % shard[1] == shard[0]) and v.get("id") not in completed_videos
+            )
+            try:
+                video_ids = self.ingest(client, videos, run, telemetry, concurrency)
+            except HihahoAPIError as e:
+                # The run stays unfinished with its checkpoints, and an unfinished snapshot is never published
+                raise CommandError(f"Listing the videos failed ({e}), rerun with --resume to finish run {run.id}")
+            # A full pass counts as a refresh, so the ingestion daemon doesn't fetch the same videos again right away
+            RefreshPolicy().schedule(video_ids)
+            # With --workers the coordinator refreshes the rollups once every shard is done
+            if not kwargs.get("coordinator_run"):
+                refresh_rollups()
+        if snapshot:
+            snapshot.publish()
+            self.stdout.write("Published the snapshot")
+
+        client.close()
+        self.ua_cache.save()
+        summary = self.build_summary(client)
+
+        # Checkpoints are only needed to resume, so a finished run keeps just its FetchRun row and summary
+        run.finished_at = timezone.now()
+        run.summary = summary
+        run.save(update_fields=["finished_at", "summary"])
+        run.checkpoints.all().delete()
+
+        if kwargs.get("report"):
+            report = {"run": run.id, "shard": run.shard, **telemetry.report(client), "summary": summary}
+            with open(kwargs["report"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Telemetry report written to {kwargs['report']}")
+        telemetry.stop()
+
+        self.write_summary(summary)
+        self.stdout.write(self.style.SUCCESS("Successfully fetched video data"))
+
+    def prepare(self, run, video_ids=None):
+        """Loads the watermarks and fingerprints a run compares against and resets the run counters.
+        With video_ids only those videos' state is loaded."""
+        self.finalized_months = {}
+        self.fingerprints = {}
+        if not run.full:
+            sync_states = VideoSyncState.objects.exclude(last_finalized_month=None)
+            fingerprints = PayloadFingerprint.objects.all()
+            if video_ids is not None:
+                sync_states = sync_states.filter(video__video_id__in=video_ids)
+                fingerprints = fingerprints.filter(video__video_id__in=video_ids)
+            self.finalized_months = dict(sync_states.values_list("video__video_id", "last_finalized_month"))
+            self.fingerprints = {
+                (video_id, endpoint): digest
+                for video_id, endpoint, digest in fingerprints.values_list("video__video_id", "endpoint", "digest")
+            }
+        self.endpoint_counts = Counter()
+        self.videos_skipped = 0
+        self.videos_rewritten = 0
+
+    def ingest(self, client, videos, run, telemetry, concurrency):
+        """Fetches and saves every video dict from videos, checkpointing each one in run.
+        Returns the ids of the videos saved."""
+        saved_ids = []
+
+        # Network calls run on the worker pool, DB writes stay on this thread in listing order
+        with ThreadPoolExecutor(max_workers=concurrency) as pool, connection.execute_wrapper(telemetry.sql_wrapper):
+            in_flight = deque()
+
+            def save_oldest():
+                v, futures, submitted = in_flight.popleft()
+                payloads = {}
+                failed = set()
+                for name, future in futures.items():
+                    try:
+                        payloads[name] = future.result()
+                    except Exception as e:
+                        print(f"Failed to fetch {name} for video {v.get('id')}: {e}")
+                        payloads[name] = None
+                        failed.add(name)
+
+                # The checkpoint commits together with the video's rows, so a resume never skips a half-written video
+                with transaction.atomic():
+                    self.save_video(v, payloads, failed)
+                    bulk_upsert(FetchCheckpoint, [FetchCheckpoint(
+                        run=run,
+                        video_id=v.get("id"),
+                        completed_endpoints=sorted(set(payloads) - failed),
+                        saved_at=timezone.now(),
+                    )], unique_fields=["run", "video_id"])
+                saved_ids.append(v.get("id"))
+                telemetry.record_video(v.get("id"), time.perf_counter() - submitted)
+
+            # Per-video fetches start while later pages of the listing are still being requested.
+            # 4xx responses count as failed too, or the watermark and fingerprints would move past data never stored.
+            try:
+                for v in videos:
+                    futures = {
+                        name: pool.submit(client.get_data, path, params, raise_errors=True)
+                        for name, (path, params) in video_endpoints(v, self.finalized_months.get(v.get("id"))).items()
                     }
-                )
-            
-            v_stats = get_data_safe(f"{BASE_URL}/video/{video_id}/aggregated-statistics")
+                    in_flight.append((v, futures, time.perf_counter()))
+
+                    # Bound how many fetched-but-unsaved videos are held in memory
+                    if len(in_flight) > concurrency:
+                        save_oldest()
+            except HihahoAPIError:
+                # Videos already listed are still saved and checkpointed when the listing fails, for --resume
+                while in_flight:
+                    save_oldest()
+                raise
+
+            while in_flight:
+                save_oldest()
+
+        return saved_ids
+
+    def build_summary(self, client):
+        return {
+            "videos": {"rewritten": self.videos_rewritten, "skipped": self.videos_skipped},
+            "endpoints": {
+                name: {outcome: self.endpoint_counts[name, outcome] for outcome in ("rewritten", "skipped", "failed")}
+                for name in sorted({name for name, _ in self.endpoint_counts})
+            },
+            "user_agents": {"lookups": self.ua_cache.hits + self.ua_cache.misses, "parsed": self.ua_cache.misses},
+            "http": client.error_summary(),
+        }
+
+    def coordinate(self, kwargs):
+        """Runs one fetch_video_data process per shard, relays their output and merges their summaries"""
+        workers = kwargs["workers"]
+        coordinator_run = FetchRun.objects.create(full=bool(kwargs.get("full")), shard=f"*/{workers}")
+
+        common_args = [
+            "--concurrency", str(kwargs.get("concurrency") or 1),
+            "--api-url", kwargs.get("api_url") or BASE_URL,
+            "--coordinator-run", str(coordinator_run.id),
+        ]
+        if kwargs.get("full"):
+            common_args.append("--full")
+        if kwargs.get("resume"):
+            common_args.append("--resume")
+        if kwargs.get("ua_cache"):
+            common_args += ["--ua-cache", kwargs["ua_cache"]]
+        if kwargs.get("trace_memory"):
+            common_args.append("--trace-memory")
+
+        processes = []
+        for shard_index in range(workers):
+            shard_args = ["--shard", f"{shard_index}/{workers}", *common_args]
+            # Each shard writes its own report and profile next to the requested path
+            for option in ("report", "profile"):
+                if kwargs.get(option):
+                    shard_args += [f"--{option}", f"{kwargs[option]}.shard{shard_index}"]
+            processes.append(subprocess.Popen(
+                [sys.executable, "manage.py", "fetch_video_data", *shard_args],
+                cwd=settings.BASE_DIR,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+            ))
+
+        def relay(shard_index, process):
+            for line in process.stdout:
+                self.stdout.write(f"[shard {shard_index}/{workers}] {line.rstrip()}")
+
+        relays = [threading.Thread(target=relay, args=shard) for shard in enumerate(processes)]
+        for thread in relays:
+            thread.start()
+        return_codes = [process.wait() for process in processes]
+        for thread in relays:
+            thread.join()
+
+        summary = merge_summaries(coordinator_run.shard_runs.exclude(finished_at=None).values_list("summary", flat=True))
+
+        failed_shards = [f"{shard_index}/{workers}" for shard_index, code in enumerate(return_codes) if code != 0]
+        refresh_rollups()
+        coordinator_run.summary = summary
+        if not failed_shards:
+            coordinator_run.finished_at = timezone.now()
+        coordinator_run.save(update_fields=["finished_at", "summary"])
+
+        self.write_summary(summary)
+        if failed_shards:
+            raise CommandError(f"Shards {', '.join(failed_shards)} failed, rerun with --resume to finish them")
+        self.stdout.write(self.style.SUCCESS(f"Successfully fetched video data with {workers} workers"))
+
+    def write_summary(self, summary):
+        for endpoint, counts in summary.get("http", {}).items():
+            if counts["errors"]:
+                self.stderr.write(f"{endpoint}: {counts['errors']} errors, {counts['retries']} retries in {counts['requests']} requests")
+
+        videos = summary.get("videos", {})
+        self.stdout.write(f"Videos: {videos.get('rewritten', 0)} rewritten, {videos.get('skipped', 0)} unchanged and skipped")
+
+        user_agents = summary.get("user_agents", {})
+        lookups = user_agents.get("lookups", 0)
+        hit_rate = (lookups - user_agents.get("parsed", 0)) / lookups if lookups else 0.0
+        self.stdout.write(f"User agents: {lookups} lookups, {user_agents.get('parsed', 0)} parsed, {hit_rate:.1%} cache hit rate")
+
+        for name, counts in summary.get("endpoints", {}).items():
+            self.stdout.write(f"{name}: {counts['rewritten']} rewritten, {counts['skipped']} skipped, {counts['failed']} failed")
+
+    def save_video(self, v, payloads, failed=frozenset()):
+        video_id = v.get("id")
+        title = v.get("display_name", "")
+        container = v.get("video_container")
+        container_name = ""
+        container_id = 0
+        if container:
+            container_name = container.get("name")
+            container_id = container.get("id")
+
+        video_obj, _ = Video.objects.update_or_create(
+            video_id=video_id, # lookup field for updating
+            defaults={
+                "uuid": v.get("uuid"),
+                "title": title,
+                "search_title": search_text(title),
+                "status": v.get("status"),
+                "folder_name":container_name,
+                "folder_number":container_id,
+                "created_date":parser.parse(v.get("created_at")),
+            }
+        )
+        print(f"{video_id} {v.get('video_container_id')}")
+
+        # Payloads that hash the same as last run are already stored, so their rows aren't parsed or rewritten
+        changed = set()
+        fingerprints = []
+        for name, data in payloads.items():
+            if name in failed:
+                self.endpoint_counts[name, "failed"] += 1
+                continue
+            digest = payload_digest(data)
+            if self.fingerprints.get((video_id, name)) == digest:
+                self.endpoint_counts[name, "skipped"] += 1
+                continue
+            self.endpoint_counts[name, "rewritten"] += 1
+            changed.add(name)
+            fingerprints.append(PayloadFingerprint(video=video_obj, endpoint=name, digest=digest))
+
+        if changed:
+            self.videos_rewritten += 1
+        else:
+            self.videos_skipped += 1
+
+        write_stats = bool(changed & {"video", "aggregated_statistics"})
+        write_interactions = bool(changed & {"aggregated_statistics", "interactions"})
+        write_questions = bool(changed & {"aggregated_statistics", "questions"})
+
+        v_data = payloads["video"]
+        v_stats = payloads["aggregated_statistics"]
+        if v_stats:
+            aggregated = v_stats.get("aggregated_statistics")
+            view_counts = {
+                "total_views":aggregated.get("views") or 0,
+                "started_views":aggregated.get("started_views") or 0,
+                "finished_views":aggregated.get("finished_views") or 0,
+                "interaction_clicks":aggregated.get("interactions").get("total_clicks") or 0,
+                "num_questions":aggregated.get("questions").get("count") or 0,
+            }
+
+        if write_stats and v_data and "aggregated_statistics" in failed:
+            # Only the duration is known, the stored view counts are kept instead of being zeroed
+            bulk_upsert(VideoStats, [VideoStats(
+                video=video_obj,
+                total_views=0,
+                started_views=0,
+                finished_views=0,
+                interaction_clicks=0,
+                num_questions=0,
+                video_duration_seconds=round(v_data.get("duration")/1000, 2) or 11.11,
+            )], unique_fields=["video"], update_fields=["video_duration_seconds"])
+        elif write_stats and v_data:
+            v_duration = v_data.get("duration")
+            # Initialize VideoStats object even when no aggregated stats
+            videostats_obj = VideoStats(
+                video=video_obj,
+                total_views=0,
+                started_views=0,
+                finished_views=0,
+                interaction_clicks=0,
+                num_questions=0,
+                video_duration_seconds=round(v_duration/1000, 2) or 11.11,
+            )
             if v_stats:
-                # If there are aggregated stats, update VideoStats object accordingly
-                try:
-                    videostats_obj = VideoStats.objects.get(video=video_obj)
-                    videostats_obj.total_views = v_stats.get("aggregated_statistics").get("views") or 0
-                    videostats_obj.started_views = v_stats.get("aggregated_statistics").get("started_views") or 0
-                    videostats_obj.finished_views = v_stats.get("aggregated_statistics").get("finished_views") or 0
-                    videostats_obj.interaction_clicks = v_stats.get("aggregated_statistics").get("interactions").get("total_clicks") or 0
-                    videostats_obj.num_questions = v_stats.get("aggregated_statistics").get("questions").get("count") or 0
-                    videostats_obj.save()
-                except VideoStats.DoesNotExist:
-                    videostats_obj = None
-
-                # Initialize all interactions if there are aggregated stats so interactions with 0 clicks are included
-                for i in v_stats["aggregated_statistics"]["interactions"]["details"]:
-                    InteractionStats.objects.update_or_create(
-                        video=video_obj,
-                        interaction_id=i.get("id"),
-                        defaults={
-                            "title":i.get("title") or "",
-                            "type":i.get("type") or "",
-                            "action_type":i.get("action_type") or "",
-                            "start_time_seconds":i.get("start_time") or 0.0,
-                            "end_time_seconds":i.get("end_time") or 0.0,
-                            "duration_seconds":i.get("duration") or 0.0,
-                            "link":i.get("link") or "",
-                            "total_clicks":i.get("total_clicks") or 0,
-                            "created_at":i.get("created_at") or video_obj.created_date,
-                        }
-                    )
+                for field, value in view_counts.items():
+                    setattr(videostats_obj, field, value)
+            bulk_upsert(VideoStats, [videostats_obj], unique_fields=["video"])
+        elif write_stats and v_stats:
+            # If there are aggregated stats, update VideoStats object accordingly
+            VideoStats.objects.filter(video=video_obj).update(**view_counts)
 
-                # Initialize all questions if there are aggregated stats so questions with 0 answers are included
-                for q in v_stats["aggregated_statistics"]["questions"]["details"]:
-                    QuestionStats.objects.update_or_create(
-                        video=video_obj,
-                        question_id=q.get("id"),
-                        defaults={
-                            "title":q.get("title") or "",
-                            "type":q.get("type") or "",
-                            "video_time_seconds":q.get("active_at") or 0.0,
-                            "average_answer_time_seconds":0.0,
-                            "total_answered":q.get("amount_answers") or 0,
-                            "total_correctly_answered":q.get("amount_correct_answers") or 0,
-                            "created_at":q.get("created_at") or video_obj.created_date,
-                        }
-                    )
-            
-            # Start and end dates
-            today = date.today()
-            raw_start = v.get("created_at")
-            start_date = raw_start.split("T")[0] + " 00:00:00"
-            end_date = today.strftime("%Y-%m-%d") + " 23:59:59"
-
-            monthly_stats = get_data_safe(f"{BASE_URL}/video/{video_id}/stats/views",
-                params={
-                    "group_by": "month",
-                    "start_date": start_date,
-                    "end_date": end_date
-                }
+        monthly_stats = payloads["monthly_views"]
+        if monthly_stats and "monthly_views" in changed:
+            monthly_views = [
+                MonthlyViews(
+                    video=video_obj,
+                    month=period_month(month.get("period")),
+                    total_views=month.get("total") or 0,
+                    started_views=month.get("started") or 0,
+                    finished_views=month.get("finished") or 0,
+                    passed_views=month.get("passed") or 0,
+                    failed_views=month.get("failed") or 0,
+                    unfinished_views=month.get("unfinished") or 0,
+                )
+                for month in monthly_stats
+                if month.get("period")
+            ]
+            bulk_upsert(MonthlyViews, dedupe(monthly_views, "month"), unique_fields=["video", "month"])
+
+        # Everything up to the watermark is now stored, so later runs only need the open months
+        if "monthly_views" not in failed and self.finalized_months.get(video_id) != last_finalized_month():
+            bulk_upsert(
+                VideoSyncState,
+                [VideoSyncState(video=video_obj, last_finalized_month=last_finalized_month())],
+                unique_fields=["video"],
+                update_fields=["last_finalized_month"],
             )
 
-            if monthly_stats:
-                for month in monthly_stats:
-                    MonthlyViews.objects.update_or_create(
+        index = 1
+        v_session = payloads["views_by_user_agent"]
+        if v_session and "views_by_user_agent" in changed:
+            sessions = []
+            user_agents = self.ua_cache.get_many(agent_type for agent_type in v_session if agent_type != "unknown")
+            profile_ids = self.ua_cache.profile_ids(user_agents.values())
+            for agent_type, count in v_session.items():
+                if (agent_type != "unknown"):
+                    sessions.append(ViewSession(
                         video=video_obj,
-                        month=month.get("period") or "",
-                        defaults={
-                            "total_views":month.get("total") or 0,
-                            "started_views":month.get("started") or 0,
-                            "finished_views":month.get("finished") or 0,
-                            "passed_views":month.get("passed") or 0,
-                            "failed_views":month.get("failed") or 0,
-                            "unfinished_views":month.get("unfinished") or 0
-                        }
-                    )
+                        object_id=index,
+                        profile_id=profile_ids[user_agents[agent_type]],
+                        viewer_count=count or 0,
+                    ))
+                index += 1
 
-            index = 1
-            v_session = get_data_safe(f"{BASE_URL}/video/{video_id}/stats/views-by-user-agent")
-            if v_session:
-                for agent_type, count in v_session.items():
-                    if (agent_type != "unknown"):
-                        user_agent = parse(agent_type)
-
-                        ViewSession.objects.update_or_create(
-                            video=video_obj,
-                            object_id=index,
-                            defaults={
-                                "viewer_os":user_agent.os.family or "",
-                                "os_version":user_agent.os.version_string or "",
-                                "viewer_browser":user_agent.browser.family or "",
-                                "browser_version":user_agent.browser.version_string or "",
-                                "viewer_device":user_agent.device.model or "N/A",
-                                "viewer_mobile":user_agent.is_mobile or False,
-                                "is_bot":user_agent.is_bot or False,
-                                "viewer_count":count or 0,
-                            }
-                        )
-                    index += 1
-
-            interaction_list = get_data_safe(f"{BASE_URL}/video/{video_id}/stats/interactions/")
-            if interaction_list:
-                for interaction in interaction_list:
-                    interaction_id = interaction.get("id")
-                    
-                    try:
-                        existing = InteractionStats.objects.get(video=video_obj, interaction_id=interaction_id)
-                    except InteractionStats.DoesNotExist:
-                        existing = None
+            bulk_upsert(ViewSession, sessions, unique_fields=["video", "object_id"])
+            delete_stale(ViewSession.objects.filter(video=video_obj), "object_id", [s.object_id for s in sessions])
+
+        interaction_list = payloads["interactions"]
+        question_list = payloads["questions"]
+
+        # aggregated-statistics and stats/interactions describe the same interactions, so both are merged into
+        # one object per interaction and each row is written once. aggregated-statistics lists the ones with
+        # 0 clicks and has the type, action type and created_at, stats/interactions has the rest.
+        interactions = {}
+        stats_only_interactions = {}
+        if v_stats and write_interactions:
+            for i in v_stats["aggregated_statistics"]["interactions"]["details"]:
+                interactions[i.get("id")] = InteractionStats(
+                    video=video_obj,
+                    interaction_id=i.get("id"),
+                    title=i.get("title") or "",
+                    type=i.get("type") or "",
+                    action_type=i.get("action_type") or "",
+                    start_time_seconds=i.get("start_time") or 0.0,
+                    end_time_seconds=i.get("end_time") or 0.0,
+                    duration_seconds=i.get("duration") or 0.0,
+                    link=i.get("link") or "",
+                    total_clicks=i.get("total_clicks") or 0,
+                    created_at=i.get("created_at") or video_obj.created_date,
+                )
 
-                    # Update if exists or if not create each interaction
-                    InteractionStats.objects.update_or_create(
+        if interaction_list and write_interactions:
+            for interaction in interaction_list:
+                interaction_id = interaction.get("id")
+                fields = {
+                    "title": interaction.get("title") or "",
+                    "start_time_seconds": interaction.get("start_time") or 0.0,
+                    "end_time_seconds": interaction.get("end_time") or 0.0,
+                    "duration_seconds": interaction.get("end_time") - interaction.get("start_time") or 0.0,
+                    "link": interaction.get("link") or "",
+                    "total_clicks": interaction.get("total_times_clicked") or 0,
+                }
+                obj = interactions.get(interaction_id) or stats_only_interactions.get(interaction_id)
+                if obj is None:
+                    stats_only_interactions[interaction_id] = InteractionStats(
                         video=video_obj,
                         interaction_id=interaction_id,
-                        defaults={
-                            "title": interaction.get("title") or "",
-                            "type": existing.type if existing else "",
-                            "action_type": existing.action_type if existing else "",
-                            "start_time_seconds": interaction.get("start_time") or 0.0,
-                            "end_time_seconds": interaction.get("end_time") or 0.0,
-                            "duration_seconds": interaction.get("end_time") - interaction.get("start_time") or 0.0,
-                            "link": interaction.get("link") or "",
-                            "total_clicks": interaction.get("total_times_clicked") or 0,
-                            "created_at": existing.created_at if existing else video_obj.created_date,
-                        }
+                        type="",
+                        action_type="",
+                        created_at=video_obj.created_date,
+                        **fields,
                     )
-            
-            question_list = get_data_safe(f"{BASE_URL}/video/{video_id}/stats/questions/")
-            if question_list:
-                for question in question_list:
-                    question_id = question.get("id")
-                    
-                    try:
-                        existing = QuestionStats.objects.get(video=video_obj, question_id=question_id)
-                    except QuestionStats.DoesNotExist:
-                        existing = None
+                else:
+                    for field, value in fields.items():
+                        setattr(obj, field, value)
+
+        bulk_upsert(InteractionStats, list(interactions.values()), unique_fields=["video", "interaction_id"])
+        # Without an aggregated-statistics entry, type, action_type and created_at keep their stored values
+        bulk_upsert(
+            InteractionStats,
+            list(stats_only_interactions.values()),
+            unique_fields=["video", "interaction_id"],
+            update_fields=list(INTERACTION_STATS_FIELDS),
+        )
+
+        if (interactions or stats_only_interactions) and not failed & {"aggregated_statistics", "interactions"}:
+            delete_stale(
+                InteractionStats.objects.filter(video=video_obj),
+                "interaction_id",
+                [*interactions, *stats_only_interactions],
+            )
+
+        # Questions are merged the same way, stats/questions only leaves created_at to aggregated-statistics
+        questions = {}
+        stats_only_questions = {}
+        if v_stats and write_questions:
+            for q in v_stats["aggregated_statistics"]["questions"]["details"]:
+                questions[q.get("id")] = QuestionStats(
+                    video=video_obj,
+                    question_id=q.get("id"),
+                    title=q.get("title") or "",
+                    search_title=search_text(q.get("title")),
+                    type=q.get("type") or "",
+                    video_time_seconds=q.get("active_at") or 0.0,
+                    average_answer_time_seconds=0.0,
+                    total_answered=q.get("amount_answers") or 0,
+                    total_correctly_answered=q.get("amount_correct_answers") or 0,
+                    created_at=q.get("created_at") or video_obj.created_date,
+                )
 
-                    # Update if exists or if not create each interaction
-                    question_obj, _ = QuestionStats.objects.update_or_create(
+        if question_list and write_questions:
+            for question in question_list:
+                question_id = question.get("id")
+                fields = {
+                    "title": question.get("question_text") or "",
+                    "search_title": search_text(question.get("question_text")),
+                    "type": question.get("question_type") or "",
+                    "video_time_seconds": question.get("video_time") or 0.0,
+                    "average_answer_time_seconds": question.get("average_answer_time_seconds") or 0.0,
+                    "total_answered": question.get("total_given_answers") or 0,
+                    "total_correctly_answered": question.get("total_correct_answers") or 0,
+                }
+                obj = questions.get(question_id) or stats_only_questions.get(question_id)
+                if obj is None:
+                    stats_only_questions[question_id] = QuestionStats(
                         video=video_obj,
                         question_id=question_id,
-                        defaults={
-                            "title":question.get("question_text") or "",
-                            "type":question.get("question_type") or "",
-                            "video_time_seconds":question.get("video_time") or 0.0,
-                            "average_answer_time_seconds": question.get("average_answer_time_seconds") or 0.0,
-                            "total_answered": question.get("total_given_answers") or 0,
-                            "total_correctly_answered": question.get("total_correct_answers") or 0,
-                            "created_at": existing.created_at if existing else video_obj.created_date,
-                        }
+                        created_at=video_obj.created_date,
+                        **fields,
                     )
-                    
-
-                    if question.get("question_type") in ['mc', 'mr', 'image']: # Only get answers for questions with finite answer possibilities
-                        answer_list = question.get("answers")
-                        if answer_list:
-                            for answer in answer_list:
-                                label = answer.get("label")
-                                answered_count = answer.get("answered_count") or 0
-                                is_correct_answer = answer.get("is_correct_answer")
-
-                                try: # This section is needed because the Hihaho API sometimes duplicates the correct answer and has one with answered count 0
-                                    existing = QuestionAnswer.objects.get(question=question_obj, label=label)
-
-                                    if existing.answered_count > 0 and answered_count == 0:
-                                        continue  # Skip this duplicate with 0 count
-
-                                    # Otherwise, update the existing one if needed
-                                    QuestionAnswer.objects.update_or_create(
-                                        question=question_obj,
-                                        label=label,
-                                        defaults={
-                                            "answered_count":answered_count,
-                                            "is_correct_answer":is_correct_answer,
-                                        }
-                                    )
-                                except QuestionAnswer.DoesNotExist:
-                                    QuestionAnswer.objects.update_or_create(
-                                        question=question_obj,
-                                        label=label,
-                                        defaults={
-                                            "answered_count":answered_count,
-                                            "is_correct_answer":is_correct_answer,
-                                        }
-                                    )
-
-            
+                else:
+                    for field, value in fields.items():
+                        setattr(obj, field, value)
+
+        bulk_upsert(QuestionStats, list(questions.values()), unique_fields=["video", "question_id"])
+        bulk_upsert(
+            QuestionStats,
+            list(stats_only_questions.values()),
+            unique_fields=["video", "question_id"],
+            update_fields=list(QUESTION_STATS_FIELDS),
+        )
+
+        if (questions or stats_only_questions) and not failed & {"aggregated_statistics", "questions"}:
+            delete_stale(
+                QuestionStats.objects.filter(video=video_obj),
+                "question_id",
+                [*questions, *stats_only_questions],
+            )
+
+        if question_list and write_questions:
+            # The upserts above return the primary keys, only fall back to a query where the database doesn't
+            question_pks = {q.question_id: q.pk for q in [*questions.values(), *stats_only_questions.values()] if q.pk}
+            if any(question.get("id") not in question_pks for question in question_list):
+                question_pks = dict(QuestionStats.objects.filter(video=video_obj).values_list("question_id", "pk"))
+            answer_counts = {
+                (question_pk, label): answered_count
+                for question_pk, label, answered_count in QuestionAnswer.objects.filter(
+                    question__video=video_obj
+                ).values_list("question_id", "label", "answered_count")
+            }
+
+            answers = {}
+            for question in question_list:
+                if question.get("question_type") in ['mc', 'mr', 'image']: # Only get answers for questions with finite answer possibilities
+                    question_pk = question_pks[question.get("id")]
+                    answer_list = question.get("answers")
+                    if answer_list:
+                        for answer in answer_list:
+                            label = answer.get("label")
+                            answered_count = answer.get("answered_count") or 0
+
+                            # The Hihaho API sometimes duplicates the correct answer and has one with answered count 0
+                            if answer_counts.get((question_pk, label), 0) > 0 and answered_count == 0:
+                                continue  # Skip this duplicate with 0 count
+
+                            answer_counts[(question_pk, label)] = answered_count
+                            answers[(question_pk, label)] = QuestionAnswer(
+                                question_id=question_pk,
+                                label=label,
+                                answered_count=answered_count,
+                                is_correct_answer=answer.get("is_correct_answer"),
+                            )
+
+            bulk_upsert(QuestionAnswer, list(answers.values()), unique_fields=["question", "label"])
+
             # This assumes there is at least 0 ratings and at most 1 rating per video, specifically for Benesse
-            if question_list:
-                rating_index = 0
-                rating = None
-                while rating_index < len(question_list):
-                    if question_list[rating_index].get("question_type") == "rating":
-                        rating = question_list[rating_index]
-                    rating_index += 1
-
-                if rating is not None:
-                    one_star = 0
-                    two_star = 0
-                    three_star = 0
-                    four_star = 0
-                    five_star = 0
-                    
-                    for rating_category in rating.get("answers"):
-                        if rating_category.get("label") == "1":
-                            one_star = rating_category.get("answered_count")
-                        if rating_category.get("label") == "2":
-                            two_star = rating_category.get("answered_count")
-                        if rating_category.get("label") == "3":
-                            three_star = rating_category.get("answered_count")
-                        if rating_category.get("label") == "4":
-                            four_star = rating_category.get("answered_count")
-                        if rating_category.get("label") == "5":
-                            five_star = rating_category.get("answered_count")
-
-                    VideoRating.objects.update_or_create(
-                        video=video_obj,
-                        rating_id=rating.get("id"),
-                        defaults={
-                            "average_rating":rating.get("average_rating") or 0,
-                            "one_star":one_star,
-                            "two_star":two_star,
-                            "three_star":three_star,
-                            "four_star":four_star,
-                            "five_star":five_star,
-                        }
-                    )
-        
-        self.stdout.write(self.style.SUCCESS("Successfully fetched video data"))
+            rating_index = 0
+            rating = None
+            while rating_index < len(question_list):
+                if question_list[rating_index].get("question_type") == "rating":
+                    rating = question_list[rating_index]
+                rating_index += 1
+
+            if rating is not None:
+                one_star = 0
+                two_star = 0
+                three_star = 0
+                four_star = 0
+                five_star = 0
+                
+                for rating_category in rating.get("answers"):
+                    if rating_category.get("label") == "1":
+                        one_star = rating_category.get("answered_count")
+                    if rating_category.get("label") == "2":
+                        two_star = rating_category.get("answered_count")
+                    if rating_category.get("label") == "3":
+                        three_star = rating_category.get("answered_count")
+                    if rating_category.get("label") == "4":
+                        four_star = rating_category.get("answered_count")
+                    if rating_category.get("label") == "5":
+                        five_star = rating_category.get("answered_count")
+
+                bulk_upsert(VideoRating, [VideoRating(
+                    video=video_obj,
+                    rating_id=rating.get("id"),
+                    average_rating=rating.get("average_rating") or 0,
+                    one_star=one_star,
+                    two_star=two_star,
+                    three_star=three_star,
+                    four_star=four_star,
+                    five_star=five_star,
+                )], unique_fields=["video", "rating_id"])
+
+        bulk_upsert(PayloadFingerprint, fingerprints, unique_fields=["video", "endpoint"], update_fields=["digest"])
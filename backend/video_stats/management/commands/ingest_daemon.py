@@ -0,0 +1,180 @@
+from django.db import close_old_connections
+from django.utils import timezone
+from video_stats.models import FetchRun, Video
+from video_stats.hihaho_client import BASE_URL, HihahoAPIError, HihahoClient
+from video_stats.ua_cache import UserAgentCache
+from video_stats.telemetry import RunTelemetry
+from video_stats.rollups import refresh_rollups
+from video_stats.refresh_schedule import (
+    DORMANT_MINUTES, HOT_MINUTES, NEW_VIDEO_DAYS, WARM_MINUTES, RefreshPolicy,
+)
+from video_stats.management.commands.fetch_video_data import (
+    VIDEO_ENDPOINT_NAMES, Command as FetchCommand, iter_videos,
+)
+import threading
+import signal
+import time
+import os
+
+def listing_entry(video):
+    """Rebuilds the /video listing fields save_video reads from a stored Video"""
+    return {
+        "id": video.video_id,
+        "uuid": video.uuid,
+        "display_name": video.title,
+        "status": video.status,
+        "video_container_id": video.folder_number,
+        "video_container": {"id": video.folder_number, "name": video.folder_name},
+        "created_at": video.created_date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    }
+
+class Command(FetchCommand):
+    help = ("Keeps the dashboard data fresh by refreshing videos continuously, hot videos often and dormant ones rarely, "
+            "within a budget of HiHaHo API requests per hour")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4, help="Number of HiHaHo API requests to run at the same time")
+        parser.add_argument(
+            "--requests-per-hour",
+            type=int,
+            default=int(os.getenv("INGEST_REQUESTS_PER_HOUR", "6000")),
+            help="Upstream request budget, retries and listing pages included (default $INGEST_REQUESTS_PER_HOUR or 6000)",
+        )
+        parser.add_argument("--hot-minutes", type=int, default=HOT_MINUTES, help="Refresh interval of recently viewed or created videos")
+        parser.add_argument("--warm-minutes", type=int, default=WARM_MINUTES, help="Refresh interval of videos viewed in the last six months")
+        parser.add_argument("--dormant-minutes", type=int, default=DORMANT_MINUTES, help="Refresh interval of every other video")
+        parser.add_argument("--new-video-days", type=int, default=NEW_VIDEO_DAYS, help="Videos created this recently count as hot")
+        parser.add_argument(
+            "--listing-minutes",
+            type=int,
+            default=60,
+            help="How often to re-read the /video listing for new videos and changed titles, statuses and folders",
+        )
+        parser.add_argument("--tick-seconds", type=int, default=60, help="How long to sleep when nothing is due or the budget is spent")
+        parser.add_argument("--once", action="store_true", help="Run a single refresh cycle and exit")
+        parser.add_argument("--api-url", default=BASE_URL, help="HiHaHo API base URL (default $HIHAHO_API_URL or the production API)")
+        parser.add_argument(
+            "--ua-cache",
+            default=os.getenv("UA_CACHE_PATH"),
+            help="File to keep parsed user agents in between runs (default $UA_CACHE_PATH, in memory only if unset)",
+        )
+
+    def handle(self, *args, **options):
+        self.refresh_policy = RefreshPolicy(
+            hot_minutes=options["hot_minutes"],
+            warm_minutes=options["warm_minutes"],
+            dormant_minutes=options["dormant_minutes"],
+            new_video_days=options["new_video_days"],
+        )
+        concurrency = max(1, options["concurrency"])
+        client = HihahoClient(base_url=options["api_url"] or BASE_URL, pool_size=concurrency)
+        self.ua_cache = UserAgentCache(path=options.get("ua_cache"))
+
+        stopping = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stopping.set())
+
+        # Token bucket over upstream requests, allowing at most one tick's worth of burst
+        rate = options["requests_per_hour"] / 3600
+        capacity = max(len(VIDEO_ENDPOINT_NAMES), rate * options["tick_seconds"])
+        tokens = capacity
+        refilled_at = time.monotonic()
+        listed_at = None
+        # What the last listing cost, the first one waits for a full bucket
+        listing_cost = capacity
+        # Videos from the listing that are new or changed, refreshed ahead of the schedule
+        self.pending = {}
+
+        self.stdout.write(f"Ingestion daemon started, budget {options['requests_per_hour']} requests per hour")
+        while not stopping.is_set():
+            close_old_connections()
+            now = time.monotonic()
+            tokens = min(capacity, tokens + (now - refilled_at) * rate)
+            refilled_at = now
+
+            # The listing is read in one go once the bucket covers what it cost last time, or is full. It can still
+            # take more than that and leave the bucket below zero, then refreshes wait until the debt is paid off.
+            listing_due = listed_at is None or now - listed_at >= options["listing_minutes"] * 60
+            if listing_due and tokens >= min(capacity, listing_cost):
+                listing_cost = self.read_listing(client)
+                tokens -= listing_cost
+                listed_at = time.monotonic()
+
+            limit = max(0, int(tokens // len(VIDEO_ENDPOINT_NAMES)))
+            batch = self.next_batch(limit) if limit else []
+            if batch:
+                tokens -= self.refresh(client, batch, concurrency)
+
+            if options["once"]:
+                break
+            # Keep going straight away while videos are due and the budget allows a full round, otherwise wait for the next tick
+            if not batch or len(batch) < limit or tokens < concurrency * len(VIDEO_ENDPOINT_NAMES):
+                stopping.wait(options["tick_seconds"])
+
+        client.close()
+        self.ua_cache.save()
+        self.stdout.write(self.style.SUCCESS("Ingestion daemon stopped"))
+
+    def read_listing(self, client):
+        """Queues the listed videos that aren't stored yet or whose listing fields changed. Returns the requests used"""
+        stored = {
+            video_id: fields
+            for video_id, *fields in Video.objects.values_list("video_id", "title", "status", "folder_name", "folder_number")
+        }
+        request_count = sum(client.request_counts.values())
+        try:
+            for v in iter_videos(client):
+                container = v.get("video_container") or {}
+                fields = [v.get("display_name", ""), v.get("status"), container.get("name", ""), container.get("id", 0)]
+                if stored.get(v.get("id")) != fields:
+                    self.pending[v.get("id")] = v
+        except HihahoAPIError as e:
+            # Scheduled refreshes don't need the listing, the rest of it is picked up next time
+            self.stdout.write(f"Stopped reading the listing: {e}")
+        used = sum(client.request_counts.values()) - request_count
+        self.stdout.write(f"Listing read with {used} requests, {len(self.pending)} new or changed videos queued")
+        return used
+
+    def next_batch(self, limit):
+        """Picks up to limit videos to refresh, queued listing entries first and then the most urgent due videos"""
+        batch = list(self.pending.values())[:limit]
+        if len(batch) < limit:
+            queued = set(self.pending)
+            batch += [
+                listing_entry(video)
+                for video in self.refresh_policy.due(limit - len(batch) + len(queued))
+                if video.video_id not in queued
+            ][:limit - len(batch)]
+        return batch
+
+    def refresh(self, client, batch, concurrency):
+        """Fetches and saves one batch as its own FetchRun and reschedules it. Returns the requests used"""
+        # Counters start from zero every cycle so each run's summary only covers its own batch
+        client.request_counts.clear()
+        client.error_counts.clear()
+        client.retry_counts.clear()
+        self.ua_cache.hits = self.ua_cache.misses = 0
+
+        run = FetchRun.objects.create(shard="daemon")
+        telemetry = RunTelemetry()
+        self.prepare(run, video_ids=[v.get("id") for v in batch])
+        saved_ids = self.ingest(client, batch, run, telemetry, concurrency)
+        listed = [video_id for video_id in saved_ids if self.pending.pop(video_id, None) is not None]
+        tiers = self.refresh_policy.schedule(saved_ids)
+        # The rollups only change with the stats or with the folders and statuses of the listing, a batch of
+        # unchanged videos leaves them as they are
+        if self.videos_rewritten or listed:
+            refresh_rollups()
+        self.ua_cache.save()
+
+        run.finished_at = timezone.now()
+        run.summary = self.build_summary(client)
+        run.save(update_fields=["finished_at", "summary"])
+        run.checkpoints.all().delete()
+
+        used = sum(client.request_counts.values())
+        self.stdout.write(
+            f"Refreshed {len(saved_ids)} videos ({', '.join(f'{count} {tier}' for tier, count in tiers.items())}) "
+            f"with {used} requests, {self.videos_skipped} unchanged"
+        )
+        return used
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from video_stats.partitions import (
+    detach_partitions, ensure_partitions, is_partitioned, list_partitions, monthly_views_table, partition_monthly_views,
+)
+from datetime import date
+
+class Command(BaseCommand):
+    help = (
+        "Maintains the yearly partitions of MonthlyViews on PostgreSQL: creates the coming years' partitions "
+        "and detaches the ones older than --keep-years. Run it at least once a year, e.g. from the fetch job."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Partition MonthlyViews first if it's still a plain table (migrate does it when PARTITION_MONTHLY_VIEWS=True)",
+        )
+        parser.add_argument(
+            "--years-ahead",
+            type=int,
+            default=1,
+            help="Make sure partitions exist up to this many years after the current one (default 1)",
+        )
+        parser.add_argument(
+            "--keep-years",
+            type=int,
+            help="Detach the partitions of years older than the last N, current year included. "
+                 "Their months are no longer served, but fetch_video_data --full fetches them again into the default partition",
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop detached partitions instead of keeping them as standalone archive tables",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError(f"MonthlyViews can only be partitioned on PostgreSQL, not {connection.vendor}")
+        if options["keep_years"] is not None and options["keep_years"] < 1:
+            raise CommandError("--keep-years must be at least 1")
+
+        this_year = date.today().year
+        if not is_partitioned():
+            if not options["convert"]:
+                raise CommandError("MonthlyViews isn't partitioned, pass --convert to partition it")
+            partition_monthly_views(this_year + options["years_ahead"])
+            self.stdout.write("Partitioned MonthlyViews by year")
+
+        # Years older than --keep-years aren't given a partition again when their months were fetched once more
+        keep_since = this_year - options["keep_years"] + 1 if options["keep_years"] else None
+        for name in ensure_partitions(this_year + options["years_ahead"], since_year=keep_since):
+            self.stdout.write(f"Created {name}")
+        if keep_since:
+            for name in detach_partitions(keep_since, drop=options["drop"]):
+                self.stdout.write(f"Dropped {name}" if options["drop"] else f"Detached {name}")
+
+        with connection.cursor() as cursor:
+            for name, year, rows in list_partitions(cursor, monthly_views_table()):
+                if year is not None:
+                    self.stdout.write(f"  {name}: ~{rows} rows")
+                    continue
+                # Estimates lag behind on a partition that should stay empty, so this one is counted
+                cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(name)}")
+                rows = cursor.fetchone()[0]
+                self.stdout.write(f"  {name}: {rows} rows")
+                if rows:
+                    self.stdout.write(self.style.WARNING(
+                        f"  {rows} rows fall outside the yearly partitions, e.g. months of detached years fetched again"
+                    ))
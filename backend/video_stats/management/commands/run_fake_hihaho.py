@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from video_stats.fake_hihaho import FakeCatalog, FakeHihahoServer
+
+def add_catalog_arguments(parser):
+    """Options shared by the commands that build a FakeCatalog"""
+    parser.add_argument("--videos", type=int, default=100, help="Number of videos in the synthetic catalog")
+    parser.add_argument("--interactions", type=int, default=5, help="Interactions per video")
+    parser.add_argument("--questions", type=int, default=3, help="Questions per video, the last one is a rating")
+    parser.add_argument("--user-agents", type=int, default=200, help="Distinct user agent strings shared by the catalog")
+    parser.add_argument("--page-size", type=int, default=50, help="Videos per /video listing page")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated data")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra delay of up to this much per response")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of responses replaced by a 429 or 503")
+
+def build_server(options, port=0):
+    catalog = FakeCatalog(
+        videos=options["videos"],
+        interactions=options["interactions"],
+        questions=options["questions"],
+        user_agents=options["user_agents"],
+        page_size=options["page_size"],
+        seed=options["seed"],
+    )
+    return FakeHihahoServer(
+        catalog,
+        host=options.get("host", "127.0.0.1"),
+        port=port,
+        latency=options["latency_ms"] / 1000,
+        jitter=options["jitter_ms"] / 1000,
+        error_rate=options["error_rate"],
+    )
+
+class Command(BaseCommand):
+    help = "Serves a synthetic HiHaHo v2 API locally, e.g. fetch_video_data --api-url http://127.0.0.1:8765/v2"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        add_catalog_arguments(parser)
+
+    def handle(self, *args, **options):
+        server = build_server(options, port=options["port"])
+        self.stdout.write(f"Serving {options['videos']} synthetic videos at {server.base_url} (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:08
+
+from django.db import migrations
+from django.db.models import Max
+
+DEDUPLICATE = [
+    ('InteractionStats', ('video', 'interaction_id')),
+    ('MonthlyViews', ('video', 'month')),
+    ('QuestionStats', ('video', 'question_id')),
+    ('VideoRating', ('video', 'rating_id')),
+    ('VideoStats', ('video',)),
+    ('ViewSession', ('video', 'object_id')),
+]
+
+def remove_duplicate_rows(apps, schema_editor):
+    """Keeps only the most recently inserted row for each unique key so the constraints can be added"""
+    for model_name, fields in DEDUPLICATE:
+        model = apps.get_model('video_stats', model_name)
+        keep_ids = model.objects.values(*fields).annotate(keep_id=Max('id')).values('keep_id')
+        model.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_rows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='interactionstats',
+            unique_together={('video', 'interaction_id')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyviews',
+            unique_together={('video', 'month')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='questionstats',
+            unique_together={('video', 'question_id')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='videorating',
+            unique_together={('video', 'rating_id')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='videostats',
+            unique_together={('video',)},
+        ),
+        migrations.AlterUniqueTogether(
+            name='viewsession',
+            unique_together={('video', 'object_id')},
+        ),
+    ]
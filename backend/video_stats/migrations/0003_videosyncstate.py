@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0002_unique_video_rows'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_finalized_month', models.CharField(blank=True, null=True)),
+                ('video', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sync_state', to='video_stats.video')),
+            ],
+        ),
+    ]
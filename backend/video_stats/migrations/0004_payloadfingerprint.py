@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0003_videosyncstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayloadFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField()),
+                ('digest', models.CharField(max_length=64)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='video_stats.video')),
+            ],
+            options={
+                'unique_together': {('video', 'endpoint')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0004_payloadfingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('full', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FetchCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.IntegerField()),
+                ('completed_endpoints', models.JSONField(default=list)),
+                ('saved_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='video_stats.fetchrun')),
+            ],
+            options={
+                'unique_together': {('run', 'video_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0005_fetch_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fetchrun',
+            name='coordinator',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shard_runs', to='video_stats.fetchrun'),
+        ),
+        migrations.AddField(
+            model_name='fetchrun',
+            name='shard',
+            field=models.CharField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='fetchrun',
+            name='summary',
+            field=models.JSONField(default=dict),
+        ),
+    ]
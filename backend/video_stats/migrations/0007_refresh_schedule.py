@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0006_fetch_run_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videosyncstate',
+            name='last_refreshed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videosyncstate',
+            name='next_refresh_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videosyncstate',
+            name='priority',
+            field=models.SmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0007_refresh_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fetchrun',
+            name='snapshot',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0008_fetch_run_snapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='questionstats',
+            name='question_id',
+            field=models.IntegerField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='video_id',
+            field=models.IntegerField(unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='interactionstats',
+            index=models.Index(fields=['-total_clicks'], name='interaction_clicks_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionanswer',
+            index=models.Index(fields=['-answered_count'], name='answer_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionstats',
+            index=models.Index(fields=['-total_answered'], name='question_answered_idx'),
+        ),
+    ]
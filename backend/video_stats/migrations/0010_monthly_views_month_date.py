@@ -0,0 +1,80 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:30
+
+from django.db import migrations, models
+from datetime import date
+
+
+def copy_month_to_date(apps, schema_editor):
+    """Turns the 'YYYY-MM' strings into the first day of that month. Rows without a valid month, stored as '' when
+    stats/views left out the period, are deleted, as the ingest skips those months now."""
+    MonthlyViews = apps.get_model('video_stats', 'MonthlyViews')
+    rows = []
+    invalid_ids = []
+    for row in MonthlyViews.objects.only('id', 'month').iterator(chunk_size=2000):
+        try:
+            year, month = map(int, row.month.split('-')[:2])
+            row.month_date = date(year, month, 1)
+        except ValueError:
+            invalid_ids.append(row.id)
+            continue
+        rows.append(row)
+        if len(rows) >= 2000:
+            MonthlyViews.objects.bulk_update(rows, ['month_date'])
+            rows = []
+    MonthlyViews.objects.bulk_update(rows, ['month_date'])
+    for start in range(0, len(invalid_ids), 2000):
+        MonthlyViews.objects.filter(id__in=invalid_ids[start:start + 2000]).delete()
+
+
+def copy_date_to_month(apps, schema_editor):
+    MonthlyViews = apps.get_model('video_stats', 'MonthlyViews')
+    rows = []
+    for row in MonthlyViews.objects.only('id', 'month_date').iterator(chunk_size=2000):
+        row.month = row.month_date.strftime('%Y-%m')
+        rows.append(row)
+        if len(rows) >= 2000:
+            MonthlyViews.objects.bulk_update(rows, ['month'])
+            rows = []
+    MonthlyViews.objects.bulk_update(rows, ['month'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0009_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlyviews',
+            name='month_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(copy_month_to_date, copy_date_to_month),
+        migrations.AlterUniqueTogether(
+            name='monthlyviews',
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name='monthlyviews',
+            name='month',
+        ),
+        migrations.RenameField(
+            model_name='monthlyviews',
+            old_name='month_date',
+            new_name='month',
+        ),
+        migrations.AlterField(
+            model_name='monthlyviews',
+            name='month',
+            field=models.DateField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyviews',
+            unique_together={('video', 'month')},
+        ),
+        migrations.AddIndex(
+            model_name='monthlyviews',
+            index=models.Index(fields=['month'], name='monthly_views_month_idx'),
+        ),
+    ]
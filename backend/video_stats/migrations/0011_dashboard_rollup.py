@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0010_monthly_views_month_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField()),
+                ('key', models.IntegerField()),
+                ('label', models.CharField(blank=True, default='')),
+                ('videos', models.IntegerField()),
+                ('total_views', models.BigIntegerField()),
+                ('started_views', models.BigIntegerField()),
+                ('finished_views', models.BigIntegerField()),
+                ('interaction_clicks', models.BigIntegerField()),
+                ('num_questions', models.BigIntegerField()),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('scope', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.db import migrations
+from datetime import date
+
+# A frozen copy of what video_stats.partitions did when this migration was written, so later changes to that
+# module can't change what the migration does. MonthlyViews gets range partitioned on month, one partition per
+# calendar year plus a default partition for months no yearly partition covers yet.
+PARTITION_KEY = 'month'
+UNPARTITIONED_SUFFIX = '__unpartitioned'
+PARTITIONED_SUFFIX = '__partitioned'
+
+
+def partition_name(table, year=None):
+    return f'{table}_default' if year is None else f'{table}_y{year}'
+
+
+def is_partitioned(cursor, quote, table):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", [quote(table)])
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def create_partition(cursor, quote, table, year):
+    name = partition_name(table, year)
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    cursor.execute(f'CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(f'ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)', [start, end])
+
+
+def rebuild(cursor, quote, table, partitioned):
+    """Moves table aside and creates an empty copy of its columns under its name, partitioned by year or not"""
+    cursor.execute("SELECT conname FROM pg_constraint WHERE contype = 'f' AND confrelid = %s::regclass", [quote(table)])
+    if cursor.fetchall():
+        raise RuntimeError(f"Other tables have foreign keys to {table}, it can't be rebuilt")
+    old = table + (UNPARTITIONED_SUFFIX if partitioned else PARTITIONED_SUFFIX)
+    cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(old)}')
+    partition_by = f' PARTITION BY RANGE ({quote(PARTITION_KEY)})' if partitioned else ''
+    cursor.execute(
+        f'CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING STORAGE)'
+        + partition_by
+    )
+    return old
+
+
+def finish_rebuild(cursor, quote, table, old, partitioned):
+    """Copies the rows of old into table and puts the constraints, indexes and id sequence back under their names"""
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f') AND conparentid = 0 ORDER BY contype DESC",
+        [quote(old)],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+        "WHERE x.indrelid = %s::regclass AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.oid)",
+        [quote(old)],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [quote(old)])
+    old_sequence = cursor.fetchone()[0]
+
+    cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(old)}')
+    cursor.execute(f'DROP TABLE {quote(old)} CASCADE')
+
+    for name, definition in constraints:
+        if definition.startswith('PRIMARY KEY'):
+            # A partitioned table's primary key has to contain the partition key
+            definition = f'PRIMARY KEY (id, {quote(PARTITION_KEY)})' if partitioned else 'PRIMARY KEY (id)'
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
+    for name, definition in indexes:
+        cursor.execute(f"CREATE INDEX {quote(name)} ON {quote(table)} USING {definition.split(' USING ', 1)[1]}")
+
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [quote(table)])
+    sequence = cursor.fetchone()[0]
+    cursor.execute(f'SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) FROM {quote(table)}', [sequence])
+    if old_sequence and sequence != old_sequence:
+        cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO {old_sequence.split('.')[-1]}")
+    cursor.execute(f'ANALYZE {quote(table)}')
+
+
+def partition(apps, schema_editor):
+    """Partitions MonthlyViews by year on PostgreSQL when PARTITION_MONTHLY_VIEWS is set, a no-op otherwise"""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or not settings.PARTITION_MONTHLY_VIEWS:
+        return
+    quote = connection.ops.quote_name
+    table = apps.get_model('video_stats', 'MonthlyViews')._meta.db_table
+    with connection.cursor() as cursor:
+        if is_partitioned(cursor, quote, table):
+            return
+        cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT MIN({quote(PARTITION_KEY)}) FROM {quote(table)}')
+        oldest = cursor.fetchone()[0]
+        through_year = date.today().year + 1
+        old = rebuild(cursor, quote, table, partitioned=True)
+        cursor.execute(f'CREATE TABLE {quote(partition_name(table))} PARTITION OF {quote(table)} DEFAULT')
+        for year in range(min(oldest.year if oldest else date.today().year, through_year), through_year + 1):
+            create_partition(cursor, quote, table, year)
+        finish_rebuild(cursor, quote, table, old, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    quote = connection.ops.quote_name
+    table = apps.get_model('video_stats', 'MonthlyViews')._meta.db_table
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor, quote, table):
+            return
+        cursor.execute(f'LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE')
+        old = rebuild(cursor, quote, table, partitioned=False)
+        finish_rebuild(cursor, quote, table, old, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0011_dashboard_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,129 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+PROFILE_FIELDS = ['viewer_os', 'os_version', 'viewer_browser', 'browser_version', 'viewer_device', 'viewer_mobile', 'is_bot']
+
+
+def sessions_to_profiles(apps, schema_editor):
+    """Creates one UserAgentProfile per distinct user agent, then points every session at its profile with a single
+    UPDATE ... FROM join (PostgreSQL, and SQLite 3.33+)"""
+    quote = schema_editor.connection.ops.quote_name
+    sessions = quote(apps.get_model('video_stats', 'ViewSession')._meta.db_table)
+    profiles = quote(apps.get_model('video_stats', 'UserAgentProfile')._meta.db_table)
+    columns = ', '.join(quote(field) for field in PROFILE_FIELDS)
+    schema_editor.execute(f'INSERT INTO {profiles} ({columns}) SELECT DISTINCT {columns} FROM {sessions}')
+    same_agent = ' AND '.join(f'{profiles}.{quote(field)} = {sessions}.{quote(field)}' for field in PROFILE_FIELDS)
+    schema_editor.execute(f'UPDATE {sessions} SET {quote("profile_id")} = {profiles}.{quote("id")} FROM {profiles} WHERE {same_agent}')
+
+
+def profiles_to_sessions(apps, schema_editor):
+    quote = schema_editor.connection.ops.quote_name
+    sessions = quote(apps.get_model('video_stats', 'ViewSession')._meta.db_table)
+    profiles = quote(apps.get_model('video_stats', 'UserAgentProfile')._meta.db_table)
+    assignments = ', '.join(f'{quote(field)} = {profiles}.{quote(field)}' for field in PROFILE_FIELDS)
+    schema_editor.execute(
+        f'UPDATE {sessions} SET {assignments} FROM {profiles} WHERE {profiles}.{quote("id")} = {sessions}.{quote("profile_id")}'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0012_partition_monthly_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAgentProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('viewer_os', models.CharField()),
+                ('os_version', models.CharField()),
+                ('viewer_browser', models.CharField()),
+                ('browser_version', models.CharField()),
+                ('viewer_device', models.CharField()),
+                ('viewer_mobile', models.BooleanField()),
+                ('is_bot', models.BooleanField()),
+            ],
+            options={
+                'unique_together': {('viewer_os', 'os_version', 'viewer_browser', 'browser_version', 'viewer_device', 'viewer_mobile', 'is_bot')},
+            },
+        ),
+        migrations.AddField(
+            model_name='viewsession',
+            name='profile',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sessions', to='video_stats.useragentprofile'),
+        ),
+        # Lets the reverse migration add the columns back before filling them in
+        migrations.AlterField(
+            model_name='viewsession',
+            name='viewer_os',
+            field=models.CharField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='viewsession',
+            name='os_version',
+            field=models.CharField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='viewsession',
+            name='viewer_browser',
+            field=models.CharField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='viewsession',
+            name='browser_version',
+            field=models.CharField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='viewsession',
+            name='viewer_device',
+            field=models.CharField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='viewsession',
+            name='viewer_mobile',
+            field=models.BooleanField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='viewsession',
+            name='is_bot',
+            field=models.BooleanField(null=True),
+        ),
+        migrations.RunPython(sessions_to_profiles, profiles_to_sessions),
+        migrations.AlterField(
+            model_name='viewsession',
+            name='profile',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sessions', to='video_stats.useragentprofile'),
+        ),
+        migrations.RemoveField(
+            model_name='viewsession',
+            name='viewer_os',
+        ),
+        migrations.RemoveField(
+            model_name='viewsession',
+            name='os_version',
+        ),
+        migrations.RemoveField(
+            model_name='viewsession',
+            name='viewer_browser',
+        ),
+        migrations.RemoveField(
+            model_name='viewsession',
+            name='browser_version',
+        ),
+        migrations.RemoveField(
+            model_name='viewsession',
+            name='viewer_device',
+        ),
+        migrations.RemoveField(
+            model_name='viewsession',
+            name='viewer_mobile',
+        ),
+        migrations.RemoveField(
+            model_name='viewsession',
+            name='is_bot',
+        ),
+    ]
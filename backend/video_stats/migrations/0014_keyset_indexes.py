@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0013_view_session_profiles'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='interactionstats',
+            name='interaction_clicks_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='questionanswer',
+            name='answer_count_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='questionstats',
+            name='question_answered_idx',
+        ),
+        migrations.AddIndex(
+            model_name='interactionstats',
+            index=models.Index(fields=['-total_clicks', 'id'], name='interaction_clicks_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionanswer',
+            index=models.Index(fields=['-answered_count', 'id'], name='answer_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionstats',
+            index=models.Index(fields=['-total_answered', 'id'], name='question_answered_idx'),
+        ),
+    ]
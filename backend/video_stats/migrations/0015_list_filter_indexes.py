@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0014_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interactionstats',
+            index=models.Index(fields=['video', 'created_at'], name='interaction_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionstats',
+            index=models.Index(fields=['video', 'created_at'], name='question_created_idx'),
+        ),
+    ]
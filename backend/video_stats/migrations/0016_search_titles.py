@@ -0,0 +1,80 @@
+from django.db import migrations, models
+from html import unescape
+import re
+import unicodedata
+
+# Model: trigram index on its search_title
+TRIGRAM_INDEXES = {
+    'video': 'video_search_title_trgm_idx',
+    'questionstats': 'question_search_title_trgm_idx',
+}
+BATCH_SIZE = 1000
+
+# A frozen copy of video_stats.search.search_text as it was when this migration was written, so later changes to
+# the normalization can't change what the migration does
+HTML_COMMENT_PATTERN = re.compile(r'<!--.*?-->', re.DOTALL)
+HTML_TAG_PATTERN = re.compile(r'<[^>]*>')
+
+
+def search_text(title):
+    text = HTML_TAG_PATTERN.sub(' ', HTML_COMMENT_PATTERN.sub(' ', title or ''))
+    return ' '.join(unicodedata.normalize('NFKC', unescape(text)).casefold().split())
+
+
+def fill_search_titles(apps, schema_editor):
+    """Fills search_title in batches by primary key, so the tables are never loaded whole"""
+    for model_name in TRIGRAM_INDEXES:
+        model = apps.get_model('video_stats', model_name)
+        last_pk = 0
+        while True:
+            rows = list(model.objects.only('id', 'title').filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+            if not rows:
+                break
+            for row in rows:
+                row.search_title = search_text(row.title)
+            model.objects.bulk_update(rows, ['search_title'], batch_size=BATCH_SIZE)
+            last_pk = rows[-1].pk
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """GIN trigram indexes for the LIKE '%term%' searches. PostgreSQL only, and only where the server has pg_trgm,
+    otherwise searches use the in-memory index like on SQLite."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')")
+        if not cursor.fetchone()[0]:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for model_name, index in TRIGRAM_INDEXES.items():
+        table = apps.get_model('video_stats', model_name)._meta.db_table
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{index}" ON "{table}" USING gin ("search_title" gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index in TRIGRAM_INDEXES.values():
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{index}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_stats', '0015_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionstats',
+            name='search_title',
+            field=models.CharField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='search_title',
+            field=models.CharField(blank=True, default=''),
+        ),
+        migrations.RunPython(fill_search_titles, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -1,9 +1,11 @@
 from django.db import models
+from django.utils import timezone
 
 class Video(models.Model):
-    video_id = models.IntegerField()
+    video_id = models.IntegerField(unique=True)
     uuid = models.CharField()
     title = models.CharField()
+    search_title = models.CharField(blank=True, default="") # Plain-text title searches run against, see search.search_text
     status = models.IntegerField()
     folder_name = models.CharField()
     folder_number = models.IntegerField()
@@ -21,6 +23,9 @@ class VideoStats(models.Model):
     num_questions = models.IntegerField()
     video_duration_seconds = models.FloatField()
 
+    class Meta:
+        unique_together = ('video',)
+
 class InteractionStats(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
     interaction_id = models.IntegerField()
@@ -34,19 +39,31 @@ class InteractionStats(models.Model):
     total_clicks = models.IntegerField()
     created_at = models.DateTimeField()
 
+    class Meta:
+        unique_together = ('video', 'interaction_id')
+        indexes = [
+            models.Index(fields=['-total_clicks', 'id'], name='interaction_clicks_idx'),
+            models.Index(fields=['video', 'created_at'], name='interaction_created_idx'),
+        ]
+
 class MonthlyViews(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
-    month = models.CharField()
+    month = models.DateField() # First day of the month
     total_views = models.IntegerField()
     started_views = models.IntegerField()
     finished_views = models.IntegerField()
     passed_views = models.IntegerField()
     failed_views = models.IntegerField()
     unfinished_views = models.IntegerField()
-    
-class ViewSession(models.Model):
-    video = models.ForeignKey(Video, on_delete=models.CASCADE)
-    object_id = models.IntegerField()
+
+    class Meta:
+        unique_together = ('video', 'month')
+        indexes = [
+            models.Index(fields=['month'], name='monthly_views_month_idx'),
+        ]
+
+class UserAgentProfile(models.Model):
+    # One row per distinct parsed user agent, shared by every ViewSession with that agent
     viewer_os = models.CharField()
     os_version = models.CharField()
     viewer_browser = models.CharField()
@@ -54,12 +71,24 @@ class ViewSession(models.Model):
     viewer_device = models.CharField()
     viewer_mobile = models.BooleanField()
     is_bot = models.BooleanField()
+
+    class Meta:
+        unique_together = ('viewer_os', 'os_version', 'viewer_browser', 'browser_version', 'viewer_device', 'viewer_mobile', 'is_bot')
+
+class ViewSession(models.Model):
+    video = models.ForeignKey(Video, on_delete=models.CASCADE)
+    object_id = models.IntegerField()
+    profile = models.ForeignKey(UserAgentProfile, on_delete=models.PROTECT, related_name="sessions")
     viewer_count = models.IntegerField()
 
+    class Meta:
+        unique_together = ('video', 'object_id')
+
 class QuestionStats(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
-    question_id = models.IntegerField()
+    question_id = models.IntegerField(db_index=True) # QuestionAnswersByQuestionView looks answers up by it
     title = models.CharField()
+    search_title = models.CharField(blank=True, default="") # Without the <!--TINYMCE--> HTML, see search.search_text
     type = models.CharField()
     video_time_seconds = models.FloatField()
     average_answer_time_seconds = models.FloatField()
@@ -67,6 +96,13 @@ class QuestionStats(models.Model):
     total_correctly_answered = models.IntegerField()
     created_at = models.DateTimeField()
 
+    class Meta:
+        unique_together = ('video', 'question_id')
+        indexes = [
+            models.Index(fields=['-total_answered', 'id'], name='question_answered_idx'),
+            models.Index(fields=['video', 'created_at'], name='question_created_idx'),
+        ]
+
 class QuestionAnswer(models.Model):
     question = models.ForeignKey(QuestionStats, on_delete=models.CASCADE)
     label = models.CharField()
@@ -75,6 +111,9 @@ class QuestionAnswer(models.Model):
 
     class Meta:
         unique_together = ('question', 'label')
+        indexes = [
+            models.Index(fields=['-answered_count', 'id'], name='answer_count_idx'),
+        ]
 
 class VideoRating(models.Model):
     video = models.ForeignKey(Video, on_delete=models.CASCADE)
@@ -85,3 +124,54 @@ class VideoRating(models.Model):
     three_star = models.IntegerField()
     four_star = models.IntegerField()
     five_star = models.IntegerField()
+
+    class Meta:
+        unique_together = ('video', 'rating_id')
+
+class DashboardRollup(models.Model):
+    scope = models.CharField() # 'global', 'folder' or 'status'
+    key = models.IntegerField() # Folder number or status, 0 for the global row
+    label = models.CharField(blank=True, default="") # Folder name
+    videos = models.IntegerField()
+    total_views = models.BigIntegerField()
+    started_views = models.BigIntegerField()
+    finished_views = models.BigIntegerField()
+    interaction_clicks = models.BigIntegerField()
+    num_questions = models.BigIntegerField()
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('scope', 'key')
+
+class VideoSyncState(models.Model):
+    video = models.OneToOneField(Video, on_delete=models.CASCADE, related_name="sync_state")
+    last_finalized_month = models.CharField(null=True, blank=True) # 'YYYY-MM', monthly views up to this month are final
+    priority = models.SmallIntegerField(default=0) # Refresh tier, 0 hot, 1 warm, 2 dormant
+    last_refreshed_at = models.DateTimeField(null=True, blank=True)
+    next_refresh_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+class PayloadFingerprint(models.Model):
+    video = models.ForeignKey(Video, on_delete=models.CASCADE)
+    endpoint = models.CharField()
+    digest = models.CharField(max_length=64) # sha256 of the last payload written for this endpoint
+
+    class Meta:
+        unique_together = ('video', 'endpoint')
+
+class FetchRun(models.Model):
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    full = models.BooleanField(default=False)
+    snapshot = models.BooleanField(default=False) # Loaded into staging tables and published at the end
+    shard = models.CharField(blank=True, default="") # 'K/N' for one shard, '*/N' for a coordinator, blank when unsharded
+    coordinator = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name="shard_runs")
+    summary = models.JSONField(default=dict)
+
+class FetchCheckpoint(models.Model):
+    run = models.ForeignKey(FetchRun, on_delete=models.CASCADE, related_name="checkpoints")
+    video_id = models.IntegerField() # HiHaHo video id, the Video row may not exist yet
+    completed_endpoints = models.JSONField(default=list)
+    saved_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('run', 'video_id')
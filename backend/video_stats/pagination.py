@@ -1,4 +1,131 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as Base64Error
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+import json
+
+PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+PAGE_SIZE_QUERY_PARAM = "page_size"
+CURSOR_QUERY_PARAM = "cursor"
+
+def encode_cursor(keys, reverse):
+    """Opaque cursor for the row with these sort key values, reverse for the page before it"""
+    payload = json.dumps({"k": keys, "r": reverse}, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        keys, reverse = payload["k"], payload["r"]
+    except (Base64Error, ValueError, TypeError, KeyError):
+        raise NotFound("Invalid cursor")
+    if not isinstance(keys, list) or not isinstance(reverse, bool):
+        raise NotFound("Invalid cursor")
+    return keys, reverse
+
+class KeysetPagination(BasePagination):
+    """Pages through the queryset by its ordering instead of an OFFSET, so every page costs the same index range scan
+    and no COUNT(*) is run. The ordering must end with the primary key to make the sort keys unique.
+    Works on model instances as well as values_list() querysets that include the sort keys."""
+    page_size = PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    page_size_query_param = PAGE_SIZE_QUERY_PARAM
+    cursor_query_param = CURSOR_QUERY_PARAM
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        ordering = [(field.lstrip("-"), field.startswith("-")) for field in queryset.query.order_by]
+        if not ordering or ordering[-1][0] not in ("id", "pk"):
+            raise ImproperlyConfigured(f"Keyset pagination needs an ordering ending with the primary key, got {queryset.query.order_by}")
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        keys, reverse = decode_cursor(cursor) if cursor else (None, False)
+        if keys is not None and len(keys) != len(ordering):
+            raise NotFound("Invalid cursor")
+        # A well-formed cursor can still carry keys the sort fields don't take, like a string for the id or a null
+        try:
+            if keys is not None:
+                queryset = queryset.filter(self.after(ordering, keys, reverse))
+            if reverse:
+                queryset = queryset.order_by(*(("" if descending else "-") + field for field, descending in ordering))
+            rows = list(queryset[:self.page_size + 1])
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound("Invalid cursor")
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        key_of = self.key_getter(queryset, [field for field, _ in ordering])
+        self.next_keys = key_of(rows[-1]) if rows and (has_more or reverse) else None
+        self.previous_keys = key_of(rows[0]) if rows and keys is not None and (has_more or not reverse) else None
+        return rows
+
+    @staticmethod
+    def after(ordering, keys, reverse):
+        """Rows sorting after keys, or before them when reverse: (a, b) > (x, y) is a > x OR (a = x AND b > y).
+        The redundant a >= x in front gives the database a range to scan on the index."""
+        condition = Q()
+        for index, (field, descending) in enumerate(ordering):
+            lookup = "lt" if descending != reverse else "gt"
+            equal = {ordering[prefix][0]: keys[prefix] for prefix in range(index)}
+            condition = condition | Q(**equal, **{f"{field}__{lookup}": keys[index]})
+        first, descending = ordering[0]
+        return Q(**{f"{first}__{'lte' if descending != reverse else 'gte'}": keys[0]}) & condition
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    @staticmethod
+    def key_getter(queryset, fields):
+        if queryset._fields is None:
+            return lambda row: [getattr(row, field) for field in fields]
+        names = ["id" if name == "pk" else name for name in queryset._fields]
+        missing = [field for field in fields if ("id" if field == "pk" else field) not in names]
+        if missing:
+            raise ImproperlyConfigured(f"Keyset pagination reads the sort keys from the rows, {missing} aren't selected")
+        indexes = [names.index("id" if field == "pk" else field) for field in fields]
+        return lambda row: [row[index] for index in indexes]
+
+    def link(self, keys, reverse):
+        if keys is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), "page")
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(keys, reverse))
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.link(self.next_keys, False),
+            "previous": self.link(self.previous_keys, True),
+            "results": data,
+        })
 
 class ViewPagination(PageNumberPagination):
-    page_size = 1000
\ No newline at end of file
+    """Page numbers with a count, as the frontend tables use them, or keyset pages when ?cursor= is passed
+    (empty for the first page, then the next and previous links of the response)"""
+    page_size = PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    page_size_query_param = PAGE_SIZE_QUERY_PARAM
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if CURSOR_QUERY_PARAM in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
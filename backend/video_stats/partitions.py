@@ -0,0 +1,200 @@
+from django.db import connection, transaction
+from datetime import date
+import re
+
+from .models import MonthlyViews
+
+# MonthlyViews is range partitioned on month, one partition per calendar year plus a default partition
+# that catches months no yearly partition covers yet. PostgreSQL only, SQLite keeps the plain table.
+PARTITION_KEY = "month"
+UNPARTITIONED_SUFFIX = "__unpartitioned"
+PARTITIONED_SUFFIX = "__partitioned"
+
+class PartitionError(Exception):
+    pass
+
+def monthly_views_table():
+    return MonthlyViews._meta.db_table
+
+def partition_name(table, year=None):
+    return f"{table}_default" if year is None else f"{table}_y{year}"
+
+def is_partitioned(table=None):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", [quote(table or monthly_views_table())])
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+def list_partitions(cursor, table):
+    """Returns [(partition, year or None for the default partition, estimated rows)] of a partitioned table"""
+    cursor.execute(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass ORDER BY 2",
+        [quote(table)],
+    )
+    partitions = []
+    for name, bound, rows in cursor.fetchall():
+        match = re.search(r"FROM \('(\d{4})-01-01'\)", bound)
+        partitions.append((name, int(match.group(1)) if match else None, max(rows, 0)))
+    return partitions
+
+def create_partition(cursor, table, year):
+    """Adds the partition for one calendar year. Rows of that year already sitting in the default partition
+    are moved into it first, since PostgreSQL refuses to attach a range the default partition has rows for."""
+    name = partition_name(table, year)
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    default = partition_name(table)
+    if any(partition_year is None for _, partition_year, _ in list_partitions(cursor, table)):
+        in_range = f"{quote(PARTITION_KEY)} >= %s AND {quote(PARTITION_KEY)} < %s"
+        cursor.execute(f"INSERT INTO {quote(name)} SELECT * FROM {quote(default)} WHERE {in_range}", [start, end])
+        cursor.execute(f"DELETE FROM {quote(default)} WHERE {in_range}", [start, end])
+    # Attaching creates the parent's indexes, unique constraints and foreign keys on the new partition
+    cursor.execute(f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)", [start, end])
+    return name
+
+def create_default_partition(cursor, table):
+    name = partition_name(table)
+    cursor.execute(f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)} DEFAULT")
+    return name
+
+def ensure_partitions(through_year, since_year=None):
+    """Creates the missing yearly partitions up to through_year, starting from the oldest attached partition,
+    the oldest month in the default partition or this year, whichever is earliest, but not before since_year.
+    Returns the names of the partitions created."""
+    table = monthly_views_table()
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        years = {year for _, year, _ in list_partitions(cursor, table) if year is not None}
+        cursor.execute(f"SELECT MIN({quote(PARTITION_KEY)}) FROM {quote(partition_name(table))}")
+        oldest = cursor.fetchone()[0]
+        start = min(years | {date.today().year} | ({oldest.year} if oldest else set()))
+        for year in range(max(start, since_year or start), through_year + 1):
+            if year not in years:
+                created.append(create_partition(cursor, table, year))
+    return created
+
+def detach_partitions(before_year, drop=False):
+    """Detaches the yearly partitions older than before_year, so their months drop out of every query.
+    Detached partitions are kept as standalone tables unless drop is set. Returns their names."""
+    table = monthly_views_table()
+    detached = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for name, year, _ in list_partitions(cursor, table):
+            if year is None or year >= before_year:
+                continue
+            cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+            if drop:
+                cursor.execute(f"DROP TABLE {quote(name)}")
+            else:
+                # Frees the name, in case the year is ever partitioned again
+                archived = f"{table}_archive_y{year}"
+                cursor.execute(f"ALTER TABLE {quote(name)} RENAME TO {quote(archived)}")
+                name = archived
+            detached.append(name)
+    return detached
+
+def rename_partitions(cursor, table):
+    """Gives every partition of table, and its indexes, the name partition_name() expects.
+    Used after a snapshot's staging table replaced the live one."""
+    for name, year, _ in list_partitions(cursor, table):
+        expected = partition_name(table, year)
+        if name == expected:
+            continue
+        cursor.execute("SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass", [quote(name)])
+        for (index,) in cursor.fetchall():
+            index = index.strip('"')
+            if index.startswith(name):
+                cursor.execute(f"ALTER INDEX {quote(index)} RENAME TO {quote(expected + index[len(name):])}")
+        cursor.execute(f"ALTER TABLE {quote(name)} RENAME TO {quote(expected)}")
+
+def copy_partitions(cursor, table, target):
+    """Partitions target, a partitioned copy of table, by the same years"""
+    for _, year, _ in list_partitions(cursor, table):
+        if year is None:
+            create_default_partition(cursor, target)
+        else:
+            create_partition(cursor, target, year)
+
+def partition_monthly_views(through_year=None):
+    """Rebuilds MonthlyViews as a table partitioned by year, with a partition for every year it has months in
+    up to through_year (default next year). Holds an exclusive lock on the table while the rows are copied."""
+    through_year = through_year or date.today().year + 1
+    table = monthly_views_table()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"SELECT MIN({quote(PARTITION_KEY)}) FROM {quote(table)}")
+        oldest = cursor.fetchone()[0]
+        old = rebuild(cursor, table, partitioned=True)
+        create_default_partition(cursor, table)
+        for year in range(min(oldest.year if oldest else date.today().year, through_year), through_year + 1):
+            create_partition(cursor, table, year)
+        finish_rebuild(cursor, table, old, partitioned=True)
+
+def unpartition_monthly_views():
+    """Turns MonthlyViews back into a plain table. Months in detached partitions are not brought back."""
+    table = monthly_views_table()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE")
+        old = rebuild(cursor, table, partitioned=False)
+        finish_rebuild(cursor, table, old, partitioned=False)
+
+def rebuild(cursor, table, partitioned):
+    """Moves table aside and creates an empty copy of its columns under its name, partitioned by year or not.
+    finish_rebuild() then copies the rows and puts the constraints and indexes back under their original names.
+    Returns the name the old table was moved to."""
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE contype = 'f' AND confrelid = %s::regclass", [quote(table)]
+    )
+    if cursor.fetchall():
+        raise PartitionError(f"Other tables have foreign keys to {table}, it can't be rebuilt")
+    old = table + (UNPARTITIONED_SUFFIX if partitioned else PARTITIONED_SUFFIX)
+    cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old)}")
+    partition_by = f" PARTITION BY RANGE ({quote(PARTITION_KEY)})" if partitioned else ""
+    cursor.execute(
+        f"CREATE TABLE {quote(table)} (LIKE {quote(old)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING STORAGE)"
+        + partition_by
+    )
+    return old
+
+def finish_rebuild(cursor, table, old, partitioned):
+    # Only the parent's own constraints, not the copies PostgreSQL keeps on each partition
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f') AND conparentid = 0 ORDER BY contype DESC",
+        [quote(old)],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+        "WHERE x.indrelid = %s::regclass AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.oid)",
+        [quote(old)],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [quote(old)])
+    old_sequence = cursor.fetchone()[0]
+
+    cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old)}")
+    # CASCADE takes the old partitions with it, dropping also frees the constraint and index names
+    cursor.execute(f"DROP TABLE {quote(old)} CASCADE")
+
+    for name, definition in constraints:
+        if definition.startswith("PRIMARY KEY"):
+            # A partitioned table's primary key has to contain the partition key
+            definition = f"PRIMARY KEY (id, {quote(PARTITION_KEY)})" if partitioned else "PRIMARY KEY (id)"
+        cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
+    for name, definition in indexes:
+        cursor.execute(f"CREATE INDEX {quote(name)} ON {quote(table)} USING {definition.split(' USING ', 1)[1]}")
+
+    # The new identity column got its own sequence, continue it after the copied ids under the old name
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [quote(table)])
+    sequence = cursor.fetchone()[0]
+    cursor.execute(f"SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) FROM {quote(table)}", [sequence])
+    if old_sequence and sequence != old_sequence:
+        cursor.execute(f"ALTER SEQUENCE {sequence} RENAME TO {old_sequence.split('.')[-1]}")
+    cursor.execute(f"ANALYZE {quote(table)}")
+
+def quote(name):
+    return connection.ops.quote_name(name)
@@ -0,0 +1,111 @@
+from django.db.models import F, Q
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+from datetime import timedelta
+import os
+from dotenv import load_dotenv
+
+from .models import MonthlyViews, Video, VideoSyncState
+from .bulk_writer import bulk_upsert
+
+load_dotenv()
+HOT_MINUTES = int(os.getenv("REFRESH_HOT_MINUTES", "60"))
+WARM_MINUTES = int(os.getenv("REFRESH_WARM_MINUTES", str(24 * 60)))
+DORMANT_MINUTES = int(os.getenv("REFRESH_DORMANT_MINUTES", str(7 * 24 * 60)))
+NEW_VIDEO_DAYS = int(os.getenv("REFRESH_NEW_VIDEO_DAYS", "30"))
+WARM_MONTHS = 6
+
+HOT, WARM, DORMANT = 0, 1, 2
+TIER_NAMES = {HOT: "hot", WARM: "warm", DORMANT: "dormant"}
+
+# Keeps the id lists of the scheduling queries well under the SQLite variable limit
+CHUNK_SIZE = 500
+
+class RefreshPolicy:
+    """Decides how often each video is re-fetched.
+    Hot videos (created recently or viewed this or last month) are refreshed every hot_minutes,
+    warm ones (viewed in the last six months) every warm_minutes and the rest every dormant_minutes."""
+
+    def __init__(self, hot_minutes=HOT_MINUTES, warm_minutes=WARM_MINUTES,
+                 dormant_minutes=DORMANT_MINUTES, new_video_days=NEW_VIDEO_DAYS):
+        self.intervals = {
+            HOT: timedelta(minutes=hot_minutes),
+            WARM: timedelta(minutes=warm_minutes),
+            DORMANT: timedelta(minutes=dormant_minutes),
+        }
+        self.new_video_days = new_video_days
+
+    def priorities(self, video_ids, now=None):
+        """Returns {video_id: tier} for the given HiHaHo video ids, from the views and creation dates already stored"""
+        now = now or timezone.now()
+        this_month = now.date().replace(day=1)
+        hot_since = this_month - relativedelta(months=1)
+        warm_since = this_month - relativedelta(months=WARM_MONTHS)
+        new_since = now - timedelta(days=self.new_video_days)
+
+        priorities = {}
+        video_ids = list(video_ids)
+        for start in range(0, len(video_ids), CHUNK_SIZE):
+            chunk = video_ids[start:start + CHUNK_SIZE]
+            latest_viewed = {}
+            for video_id, month in MonthlyViews.objects.filter(
+                video__video_id__in=chunk, month__gte=warm_since, total_views__gt=0
+            ).values_list("video__video_id", "month"):
+                latest_viewed[video_id] = max(month, latest_viewed.get(video_id, month))
+            new_videos = set(Video.objects.filter(
+                video_id__in=chunk, created_date__gte=new_since
+            ).values_list("video_id", flat=True))
+
+            for video_id in chunk:
+                if video_id in new_videos or latest_viewed.get(video_id, warm_since) >= hot_since:
+                    priorities[video_id] = HOT
+                elif video_id in latest_viewed:
+                    priorities[video_id] = WARM
+                else:
+                    priorities[video_id] = DORMANT
+        return priorities
+
+    def schedule(self, video_ids, now=None):
+        """Records that these videos were just refreshed and when each is due again. Returns {tier: count}"""
+        now = now or timezone.now()
+        priorities = self.priorities(video_ids, now)
+        video_pks = {}
+        video_ids = list(priorities)
+        for start in range(0, len(video_ids), CHUNK_SIZE):
+            video_pks.update(Video.objects.filter(
+                video_id__in=video_ids[start:start + CHUNK_SIZE]
+            ).values_list("video_id", "pk"))
+
+        states = [
+            VideoSyncState(
+                video_id=video_pks[video_id],
+                priority=priority,
+                last_refreshed_at=now,
+                next_refresh_at=now + self.intervals[priority],
+            )
+            for video_id, priority in priorities.items()
+            if video_id in video_pks
+        ]
+        for start in range(0, len(states), CHUNK_SIZE):
+            bulk_upsert(
+                VideoSyncState,
+                states[start:start + CHUNK_SIZE],
+                unique_fields=["video"],
+                update_fields=["priority", "last_refreshed_at", "next_refresh_at"],
+            )
+
+        counts = {name: 0 for name in TIER_NAMES.values()}
+        for state in states:
+            counts[TIER_NAMES[state.priority]] += 1
+        return counts
+
+    def due(self, limit, now=None):
+        """Returns up to limit stored videos whose refresh is due, hottest and most overdue first.
+        Videos that were never scheduled come before everything else."""
+        now = now or timezone.now()
+        return list(Video.objects.filter(
+            Q(sync_state=None) | Q(sync_state__next_refresh_at=None) | Q(sync_state__next_refresh_at__lte=now)
+        ).order_by(
+            F("sync_state__priority").asc(nulls_first=True),
+            F("sync_state__next_refresh_at").asc(nulls_first=True),
+        )[:limit])
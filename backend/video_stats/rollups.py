@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DashboardRollup, VideoStats
+from .bulk_writer import bulk_upsert
+
+ROLLUP_FIELDS = ("total_views", "started_views", "finished_views", "interaction_clicks", "num_questions")
+# Scope: (Video field it groups by, Video field used as the label)
+ROLLUP_SCOPES = {
+    "global": (None, None),
+    "folder": ("folder_number", "folder_name"),
+    "status": ("status", None),
+}
+
+def refresh_rollups():
+    """Recomputes the global, per-folder and per-status VideoStats totals, one aggregate query per scope.
+    Returns the number of rollup rows written."""
+    now = timezone.now()
+    totals = {"videos": Count("id"), **{field: Coalesce(Sum(field), 0) for field in ROLLUP_FIELDS}}
+
+    rollups = []
+    for scope, (key_field, label_field) in ROLLUP_SCOPES.items():
+        if key_field is None:
+            rows = [VideoStats.objects.aggregate(**totals)]
+        else:
+            group = [f"video__{key_field}"] + ([f"video__{label_field}"] if label_field else [])
+            rows = VideoStats.objects.values(*group).annotate(**totals).order_by(*group)
+
+        by_key = {}
+        for row in rows:
+            key = row.pop(f"video__{key_field}") if key_field else 0
+            label = row.pop(f"video__{label_field}") if label_field else ""
+            # A folder renamed mid-catalog shows up under two names, they are added up under the last one
+            if key in by_key:
+                for field in ("videos", *ROLLUP_FIELDS):
+                    row[field] += getattr(by_key[key], field)
+            by_key[key] = DashboardRollup(scope=scope, key=key, label=label or "", refreshed_at=now, **row)
+        rollups += by_key.values()
+
+    with transaction.atomic():
+        bulk_upsert(DashboardRollup, rollups, unique_fields=["scope", "key"])
+        DashboardRollup.objects.exclude(refreshed_at=now).delete()
+    return len(rollups)
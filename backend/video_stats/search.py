@@ -0,0 +1,132 @@
+from collections import Counter, defaultdict
+from django.db import connection
+from django.db.models import F, FloatField, Func, Max, Q, Value
+from heapq import nsmallest
+from html import unescape
+from .models import FetchRun
+from threading import Lock
+import re
+import unicodedata
+
+HTML_COMMENT_PATTERN = re.compile(r"<!--.*?-->", re.DOTALL)
+HTML_TAG_PATTERN = re.compile(r"<[^>]*>")
+WORD_PATTERN = re.compile(r"[^\W_]+") # Letters and digits, what pg_trgm splits words on
+# Words, or strings in quotes, split by spaces, the same way the frontend search boxes split them
+SEARCH_TERM_PATTERN = re.compile(r'(?:[^\s"]+|"[^"]*")+')
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+def search_terms(query):
+    return [term for term in (match.replace('"', "").strip() for match in SEARCH_TERM_PATTERN.findall(query)) if term]
+
+def search_text(title):
+    """Plain-text form of a title that searches run against: HTML comments and tags, like the <!--TINYMCE--> markup
+    of question titles, removed, entities decoded, NFKC-normalized so full-width characters match, casefolded
+    and with whitespace collapsed"""
+    text = HTML_TAG_PATTERN.sub(" ", HTML_COMMENT_PATTERN.sub(" ", title or ""))
+    return " ".join(unicodedata.normalize("NFKC", unescape(text)).casefold().split())
+
+def trigrams(text):
+    """Trigrams of every word, padded the way pg_trgm pads them, so both backends rank alike"""
+    grams = set()
+    for word in WORD_PATTERN.findall(text):
+        padded = f"  {word} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return grams
+
+class TrigramSimilarity(Func):
+    function = "similarity"
+    output_field = FloatField()
+
+class TrigramIndex:
+    """In-memory trigram index over the search_title column of a model, for SQLite and PostgreSQL without pg_trgm.
+    Titles only change during fetch runs, so it's rebuilt when a run starts or finishes, or new rows appear."""
+
+    def __init__(self, model):
+        self.model = model
+        self.version = None
+        self.titles = {}
+        self.sizes = {}
+        self.postings = defaultdict(set)
+        self.lock = Lock()
+
+    def current_version(self):
+        runs = FetchRun.objects.aggregate(last_started=Max("id"), last_finished=Max("finished_at"))
+        return self.model.objects.aggregate(last_id=Max("id"))["last_id"], runs["last_started"], runs["last_finished"]
+
+    def refresh(self):
+        version = self.current_version()
+        with self.lock:
+            if version == self.version:
+                return
+            titles = dict(self.model.objects.values_list("id", "search_title").iterator())
+            sizes = {}
+            postings = defaultdict(set)
+            for pk, title in titles.items():
+                title_grams = trigrams(title)
+                sizes[pk] = len(title_grams)
+                for gram in title_grams:
+                    postings[gram].add(pk)
+            self.titles, self.sizes, self.postings, self.version = titles, sizes, postings, version
+
+    def candidates(self, term):
+        """Ids whose title contains term. Any title containing it has the unpadded trigrams of the term's words,
+        so only titles in all their posting lists are checked, or every title for terms without one."""
+        inner = {word[index:index + 3] for word in WORD_PATTERN.findall(term) for index in range(len(word) - 2)}
+        if inner:
+            ids = set.intersection(*(self.postings.get(gram, set()) for gram in inner))
+        else:
+            ids = self.titles.keys()
+        return {pk for pk in ids if term in self.titles[pk]}
+
+    def search(self, terms, query, limit):
+        self.refresh()
+        query_grams = trigrams(query)
+        matches = set().union(*(self.candidates(term) for term in terms))
+        # Shared trigrams per title, counted off the posting lists, give pg_trgm's similarity(): shared / union
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+        best = nsmallest(limit, (
+            (-shared[pk] / (len(query_grams) + self.sizes[pk] - shared[pk] or 1), pk) for pk in matches
+        ))
+        return [(-rank, pk) for rank, pk in best]
+
+_indexes = {}
+_trigram_databases = {}
+
+def has_pg_trgm():
+    """Whether the database is PostgreSQL with the pg_trgm extension, which the 0016 migration only creates where
+    it's available"""
+    if connection.vendor != "postgresql":
+        return False
+    name = connection.settings_dict["NAME"]
+    if name not in _trigram_databases:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+            _trigram_databases[name] = cursor.fetchone()[0]
+    return _trigram_databases[name]
+
+def search_titles(model, query, limit=SEARCH_LIMIT):
+    """Returns [(rank, id)], best first, for the rows of model whose search_title contains any term of the query,
+    ranked by trigram similarity to the whole query. Uses the GIN trigram index where pg_trgm is installed and an
+    in-memory trigram index elsewhere."""
+    terms = [search_text(term) for term in search_terms(query)]
+    terms = [term for term in terms if term]
+    if not terms:
+        return []
+    query = " ".join(terms)
+
+    if has_pg_trgm():
+        matches = Q()
+        for term in terms:
+            matches |= Q(search_title__contains=term)
+        rows = model.objects.filter(matches).annotate(
+            rank=TrigramSimilarity(F("search_title"), Value(query))
+        ).order_by("-rank", "id").values_list("rank", "id")[:limit]
+        return [(round(rank, 4), pk) for rank, pk in rows]
+
+    index = _indexes.get(model)
+    if index is None:
+        index = _indexes.setdefault(model, TrigramIndex(model))
+    return [(round(rank, 4), pk) for rank, pk in index.search(terms, query, limit)]
@@ -4,7 +4,7 @@ from .models import *
 class VideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
-        fields = "__all__"
+        exclude = ["search_title"]
 
 class VideoStatsSerializer(serializers.ModelSerializer):
     video = VideoSerializer()
@@ -22,6 +22,7 @@ class InteractionStatsSerializer(serializers.ModelSerializer):
 
 class MonthlyViewsSerializer(serializers.ModelSerializer):
     video = VideoSerializer()
+    month = serializers.DateField(format="%Y-%m")
     
     class Meta:
         model = MonthlyViews
@@ -29,17 +30,28 @@ class MonthlyViewsSerializer(serializers.ModelSerializer):
 
 class ViewSessionSerializer(serializers.ModelSerializer):
     video = VideoSerializer()
+    # Stored once per distinct user agent in UserAgentProfile, flattened back onto the session
+    viewer_os = serializers.CharField(source="profile.viewer_os")
+    os_version = serializers.CharField(source="profile.os_version")
+    viewer_browser = serializers.CharField(source="profile.viewer_browser")
+    browser_version = serializers.CharField(source="profile.browser_version")
+    viewer_device = serializers.CharField(source="profile.viewer_device")
+    viewer_mobile = serializers.BooleanField(source="profile.viewer_mobile")
+    is_bot = serializers.BooleanField(source="profile.is_bot")
     
     class Meta:
         model = ViewSession
-        fields = "__all__"
+        fields = [
+            "id", "video", "object_id", "viewer_os", "os_version", "viewer_browser", "browser_version",
+            "viewer_device", "viewer_mobile", "is_bot", "viewer_count",
+        ]
 
 class QuestionStatsSerializer(serializers.ModelSerializer):
     video = VideoSerializer()
     
     class Meta:
         model = QuestionStats
-        fields = "__all__"
+        exclude = ["search_title"]
 
 class QuestionAnswerSerializer(serializers.ModelSerializer):
     question = QuestionStatsSerializer()
@@ -48,6 +60,31 @@ class QuestionAnswerSerializer(serializers.ModelSerializer):
         model = QuestionAnswer
         fields = "__all__"
 
+class VideoSummarySerializer(VideoStatsSerializer):
+    """VideoStats with the annotations of the summary endpoint"""
+    average_rating = serializers.FloatField() # -1 without a rating or with a 0 average
+    one_star = serializers.IntegerField()
+    two_star = serializers.IntegerField()
+    three_star = serializers.IntegerField()
+    four_star = serializers.IntegerField()
+    five_star = serializers.IntegerField()
+    views_last_month = serializers.IntegerField()
+    views_two_months_ago = serializers.IntegerField()
+    view_change_percent = serializers.FloatField()
+    view_rate = serializers.IntegerField()
+
+    class Meta(VideoStatsSerializer.Meta):
+        fields = [
+            "id", "video", "total_views", "started_views", "finished_views", "interaction_clicks", "num_questions",
+            "video_duration_seconds", "average_rating", "one_star", "two_star", "three_star", "four_star", "five_star",
+            "views_last_month", "views_two_months_ago", "view_change_percent", "view_rate",
+        ]
+
+class DashboardRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DashboardRollup
+        exclude = ["id", "scope"]
+
 class VideoRatingSerializer(serializers.ModelSerializer):
     video = VideoSerializer()
 
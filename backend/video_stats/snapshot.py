@@ -0,0 +1,213 @@
+from django.db import connection, transaction
+from contextlib import contextmanager
+import re
+
+from .partitions import PARTITION_KEY, copy_partitions, is_partitioned, rename_partitions
+from .models import (
+    DashboardRollup, InteractionStats, MonthlyViews, PayloadFingerprint, QuestionAnswer, QuestionStats,
+    UserAgentProfile, Video, VideoRating, VideoStats, VideoSyncState, ViewSession,
+)
+
+# Parents before children, every foreign key between these tables stays inside the set
+SNAPSHOT_MODELS = [
+    Video,
+    VideoStats,
+    InteractionStats,
+    MonthlyViews,
+    UserAgentProfile,
+    ViewSession,
+    QuestionStats,
+    QuestionAnswer,
+    VideoRating,
+    VideoSyncState,
+    PayloadFingerprint,
+    DashboardRollup,
+]
+STAGING_SUFFIX = "__staging"
+OLD_SUFFIX = "__old"
+
+class SnapshotError(Exception):
+    pass
+
+class StagingSnapshot:
+    """Loads a fetch run into staging copies of the dashboard tables and publishes them all at once.
+    The staging tables start as a copy of the live ones, so incremental runs only rewrite what changed,
+    and the dashboard keeps reading the previous complete snapshot until publish()."""
+
+    def __init__(self):
+        if connection.vendor not in ("postgresql", "sqlite"):
+            raise SnapshotError(f"Snapshot loads need PostgreSQL or SQLite, not {connection.vendor}")
+        self.live_tables = [model._meta.db_table for model in SNAPSHOT_MODELS]
+        self.redirected = False
+
+    def staging_table(self, table):
+        return table + STAGING_SUFFIX
+
+    def exists(self):
+        existing = set(connection.introspection.table_names())
+        return all(self.staging_table(table) in existing for table in self.live_tables)
+
+    def create(self):
+        """(Re)creates the staging tables as copies of the live ones"""
+        self.discard()
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                for table in self.live_tables:
+                    staging = quote(self.staging_table(table))
+                    if is_partitioned(table):
+                        cursor.execute(
+                            f"CREATE TABLE {staging} (LIKE {quote(table)} INCLUDING ALL) PARTITION BY RANGE ({quote(PARTITION_KEY)})"
+                        )
+                        copy_partitions(cursor, table, self.staging_table(table))
+                    else:
+                        cursor.execute(f"CREATE TABLE {staging} (LIKE {quote(table)} INCLUDING ALL)")
+                    cursor.execute(f"INSERT INTO {staging} SELECT * FROM {quote(table)}")
+                    # The copied identity column has its own sequence, continue it after the copied ids
+                    cursor.execute(
+                        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {staging}",
+                        [self.staging_table(table)],
+                    )
+            else:
+                self._create_sqlite(cursor)
+                for table in self.live_tables:
+                    cursor.execute(f"INSERT INTO {quote(self.staging_table(table))} SELECT * FROM {quote(table)}")
+
+    def _create_sqlite(self, cursor):
+        # SQLite has no CREATE TABLE ... LIKE, so the live schema is replayed with every name pointing at staging
+        placeholders = ", ".join(["%s"] * len(self.live_tables))
+        cursor.execute(
+            f"SELECT type, name, sql FROM sqlite_master WHERE tbl_name IN ({placeholders}) AND sql IS NOT NULL "
+            "ORDER BY type = 'index'",
+            self.live_tables,
+        )
+        rows = cursor.fetchall()
+        names = {table: self.staging_table(table) for table in self.live_tables}
+        names.update({name: name + STAGING_SUFFIX for kind, name, _ in rows if kind == "index"})
+        for _, _, sql in rows:
+            cursor.execute(re.sub(r'"([^"]+)"', lambda m: quote(names.get(m.group(1), m.group(1))), sql))
+
+    @contextmanager
+    def redirect(self):
+        """Points the snapshot models at the staging tables for the duration of the block, in this process only"""
+        for model in SNAPSHOT_MODELS:
+            model._meta.db_table = self.staging_table(model._meta.db_table)
+            forget_columns(model)
+        self.redirected = True
+        try:
+            yield self
+        finally:
+            for model, table in zip(SNAPSHOT_MODELS, self.live_tables):
+                model._meta.db_table = table
+                forget_columns(model)
+            self.redirected = False
+
+    def publish(self):
+        """Makes the staging tables live in one transaction"""
+        if self.redirected:
+            raise SnapshotError("Leave redirect() before publishing")
+        if connection.vendor == "postgresql":
+            self._publish_postgresql()
+        else:
+            self._publish_sqlite()
+
+    def _publish_sqlite(self):
+        # SQLite readers see the old rows until this commits
+        with transaction.atomic(), connection.cursor() as cursor:
+            for table in reversed(self.live_tables):
+                cursor.execute(f"DELETE FROM {quote(table)}")
+            for table in self.live_tables:
+                cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(self.staging_table(table))}")
+        self.discard()
+
+    def _publish_postgresql(self):
+        live = self.live_tables
+        staging = [self.staging_table(table) for table in live]
+        partitioned = [table for table in live if is_partitioned(table)]
+        with connection.cursor() as cursor:
+            # Foreign keys don't follow a rename to another table, so they are recreated on the new tables.
+            # Partitions get their copies of a partitioned table's foreign keys from the parent.
+            cursor.execute(
+                "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE contype = 'f' AND conparentid = 0 AND (conrelid = ANY(%s::regclass[]) OR confrelid = ANY(%s::regclass[]))",
+                [live, live],
+            )
+            foreign_keys = cursor.fetchall()
+            renames = self._postgresql_renames(cursor, live)
+            for table in staging:
+                cursor.execute(f"ANALYZE {quote(table)}")
+
+        # Only catalog changes happen under the exclusive lock, so readers wait milliseconds, not for the load
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {', '.join(map(quote, live))} IN ACCESS EXCLUSIVE MODE")
+            for table in live:
+                cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(table + OLD_SUFFIX)}")
+            for table in live:
+                cursor.execute(f"ALTER TABLE {quote(self.staging_table(table))} RENAME TO {quote(table)}")
+            cursor.execute(f"DROP TABLE {', '.join(quote(table + OLD_SUFFIX) for table in live)} CASCADE")
+            # Give constraints and indexes back the names migrations know them by
+            for kind, table, staging_name, live_name in renames:
+                if kind == "constraint":
+                    cursor.execute(f"ALTER TABLE {quote(table)} RENAME CONSTRAINT {quote(staging_name)} TO {quote(live_name)}")
+                else:
+                    cursor.execute(f"ALTER INDEX {quote(staging_name)} RENAME TO {quote(live_name)}")
+            for table in partitioned:
+                rename_partitions(cursor, table)
+            for table, name, definition in foreign_keys:
+                # PostgreSQL can't add NOT VALID foreign keys to partitioned tables, theirs are checked right away
+                not_valid = "" if table.strip('"') in partitioned else " NOT VALID"
+                cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {quote(name)} {definition}{not_valid}")
+
+        # Validating doesn't block reads or writes, so it runs after the swap
+        with connection.cursor() as cursor:
+            for table, name, _ in foreign_keys:
+                if table.strip('"') not in partitioned:
+                    cursor.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {quote(name)}")
+
+    def _postgresql_renames(self, cursor, live):
+        """Pairs every primary key, unique constraint and index of the staging tables with its live name"""
+        renames = []
+        for table in live:
+            constraints = {}
+            for name, relation in ((table, "live"), (self.staging_table(table), "staging")):
+                cursor.execute(
+                    "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                    "WHERE conrelid = %s::regclass AND contype IN ('p', 'u')",
+                    [name],
+                )
+                for conname, definition in cursor.fetchall():
+                    constraints.setdefault(definition, {})[relation] = conname
+            for names in constraints.values():
+                if "live" in names and "staging" in names and names["live"] != names["staging"]:
+                    renames.append(("constraint", table, names["staging"], names["live"]))
+
+            indexes = {}
+            for name, relation in ((table, "live"), (self.staging_table(table), "staging")):
+                cursor.execute(
+                    "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+                    "WHERE x.indrelid = %s::regclass AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.oid)",
+                    [name],
+                )
+                for index_name, definition in cursor.fetchall():
+                    # Compare only what comes after the table name, e.g. "USING btree (video_id)"
+                    key = ("UNIQUE" in definition.split(" ON ")[0], definition.split(" USING ", 1)[1])
+                    indexes.setdefault(key, {})[relation] = index_name
+            for names in indexes.values():
+                if "live" in names and "staging" in names and names["live"] != names["staging"]:
+                    renames.append(("index", table, names["staging"], names["live"]))
+        return renames
+
+    def discard(self):
+        """Drops any staging tables left behind"""
+        existing = set(connection.introspection.table_names())
+        with connection.cursor() as cursor:
+            for table in reversed(self.live_tables):
+                if self.staging_table(table) in existing:
+                    cursor.execute(f"DROP TABLE {quote(self.staging_table(table))}")
+
+def forget_columns(model):
+    """Drops the column expressions fields cache with their table name, so queries pick up a changed db_table"""
+    for field in model._meta.concrete_fields:
+        field.__dict__.pop("cached_col", None)
+
+def quote(name):
+    return connection.ops.quote_name(name)
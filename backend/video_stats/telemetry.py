@@ -0,0 +1,132 @@
+from django.apps import apps
+from collections import defaultdict
+import tracemalloc
+import threading
+import time
+import re
+
+from .snapshot import STAGING_SUFFIX
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SQL_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+[`"]?(\w+)', re.IGNORECASE)
+
+class Histogram:
+    """Fixed-bucket latency histogram, cheap enough to update on every request"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def as_dict(self):
+        labels = [f"<={bound}s" for bound in self.buckets] + [f">{self.buckets[-1]}s"]
+        return {
+            "count": self.count,
+            "total_seconds": round(self.total, 3),
+            "mean_seconds": round(self.total / self.count, 4) if self.count else 0.0,
+            "max_seconds": round(self.max, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+class RunTelemetry:
+    """Collects what a fetch_video_data run spends its time on: HTTP calls per endpoint,
+    SQL per model, time per video and memory. Safe to update from the fetch worker threads."""
+
+    def __init__(self, trace_memory=False, slowest=10):
+        self.started = time.perf_counter()
+        self.trace_memory = trace_memory
+        self.slowest = slowest
+        self._lock = threading.Lock()
+        self.http_latency = defaultdict(Histogram)
+        self.http_bytes = defaultdict(int)
+        self.http_statuses = defaultdict(lambda: defaultdict(int))
+        self.sql_queries = defaultdict(int)
+        self.sql_seconds = defaultdict(float)
+        self.video_seconds = Histogram()
+        self.slowest_videos = []
+        self._table_models = {model._meta.db_table: model._meta.label for model in apps.get_models()}
+
+        if trace_memory:
+            tracemalloc.start()
+
+    def record_request(self, endpoint, seconds, status, nbytes=0):
+        with self._lock:
+            self.http_latency[endpoint].add(seconds)
+            self.http_bytes[endpoint] += nbytes
+            self.http_statuses[endpoint][str(status)] += 1
+
+    def record_video(self, video_id, seconds):
+        self.video_seconds.add(seconds)
+        self.slowest_videos.append((seconds, video_id))
+        if len(self.slowest_videos) > self.slowest * 4:
+            self.slowest_videos = sorted(self.slowest_videos, reverse=True)[:self.slowest]
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        """For connection.execute_wrapper(), attributes every query to the model of its first table"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            match = SQL_TABLE_PATTERN.search(sql)
+            # Staging tables of a --snapshot run count towards the model they stand in for
+            table = match.group(1).removesuffix(STAGING_SUFFIX) if match else None
+            model = self._table_models.get(table, table) if match else "other"
+            with self._lock:
+                self.sql_queries[model] += 1
+                self.sql_seconds[model] += time.perf_counter() - start
+
+    def report(self, client=None):
+        http = {}
+        errors = client.error_summary() if client else {}
+        for endpoint in sorted(set(self.http_latency) | set(errors)):
+            http[endpoint] = {
+                **errors.get(endpoint, {}),
+                "bytes": self.http_bytes[endpoint],
+                "statuses": dict(self.http_statuses[endpoint]),
+                "latency": self.http_latency[endpoint].as_dict(),
+            }
+
+        memory = {}
+        if resource:
+            # Kilobytes on Linux
+            memory["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if self.trace_memory and tracemalloc.is_tracing():
+            memory["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+
+        return {
+            "wall_seconds": round(time.perf_counter() - self.started, 3),
+            "http": http,
+            "http_bytes": sum(self.http_bytes.values()),
+            "sql": {
+                model: {"queries": self.sql_queries[model], "seconds": round(self.sql_seconds[model], 3)}
+                for model in sorted(self.sql_queries, key=self.sql_seconds.get, reverse=True)
+            },
+            "videos": {
+                **self.video_seconds.as_dict(),
+                "slowest": [
+                    {"video_id": video_id, "seconds": round(seconds, 3)}
+                    for seconds, video_id in sorted(self.slowest_videos, reverse=True)[:self.slowest]
+                ],
+            },
+            "memory": memory,
+        }
+
+    def stop(self):
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
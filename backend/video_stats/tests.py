@@ -1,3 +1,764 @@
-from django.test import TestCase
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from importlib import import_module
+from io import StringIO
+from operator import itemgetter
+from pathlib import Path
+from rest_framework.test import APIClient
+from tempfile import TemporaryDirectory
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+from .export_cache import prune_cache
+from .fake_hihaho import FakeCatalog, FakeHihahoServer
+from .hihaho_client import HihahoAPIError, HihahoClient
+from .management.commands.fetch_video_data import last_finalized_month, merge_summaries
+from .models import *
+from .pagination import decode_cursor, encode_cursor
+from .rollups import refresh_rollups
+from .search import SEARCH_LIMIT, TrigramIndex, has_pg_trgm, search_terms, search_text, search_titles
+from .ua_cache import UserAgentCache
+import json
+import requests
+import time
+import os
 
-# Create your tests here.
+PROFILE_FIELDS = ("viewer_os", "os_version", "viewer_browser", "browser_version", "viewer_device", "viewer_mobile", "is_bot")
+
+def fail_listing_page(page, status=403):
+    return lambda name, params: status if name == "/video" and params.get("page") == str(page) else None
+
+def fail_endpoint(endpoint, status=403):
+    """FakeHihahoServer.fail hook answering every request to endpoint with status"""
+    return lambda name, params: status if name == endpoint else None
+
+def api_response(status_code, headers=None):
+    return mock.Mock(status_code=status_code, headers=headers or {}, content=b"{}")
+
+class HihahoClientTests(SimpleTestCase):
+    """Retries and backoff, against a mocked session and without sleeping"""
+
+    def setUp(self):
+        self.client = HihahoClient(token="test", base_url="https://api.test/v2", max_retries=2, backoff_base=1, backoff_max=10)
+        self.client.session.get = mock.Mock()
+        sleep = mock.patch("video_stats.hihaho_client.time.sleep")
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_retries_server_errors_and_timeouts_until_a_response(self):
+        self.client.session.get.side_effect = [api_response(503), requests.Timeout("read timed out"), api_response(200)]
+        self.assertEqual(self.client.get("/video/1").status_code, 200)
+        self.assertEqual(self.client.error_summary(), {"/video/{id}": {"requests": 3, "errors": 2, "retries": 2}})
+
+    def test_backoff_is_jittered_exponential_up_to_the_maximum(self):
+        with mock.patch("video_stats.hihaho_client.random.uniform", side_effect=lambda low, high: high):
+            self.assertEqual([self.client._backoff_seconds(attempt) for attempt in range(6)], [1, 2, 4, 8, 10, 10])
+
+    def test_retry_after_is_honored_within_bounds(self):
+        for retry_after, wait in (("3", 3.0), ("120", 10.0), ("-5", 0.0), ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0)):
+            self.assertEqual(self.client._backoff_seconds(0, api_response(429, {"Retry-After": retry_after})), wait, retry_after)
+
+    def test_negative_retry_after_does_not_break_the_retry(self):
+        self.client.session.get.side_effect = [api_response(429, {"Retry-After": "-1"}), api_response(200)]
+        self.assertEqual(self.client.get("/video").status_code, 200)
+        self.sleep.assert_called_once_with(0.0)
+
+    def test_raises_when_retries_run_out(self):
+        self.client.session.get.side_effect = lambda *args, **kwargs: api_response(502)
+        with self.assertRaises(HihahoAPIError) as raised:
+            self.client.get("/video/1/stats/views")
+        self.assertEqual((raised.exception.endpoint, raised.exception.status_code), ("/video/{id}/stats/views", 502))
+        self.assertEqual(self.client.session.get.call_count, 3)
+
+    def test_client_errors_are_returned_without_retrying(self):
+        self.client.session.get.return_value = api_response(404)
+        self.assertIsNone(self.client.get_json("/video/1"))
+        with self.assertRaises(HihahoAPIError):
+            self.client.get_json("/video/1", raise_errors=True)
+        self.assertEqual(self.client.session.get.call_count, 2)
+        self.sleep.assert_not_called()
+
+CHROME = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+SAFARI = "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
+FIREFOX = "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0"
+
+class UserAgentCacheTests(SimpleTestCase):
+    def test_least_recently_used_agent_is_evicted(self):
+        cache = UserAgentCache(maxsize=2)
+        cache.get(CHROME)
+        cache.get(SAFARI)
+        cache.get(CHROME)
+        cache.get(FIREFOX)
+
+        self.assertEqual(list(cache.entries), [CHROME, FIREFOX])
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        self.assertEqual(cache.get(CHROME).viewer_browser, "Chrome")
+
+    def test_parsed_agents_are_reused_by_the_next_run(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ua_cache.json")
+            first_run = UserAgentCache(path=path)
+            first_run.get_many([CHROME, SAFARI, CHROME])
+            first_run.save()
+
+            next_run = UserAgentCache(path=path)
+            self.assertEqual(next_run.get_many([CHROME, SAFARI]), first_run.get_many([CHROME, SAFARI]))
+            self.assertEqual((next_run.hits, next_run.misses), (2, 0))
+
+            # Only the most recent entries fit a smaller cache, and another parser version starts empty
+            self.assertEqual(list(UserAgentCache(maxsize=1, path=path).entries), [SAFARI])
+            with mock.patch("video_stats.ua_cache.parser_version", return_value="other"):
+                self.assertFalse(UserAgentCache(path=path).entries)
+
+class FakeAPIMixin:
+    """Runs fetch_video_data against a local fake HiHaHo API"""
+    videos = 6
+    interactions = 2
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        catalog = FakeCatalog(videos=cls.videos, interactions=cls.interactions, questions=2, user_agents=10, page_size=2)
+        cls.server = FakeHihahoServer(catalog).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.server.fail = None
+        self.server.catalog.interactions = self.interactions
+        self.server.request_counts.clear()
+
+    def fetch(self, *args):
+        output = StringIO()
+        with redirect_stdout(output), redirect_stderr(output):
+            call_command("fetch_video_data", "--api-url", self.server.base_url, *args, stdout=output)
+        return output.getvalue()
+
+class FakeAPITestCase(FakeAPIMixin, TestCase):
+    pass
+
+class PartialFailureTests(FakeAPITestCase):
+    def test_failed_aggregated_statistics_keep_stored_view_counts(self):
+        self.fetch()
+        before = dict(VideoStats.objects.values_list("video__video_id", "total_views"))
+        self.assertTrue(any(before.values()))
+
+        # The video payload counts as changed, aggregated-statistics fails
+        PayloadFingerprint.objects.filter(endpoint="video").delete()
+        self.server.fail = fail_endpoint("/video/{id}/aggregated-statistics")
+        self.fetch()
+
+        self.assertEqual(dict(VideoStats.objects.values_list("video__video_id", "total_views")), before)
+
+    def test_client_errors_on_monthly_views_hold_the_watermark(self):
+        self.server.fail = fail_endpoint("/video/{id}/stats/views", status=404)
+        self.fetch()
+
+        self.assertEqual(Video.objects.count(), self.videos)
+        self.assertFalse(VideoSyncState.objects.exclude(last_finalized_month=None).exists())
+        self.assertFalse(PayloadFingerprint.objects.filter(endpoint="monthly_views").exists())
+
+class FingerprintTests(FakeAPITestCase):
+    def last_summary(self):
+        return FetchRun.objects.latest("id").summary
+
+    def test_unchanged_payloads_are_skipped_and_changed_ones_rewritten(self):
+        # The second run is the first one that asks for the months after the watermark only
+        self.fetch()
+        self.fetch()
+        digests = dict(PayloadFingerprint.objects.values_list("id", "digest"))
+        InteractionStats.objects.update(total_clicks=-1)
+
+        self.fetch()
+        summary = self.last_summary()
+        self.assertEqual(summary["videos"], {"rewritten": 0, "skipped": self.videos})
+        self.assertEqual({counts["skipped"] for counts in summary["endpoints"].values()}, {self.videos})
+        self.assertEqual(set(InteractionStats.objects.values_list("total_clicks", flat=True)), {-1})
+        self.assertEqual(dict(PayloadFingerprint.objects.values_list("id", "digest")), digests)
+
+        self.server.catalog.interactions = 1
+        self.fetch()
+        summary = self.last_summary()
+        self.assertEqual(summary["videos"], {"rewritten": self.videos, "skipped": 0})
+        self.assertEqual(summary["endpoints"]["interactions"], {"rewritten": self.videos, "skipped": 0, "failed": 0})
+        self.assertEqual(summary["endpoints"]["monthly_views"], {"rewritten": 0, "skipped": self.videos, "failed": 0})
+        self.assertNotIn(-1, InteractionStats.objects.values_list("total_clicks", flat=True))
+        changed = PayloadFingerprint.objects.filter(endpoint="interactions")
+        self.assertTrue(all(digests[pk] != digest for pk, digest in changed.values_list("id", "digest")))
+
+class WatermarkTests(FakeAPITestCase):
+    def test_later_runs_only_request_months_after_the_watermark(self):
+        self.fetch()
+        watermark = last_finalized_month()
+        self.assertEqual(set(VideoSyncState.objects.values_list("last_finalized_month", flat=True)), {watermark})
+
+        start_dates = []
+        self.server.fail = lambda name, params: start_dates.append(params["start_date"]) if name == "/video/{id}/stats/views" else None
+        PayloadFingerprint.objects.filter(endpoint="monthly_views").delete()
+        self.fetch()
+
+        year, month = map(int, watermark.split("-"))
+        window_start = (date(year, month, 1) + relativedelta(months=1)).strftime("%Y-%m-%d")
+        self.assertEqual(len(start_dates), self.videos)
+        self.assertTrue(all(start_date >= window_start for start_date in start_dates), start_dates)
+        self.assertEqual(set(VideoSyncState.objects.values_list("last_finalized_month", flat=True)), {watermark})
+
+class ListingFailureTests(FakeAPITestCase):
+    def test_failed_listing_page_leaves_the_run_resumable(self):
+        self.server.fail = fail_listing_page(2)
+        with self.assertRaises(CommandError):
+            self.fetch()
+
+        run = FetchRun.objects.get()
+        self.assertIsNone(run.finished_at)
+        self.assertEqual(run.checkpoints.count(), 2) # The first page's videos
+
+        self.server.fail = None
+        self.fetch("--resume")
+        run.refresh_from_db()
+        self.assertIsNotNone(run.finished_at)
+        self.assertFalse(run.checkpoints.exists())
+        self.assertEqual(Video.objects.count(), self.videos)
+
+    def test_failed_listing_page_does_not_publish_the_snapshot(self):
+        self.server.fail = fail_listing_page(2)
+        with self.assertRaises(CommandError):
+            self.fetch("--snapshot")
+        self.assertFalse(Video.objects.exists())
+
+# Publishing drops the old tables, which the deferred foreign key checks of a TestCase transaction would still hold
+class SnapshotTests(FakeAPIMixin, TransactionTestCase):
+    def staging_tables(self):
+        return [table for table in connection.introspection.table_names() if table.endswith("__staging")]
+
+    def test_failed_snapshot_run_keeps_serving_the_live_tables_until_resumed(self):
+        self.fetch()
+        clicks = dict(InteractionStats.objects.values_list("interaction_id", "total_clicks"))
+
+        self.server.catalog.interactions = 1
+        self.server.fail = fail_listing_page(2)
+        with self.assertRaises(CommandError):
+            self.fetch("--snapshot")
+        self.assertEqual(dict(InteractionStats.objects.values_list("interaction_id", "total_clicks")), clicks)
+        self.assertTrue(self.staging_tables())
+
+        # Resuming finishes loading the staging tables and swaps them in
+        self.server.fail = None
+        self.fetch("--resume")
+        self.assertEqual(Video.objects.count(), self.videos)
+        self.assertEqual(InteractionStats.objects.count(), self.videos)
+        self.assertEqual(MonthlyViews.objects.values("video").distinct().count(), self.videos)
+        self.assertFalse(self.staging_tables())
+
+class ResumeTests(FakeAPITestCase):
+    def test_resume_only_fetches_the_videos_not_checkpointed(self):
+        self.server.fail = fail_listing_page(2)
+        with self.assertRaises(CommandError):
+            self.fetch()
+        run = FetchRun.objects.get()
+        checkpointed = set(run.checkpoints.values_list("video_id", flat=True))
+        self.server.fail = None
+        self.server.request_counts.clear()
+
+        self.fetch("--resume")
+        self.assertEqual(self.server.request_counts["/video/{id}"], self.videos - len(checkpointed))
+        self.assertEqual(FetchRun.objects.get().pk, run.pk)
+
+    def test_without_an_unfinished_run_resume_starts_a_new_one(self):
+        self.fetch()
+        output = self.fetch("--resume")
+
+        self.assertIn("No unfinished run to resume", output)
+        self.assertEqual(FetchRun.objects.exclude(finished_at=None).count(), 2)
+
+class ShardTests(FakeAPITestCase):
+    videos = 7
+    shards = 3
+
+    def test_shards_split_the_catalog_and_their_summaries_add_up(self):
+        shard_videos = []
+        for shard in range(self.shards):
+            stored = set(Video.objects.values_list("video_id", flat=True))
+            self.fetch("--shard", f"{shard}/{self.shards}")
+            shard_videos.append(set(Video.objects.values_list("video_id", flat=True)) - stored)
+
+        # Every video lands in exactly one shard
+        self.assertEqual(sum(len(videos) for videos in shard_videos), self.videos)
+        self.assertEqual(set().union(*shard_videos), set(range(1, self.videos + 1)))
+
+        summaries = list(FetchRun.objects.order_by("id").values_list("summary", flat=True))
+        merged = merge_summaries(summaries)
+        self.assertEqual(merged["videos"]["rewritten"], self.videos)
+        for name, counts in merged["endpoints"].items():
+            for outcome, count in counts.items():
+                self.assertEqual(count, sum(summary["endpoints"].get(name, {}).get(outcome, 0) for summary in summaries))
+        self.assertEqual(
+            merged["http"]["/video/{id}"]["requests"],
+            sum(summary["http"]["/video/{id}"]["requests"] for summary in summaries),
+        )
+
+class TelemetryReportTests(FakeAPITestCase):
+    def test_snapshot_queries_are_reported_per_model(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            self.fetch("--snapshot", "--report", path)
+            with open(path, encoding="utf-8") as f:
+                sql = json.load(f)["sql"]
+
+        self.assertIn("video_stats.Video", sql)
+        self.assertIn("video_stats.InteractionStats", sql)
+        self.assertFalse([table for table in sql if table.endswith("__staging")])
+
+class BulkUpsertTests(FakeAPITestCase):
+    def test_refetch_updates_rows_in_place_and_deletes_stale_ones(self):
+        self.fetch()
+        interaction_ids = dict(InteractionStats.objects.values_list("interaction_id", "id"))
+        counts = [model.objects.count() for model in (MonthlyViews, QuestionStats, QuestionAnswer, ViewSession)]
+
+        self.server.catalog.interactions = 1
+        self.fetch("--full")
+
+        remaining = dict(InteractionStats.objects.values_list("interaction_id", "id"))
+        self.assertEqual(len(remaining), self.videos)
+        self.assertEqual(remaining, {key: interaction_ids[key] for key in remaining})
+        self.assertEqual([model.objects.count() for model in (MonthlyViews, QuestionStats, QuestionAnswer, ViewSession)], counts)
+
+    def test_stats_only_interactions_keep_their_aggregated_columns(self):
+        self.fetch()
+        catalog = self.server.catalog
+        stored = {
+            row["interaction_id"]: row
+            for row in InteractionStats.objects.values("interaction_id", "type", "action_type", "created_at", "title")
+        }
+        self.assertTrue(all(row["type"] and row["action_type"] for row in stored.values()))
+
+        # aggregated-statistics stops listing each video's last interaction, stats/interactions lists a new one
+        aggregated_statistics, interactions_stats = catalog.aggregated_statistics, catalog.interactions_stats
+        def without_last_interaction(video_id):
+            response = aggregated_statistics(video_id)
+            response["data"]["aggregated_statistics"]["interactions"]["details"].pop()
+            return response
+        def with_new_interaction(video_id):
+            response = interactions_stats(video_id)
+            for interaction in response["data"]:
+                interaction["title"] = f"Renamed {interaction['id']}"
+            response["data"].append({"id": video_id * 1000 + 999, "title": "New", "start_time": 0.0, "end_time": 1.0, "link": None, "total_times_clicked": 3})
+            return response
+
+        with mock.patch.object(catalog, "aggregated_statistics", without_last_interaction), \
+                mock.patch.object(catalog, "interactions_stats", with_new_interaction):
+            self.fetch("--full")
+
+        for video in Video.objects.all():
+            dropped = InteractionStats.objects.get(video=video, interaction_id=video.video_id * 1000 + self.interactions - 1)
+            self.assertEqual(
+                (dropped.type, dropped.action_type, dropped.created_at),
+                itemgetter("type", "action_type", "created_at")(stored[dropped.interaction_id]),
+            )
+            self.assertEqual(dropped.title, f"Renamed {dropped.interaction_id}")
+
+            new = InteractionStats.objects.get(video=video, interaction_id=video.video_id * 1000 + 999)
+            self.assertEqual((new.type, new.action_type, new.link, new.total_clicks), ("", "", "", 3))
+            self.assertEqual(new.created_at, video.created_date)
+        self.assertEqual(InteractionStats.objects.count(), self.videos * (self.interactions + 1))
+
+# The daemon's close_old_connections() would close the connection of a TestCase transaction
+class IngestDaemonBudgetTests(FakeAPIMixin, TransactionTestCase):
+    videos = 14 # Seven listing pages, more than the one-tick bucket of a 60 requests per hour budget holds
+
+    def daemon(self, *args):
+        output = StringIO()
+        with redirect_stdout(output), redirect_stderr(output):
+            call_command("ingest_daemon", "--api-url", self.server.base_url, "--once", *args, stdout=output)
+        return output.getvalue()
+
+    def test_listing_over_budget_holds_back_refreshes(self):
+        self.daemon("--requests-per-hour", "60")
+
+        self.assertEqual(self.server.request_counts["/video"], 7)
+        self.assertFalse(FetchRun.objects.exists())
+        self.assertFalse(Video.objects.exists())
+
+    def test_refreshes_fill_the_rest_of_the_budget(self):
+        self.daemon("--requests-per-hour", "3600") # 60 requests in the bucket, 7 of them for the listing
+
+        self.assertEqual(Video.objects.count(), 8)
+
+    def test_rollups_are_only_refreshed_when_the_batch_wrote_rows(self):
+        def refreshed_at():
+            return dict(DashboardRollup.objects.values_list("id", "refreshed_at"))
+
+        # The second round is the first one that asks for the months after the watermark only
+        for _ in range(2):
+            self.daemon("--requests-per-hour", "360000")
+            VideoSyncState.objects.update(next_refresh_at=None)
+        self.assertEqual(Video.objects.count(), self.videos)
+        first = refreshed_at()
+        self.assertTrue(first)
+
+        # Every video is due again but returns the same payloads
+        self.daemon("--requests-per-hour", "360000")
+        self.assertEqual(FetchRun.objects.latest("id").summary["videos"], {"rewritten": 0, "skipped": self.videos})
+        self.assertEqual(refreshed_at(), first)
+
+        self.server.catalog.interactions = 1
+        VideoSyncState.objects.update(next_refresh_at=None)
+        self.daemon("--requests-per-hour", "360000")
+        self.assertTrue(all(at > first[pk] for pk, at in refreshed_at().items()))
+
+class RollupTests(FakeAPITestCase):
+    videos = 8 # Folder 1 holds videos 1 and 8
+
+    def test_rollups_match_the_video_stats_totals(self):
+        self.fetch()
+        # A folder renamed halfway through the catalog is still one rollup row
+        Video.objects.filter(video_id=8).update(folder_name="Renamed folder")
+        refresh_rollups()
+
+        fields = ("total_views", "started_views", "finished_views", "interaction_clicks", "num_questions")
+        expected = {}
+        for stats in VideoStats.objects.select_related("video"):
+            for key in (("global", 0), ("folder", stats.video.folder_number), ("status", stats.video.status)):
+                totals = expected.setdefault(key, dict.fromkeys(("videos", *fields), 0))
+                totals["videos"] += 1
+                for field in fields:
+                    totals[field] += getattr(stats, field)
+
+        rollups = {(row.pop("scope"), row.pop("key")): row for row in DashboardRollup.objects.values("scope", "key", "videos", *fields)}
+        self.assertEqual(rollups, expected)
+        self.assertEqual(expected["global", 0]["videos"], self.videos)
+        self.assertEqual(expected["folder", 1]["videos"], 2)
+        labels = dict(DashboardRollup.objects.filter(scope="folder").values_list("key", "label"))
+        self.assertEqual(labels[2], "Folder 2")
+        self.assertIn(labels[1], ("Folder 1", "Renamed folder"))
+
+class ExportCacheTests(TestCase):
+    def write(self, directory, name, size, days_unused):
+        path = Path(directory) / name
+        path.write_bytes(b"x" * size)
+        unused_since = time.time() - days_unused * 24 * 3600
+        os.utime(path, (unused_since, unused_since))
+        return path
+
+    @override_settings(EXPORT_CACHE_MAX_BYTES=250, EXPORT_CACHE_MAX_AGE_DAYS=30)
+    def test_prune_drops_old_files_then_least_recently_used(self):
+        with TemporaryDirectory() as directory:
+            stale = self.write(directory, "1-a.json", 10, days_unused=40)
+            interrupted = self.write(directory, ".2-x.tmp", 10, days_unused=40)
+            oldest = self.write(directory, "3-a.json", 100, days_unused=3)
+            older = self.write(directory, "4-a.json", 100, days_unused=2)
+            newest = self.write(directory, "5-a.json", 100, days_unused=1)
+
+            prune_cache(Path(directory))
+
+            self.assertEqual(sorted(Path(directory).iterdir()), [older, newest])
+
+class MigrationTestCase(TransactionTestCase):
+    """Migrates video_stats back to migrate_from, for setUpData() to fill through the historical models, then on to
+    migrate_to, and back to the latest migration afterwards"""
+    migrate_from = migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("video_stats", self.migrate_from)])
+        executor.loader.build_graph()
+        self.setUpData(executor.loader.project_state(("video_stats", self.migrate_from)).apps)
+        executor.migrate([("video_stats", self.migrate_to)])
+        executor.loader.build_graph()
+        self.apps = executor.loader.project_state(("video_stats", self.migrate_to)).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes("video_stats"))
+
+class UniqueVideoRowsMigrationTests(MigrationTestCase):
+    migrate_from = "0001_initial"
+    migrate_to = "0002_unique_video_rows"
+
+    def setUpData(self, apps):
+        Video = apps.get_model("video_stats", "Video")
+        MonthlyViews = apps.get_model("video_stats", "MonthlyViews")
+        VideoStats = apps.get_model("video_stats", "VideoStats")
+        video = Video.objects.create(video_id=1, uuid="", title="", status=1, folder_name="", folder_number=0, created_date="2024-01-01T00:00Z")
+        counts = dict(started_views=1, finished_views=1, passed_views=0, failed_views=0, unfinished_views=0)
+        for month, total_views in (("2024-03", 1), ("2024-04", 2), ("2024-03", 3), ("2024-03", 4)):
+            MonthlyViews.objects.create(video=video, month=month, total_views=total_views, **counts)
+        for total_views in (5, 6):
+            VideoStats.objects.create(
+                video=video, total_views=total_views, started_views=0, finished_views=0, interaction_clicks=0,
+                num_questions=0, video_duration_seconds=0,
+            )
+
+    def test_the_last_inserted_row_per_key_survives(self):
+        MonthlyViews = self.apps.get_model("video_stats", "MonthlyViews")
+        VideoStats = self.apps.get_model("video_stats", "VideoStats")
+        self.assertEqual(sorted(MonthlyViews.objects.values_list("month", "total_views")), [("2024-03", 4), ("2024-04", 2)])
+        self.assertEqual(list(VideoStats.objects.values_list("total_views", flat=True)), [6])
+
+class MonthDateMigrationTests(MigrationTestCase):
+    migrate_from = "0009_indexes"
+    migrate_to = "0010_monthly_views_month_date"
+
+    def setUpData(self, apps):
+        Video = apps.get_model("video_stats", "Video")
+        MonthlyViews = apps.get_model("video_stats", "MonthlyViews")
+        video = Video.objects.create(video_id=1, uuid="", title="", status=1, folder_name="", folder_number=0, created_date="2024-01-01T00:00Z")
+        counts = dict(total_views=1, started_views=1, finished_views=1, passed_views=0, failed_views=0, unfinished_views=0)
+        for month in ("2024-03", "", "2024"):
+            MonthlyViews.objects.create(video=video, month=month, **counts)
+
+    def test_months_that_dont_parse_are_dropped(self):
+        MonthlyViews = self.apps.get_model("video_stats", "MonthlyViews")
+        self.assertEqual(list(MonthlyViews.objects.values_list("month", flat=True)), [date(2024, 3, 1)])
+
+class SessionProfileMigrationTests(MigrationTestCase):
+    migrate_from = "0012_partition_monthly_views"
+    migrate_to = "0013_view_session_profiles"
+    agents = [
+        ("Windows", "10", "Chrome", "120", "Other", False, False),
+        ("iOS", "17", "Safari", "17", "iPhone", True, False),
+        ("Windows", "10", "Chrome", "120", "Other", False, True),
+    ]
+
+    def setUpData(self, apps):
+        Video = apps.get_model("video_stats", "Video")
+        ViewSession = apps.get_model("video_stats", "ViewSession")
+        video = Video.objects.create(video_id=1, uuid="", title="", status=1, folder_name="", folder_number=0, created_date="2024-01-01T00:00Z")
+        for object_id, agent in enumerate(self.agents * 2):
+            ViewSession.objects.create(video=video, object_id=object_id, viewer_count=1, **dict(zip(PROFILE_FIELDS, agent)))
+
+    def test_sessions_point_at_one_profile_per_user_agent(self):
+        ViewSession = self.apps.get_model("video_stats", "ViewSession")
+        UserAgentProfile = self.apps.get_model("video_stats", "UserAgentProfile")
+        self.assertEqual(UserAgentProfile.objects.count(), len(self.agents))
+        sessions = ViewSession.objects.order_by("object_id").values_list(*(f"profile__{field}" for field in PROFILE_FIELDS))
+        self.assertEqual(list(sessions), self.agents * 2)
+
+class SearchTitleMigrationTests(MigrationTestCase):
+    migrate_from = "0015_list_filter_indexes"
+    migrate_to = "0016_search_titles"
+    titles = ["<!--TINYMCE--><p>Caf&eacute; ＬＡＴＴＥ</p>", "Onboarding", "", "  Veilig   werken ", "<b>Quiz</b> 1"]
+
+    def setUp(self):
+        # Batches of two, so the rows are filled over several of them
+        with mock.patch.object(import_module("video_stats.migrations.0016_search_titles"), "BATCH_SIZE", 2):
+            super().setUp()
+
+    def setUpData(self, apps):
+        Video = apps.get_model("video_stats", "Video")
+        QuestionStats = apps.get_model("video_stats", "QuestionStats")
+        for video_id, title in enumerate(self.titles):
+            video = Video.objects.create(
+                video_id=video_id, uuid="", title=title, status=1, folder_name="", folder_number=0, created_date="2024-01-01T00:00Z",
+            )
+            QuestionStats.objects.create(
+                video=video, question_id=video_id, title=title, type="mc", video_time_seconds=0, average_answer_time_seconds=0,
+                total_answered=0, total_correctly_answered=0, created_at="2024-01-01T00:00Z",
+            )
+
+    def test_every_title_gets_its_search_title(self):
+        expected = ["café latte", "onboarding", "", "veilig werken", "quiz 1"]
+        for model_name in ("Video", "QuestionStats"):
+            model = self.apps.get_model("video_stats", model_name)
+            self.assertEqual(list(model.objects.order_by("pk").values_list("search_title", flat=True)), expected, model_name)
+        self.assertEqual([search_text(title) for title in self.titles], expected)
+
+class ExplainQueriesTests(FakeAPITestCase):
+    def test_explains_every_list_view(self):
+        self.fetch()
+        output = StringIO()
+        call_command("explain_queries", stdout=output)
+        self.assertIn("interactions_all (InteractionStatsListView)", output.getvalue())
+
+class APIMixin:
+    """Calls the API as a signed-in user"""
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user("viewer"))
+
+    def get(self, name, **params):
+        response = self.client.get(reverse(name, kwargs=params.pop("kwargs", None)), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+class APITestCase(APIMixin, TestCase):
+    pass
+
+class KeysetPaginationTests(APIMixin, FakeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.fetch()
+
+    def follow(self, link):
+        response = self.client.get(link)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_cursor_pages_cover_the_list_in_order_both_ways(self):
+        for params in ({}, {"ordering": "-start_time"}, {"search": "interaction"}):
+            expected = [row["id"] for row in self.get("interactions_all", **params)["results"]]
+            self.assertTrue(expected)
+            pages = [self.get("interactions_all", cursor="", page_size=5, **params)]
+            while pages[-1]["next"]:
+                pages.append(self.follow(pages[-1]["next"]))
+            self.assertEqual([row["id"] for page in pages for row in page["results"]], expected, params)
+            self.assertIsNone(pages[0]["previous"])
+
+            page = pages[-1]
+            for earlier in reversed(pages[:-1]):
+                page = self.follow(page["previous"])
+                self.assertEqual(page["results"], earlier["results"], params)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse("interactions_all"), {"cursor": "bm90IGEgY3Vyc29y"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_wrongly_typed_keys_is_not_found(self):
+        for name in ("interactions_all", "view_sessions_all", "question_answers_all"):
+            next_link = self.get(name, cursor="", page_size=1)["next"]
+            keys, _ = decode_cursor(parse_qs(urlparse(next_link).query)["cursor"][0])
+            for index in range(len(keys)):
+                for wrong in ("x", None, [1]):
+                    cursor = encode_cursor(keys[:index] + [wrong] + keys[index + 1:], False)
+                    response = self.client.get(reverse(name), {"cursor": cursor})
+                    self.assertEqual(response.status_code, 404, (name, index, wrong))
+
+def create_video(video_id, title, **fields):
+    return Video.objects.create(**{
+        "video_id": video_id, "uuid": "", "title": title, "search_title": search_text(title), "status": 1, "folder_name": "",
+        "folder_number": 0, "created_date": timezone.now(), **fields,
+    })
+
+class VideoSummaryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        last_month = date.today().replace(day=1) - relativedelta(months=1)
+        two_months_ago = last_month - relativedelta(months=1)
+        # video_id: (folder, status, created, (total, started, finished, clicks), (views last month, two months ago), average rating)
+        videos = {
+            1: (1, 1, date(2024, 1, 10), (200, 150, 50, 10), (120, 80), 4.5),
+            2: (2, 2, date(2024, 3, 5), (30, 10, 5, 1), (10, 0), 0.0),
+            3: (1, 2, date(2024, 6, 1), (0, 0, 0, 0), None, None),
+            4: (2, 1, date(2024, 9, 20), (90, 30, 20, 4), (20, 30), 3.0),
+        }
+        for video_id, (folder, video_status, created, totals, views, rating) in videos.items():
+            video = create_video(
+                video_id, f"Video {video_id}", folder_number=folder, status=video_status,
+                created_date=timezone.make_aware(datetime.combine(created, datetime.min.time().replace(hour=12))),
+            )
+            VideoStats.objects.create(
+                video=video, **dict(zip(("total_views", "started_views", "finished_views", "interaction_clicks"), totals)),
+                num_questions=0, video_duration_seconds=60,
+            )
+            for month, month_views in zip((last_month, two_months_ago), views or ()):
+                MonthlyViews.objects.create(
+                    video=video, month=month, total_views=month_views, started_views=0, finished_views=0, passed_views=0,
+                    failed_views=0, unfinished_views=0,
+                )
+            if rating is not None:
+                VideoRating.objects.create(
+                    video=video, rating_id=1, average_rating=rating, one_star=0, two_star=0, three_star=1, four_star=2, five_star=3,
+                )
+
+    def summary(self, **params):
+        response = self.get("stats_summary", **params)
+        return response["totals"], {row["video"]["video_id"]: row for row in response["results"]}
+
+    def test_rows_compute_what_the_summary_page_did(self):
+        totals, rows = self.summary()
+        fields = ("views_last_month", "views_two_months_ago", "view_change_percent", "view_rate", "average_rating", "five_star")
+        self.assertEqual({video_id: tuple(row[field] for field in fields) for video_id, row in rows.items()}, {
+            1: (120, 80, 50.0, 75, 4.5, 3),
+            2: (10, 0, 100.0, 33, -1.0, 3), # Created last month, a 0 average shows as no rating
+            3: (0, 0, 0.0, 0, -1.0, 0),
+            4: (20, 30, -33.33, 33, 3.0, 3),
+        })
+        self.assertEqual(totals, {"num_videos": 4, "total_views": 320, "started_views": 190, "finished_views": 75, "interaction_clicks": 15})
+
+    def test_filters_narrow_the_rows_and_the_totals(self):
+        for params, video_ids in (
+            ({"folder": 1}, [1, 3]),
+            ({"folder": [1, 2], "status": 2}, [2, 3]),
+            ({"min_views": 50}, [1, 4]),
+            ({"start_date": "2024-03-01", "end_date": "2024-06-01"}, [2, 3]),
+            ({"folder": 3}, []),
+        ):
+            totals, rows = self.summary(**params)
+            self.assertEqual(sorted(rows), video_ids, params)
+            self.assertEqual(totals["num_videos"], len(video_ids), params)
+            self.assertEqual(totals["total_views"], sum(rows[video_id]["total_views"] for video_id in video_ids), params)
+
+    def test_past_two_months_come_from_one_query(self):
+        create_video(5, "Video 5")
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("past_two_months_performance"))
+        self.assertEqual(response.json(), {"1": [120, 80], "2": [10, 0], "3": [0, 0], "4": [20, 30], "5": [0, 0]})
+
+    def test_malformed_filters_are_rejected(self):
+        for params in ({"start_date": "01-03-2024"}, {"folder": "x"}, {"min_views": "many"}):
+            self.assertEqual(self.client.get(reverse("stats_summary"), params).status_code, 400, params)
+
+class ListSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        video = create_video(1, "Onboarding")
+        for question_id, title in enumerate(["<!--TINYMCE--><p>Wat kost een Caf&eacute; latte?</p>", "Wie is er jarig?"]):
+            QuestionStats.objects.create(
+                video=video, question_id=question_id, title=title, search_title=search_text(title), type="multiple_choice",
+                video_time_seconds=1, average_answer_time_seconds=1, total_answered=1, total_correctly_answered=1,
+                created_at=timezone.now(),
+            )
+
+    def test_question_list_search_normalizes_terms_like_title_search(self):
+        # Full-width, upper case and with the entity the stored HTML title has
+        for query in ("ＣＡＦÉ", "caf&eacute; LATTE"):
+            results = self.get("questions_all", search=query)["results"]
+            self.assertEqual([question["question_id"] for question in results], [0], query)
+            self.assertEqual([pk for _, pk in search_titles(QuestionStats, query)], [QuestionStats.objects.get(question_id=0).pk])
+
+    def test_numeric_terms_match_anywhere_in_the_id_like_the_frontend(self):
+        video = Video.objects.get()
+        for interaction_id in (12345, 54321, 999):
+            InteractionStats.objects.create(
+                video=video, interaction_id=interaction_id, title="Knop", type="button", action_type="link",
+                start_time_seconds=0, end_time_seconds=1, duration_seconds=1, link="", total_clicks=0, created_at=timezone.now(),
+            )
+        for query, interaction_ids in (("234", [12345]), ("5", [12345, 54321]), ("12345 99", [999, 12345]), ("7", [])):
+            results = self.get("interactions_all", search=query)["results"]
+            self.assertEqual(sorted(interaction["interaction_id"] for interaction in results), interaction_ids, query)
+        self.assertEqual([question["question_id"] for question in self.get("questions_all", search="1")["results"]], [1])
+
+class TrigramSearchTests(TestCase):
+    """The pg_trgm path of search_titles(), only where the database has the extension"""
+    titles = ["Veiligheid op de werkvloer", "Veilig werken op hoogte", "Werkvloer instructie", "Kantoor rondleiding"]
+
+    def setUp(self):
+        if not has_pg_trgm():
+            self.skipTest("Needs PostgreSQL with the pg_trgm extension")
+        for video_id, title in enumerate(self.titles):
+            create_video(video_id, title)
+
+    def test_ranks_like_the_in_memory_index(self):
+        for query in ("veilig werkvloer", "werk", "rondleiding kantoor"):
+            terms = [search_text(term) for term in search_terms(query)]
+            in_memory = [(round(rank, 4), pk) for rank, pk in TrigramIndex(Video).search(terms, " ".join(terms), SEARCH_LIMIT)]
+            self.assertEqual(search_titles(Video, query), in_memory, query)
+
+    def test_searches_use_the_trigram_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = Video.objects.filter(search_title__contains="werkvloer").explain()
+        self.assertIn("video_search_title_trgm_idx", plan)
@@ -0,0 +1,115 @@
+from collections import OrderedDict, namedtuple
+from importlib.metadata import PackageNotFoundError, version
+from django.db.models import Q
+from user_agents import parse
+import json
+import os
+
+from .models import UserAgentProfile
+
+ParsedUserAgent = namedtuple("ParsedUserAgent", [
+    "viewer_os",
+    "os_version",
+    "viewer_browser",
+    "browser_version",
+    "viewer_device",
+    "viewer_mobile",
+    "is_bot",
+])
+
+def parse_user_agent(ua_string):
+    """Runs the full ua-parser match and keeps only the fields stored on UserAgentProfile"""
+    user_agent = parse(ua_string)
+    return ParsedUserAgent(
+        viewer_os=user_agent.os.family or "",
+        os_version=user_agent.os.version_string or "",
+        viewer_browser=user_agent.browser.family or "",
+        browser_version=user_agent.browser.version_string or "",
+        viewer_device=user_agent.device.model or "N/A",
+        viewer_mobile=user_agent.is_mobile or False,
+        is_bot=user_agent.is_bot or False,
+    )
+
+def parser_version():
+    """Saved caches are only reused with the parser versions that produced them"""
+    try:
+        return f"{version('ua-parser')}/{version('user-agents')}"
+    except PackageNotFoundError:
+        return "unknown"
+
+class UserAgentCache:
+    """Bounded LRU cache of parsed user agent strings, optionally saved to disk between runs.
+    The same few hundred strings repeat across the whole catalog, so most lookups skip the regex matching."""
+
+    def __init__(self, maxsize=10000, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.entries = OrderedDict()
+        # {ParsedUserAgent: UserAgentProfile pk}, only kept for the run since ids differ between databases
+        self.profiles = {}
+        self.hits = 0
+        self.misses = 0
+
+        if path:
+            self.load()
+
+    def get(self, ua_string):
+        parsed = self.entries.get(ua_string)
+        if parsed is not None:
+            self.hits += 1
+            self.entries.move_to_end(ua_string)
+            return parsed
+
+        self.misses += 1
+        parsed = parse_user_agent(ua_string)
+        self.entries[ua_string] = parsed
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return parsed
+
+    def get_many(self, ua_strings):
+        """Returns {ua_string: ParsedUserAgent}, parsing each distinct string at most once"""
+        return {ua_string: self.get(ua_string) for ua_string in dict.fromkeys(ua_strings)}
+
+    def profile_ids(self, parsed_agents):
+        """Returns {ParsedUserAgent: UserAgentProfile pk}, creating the profiles that aren't stored yet"""
+        parsed_agents = list(dict.fromkeys(parsed_agents))
+        missing = [parsed for parsed in parsed_agents if parsed not in self.profiles]
+        if missing:
+            # Another worker may be creating the same profiles, so conflicts are skipped and the ids read back
+            UserAgentProfile.objects.bulk_create(
+                [UserAgentProfile(**parsed._asdict()) for parsed in missing], ignore_conflicts=True
+            )
+            query = Q()
+            for parsed in missing:
+                query |= Q(**parsed._asdict())
+            for pk, *fields in UserAgentProfile.objects.filter(query).values_list("pk", *ParsedUserAgent._fields):
+                self.profiles[ParsedUserAgent(*fields)] = pk
+        return {parsed: self.profiles[parsed] for parsed in parsed_agents}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable user agent cache {self.path}: {e}")
+            return
+
+        if saved.get("parser_version") != parser_version():
+            return
+        for ua_string, fields in saved.get("entries", [])[-self.maxsize:]:
+            self.entries[ua_string] = ParsedUserAgent(*fields)
+
+    def save(self):
+        if not self.path:
+            return
+        # Write to a temporary file first so a killed run can't leave a truncated cache behind
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "parser_version": parser_version(),
+                "entries": [[ua_string, list(parsed)] for ua_string, parsed in self.entries.items()],
+            }, f)
+        os.replace(tmp_path, self.path)
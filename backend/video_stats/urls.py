@@ -4,6 +4,9 @@ from .views import *
 urlpatterns = [
     path('', VideoListView.as_view(), name='videos'),
     path('stats/', VideoStatsListView.as_view(), name='stats_all'),
+    path('stats/rollups/', DashboardRollupView.as_view(), name='stats_rollups'),
+    path('stats/summary/', VideoSummaryView.as_view(), name='stats_summary'),
+    path('search/', TitleSearchView.as_view(), name='search'),
     path('<int:video_id>/stats/', VideoStatsByVideoView.as_view(), name='video_stats'),
     path('export/<int:video_id>/', VideoToJsonExportView.as_view(), name='export_video'),
     path('interactions/', InteractionStatsListView.as_view(), name='interactions_all'),
@@ -13,6 +16,7 @@ urlpatterns = [
     path('export/monthly_views/<str:startMonth>/<str:endMonth>/', ViewsByMonthFilteredExportView.as_view(), name='export_by_month'),
     path('<int:video_id>/export/monthly_views/<str:startMonth>/<str:endMonth>/', ViewsByMonthSingleExportView.as_view(), name='export_by_month_all'),
     path('monthly_views/past_two_months/', PastTwoMonthsPerformanceView.as_view(), name='past_two_months_performance'),
+    path('monthly_views/summary/<str:startMonth>/<str:endMonth>/', MonthlyViewsSummaryView.as_view(), name='monthly_views_summary'),
     path('view_sessions/', ViewSessionListView.as_view(), name='view_sessions_all'),
     path('<int:video_id>/view_sessions/', ViewSessionByVideoView.as_view(), name='video_view_sessions'),
     path('questions/', QuestionStatsListView.as_view(), name='questions_all'),
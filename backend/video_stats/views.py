@@ -3,39 +3,99 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .pagination import ViewPagination
-from django.http import HttpResponse, JsonResponse
+from .filters import ListFilter, parse_bool
+from .search import MAX_SEARCH_LIMIT, SEARCH_LIMIT, search_titles
+from .fast_serializers import ValuesListMixin, values_plan
+from django.http import JsonResponse
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
-from django.http import StreamingHttpResponse
-from django.utils.encoding import smart_str
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.db.models import Case, Count, F, FilteredRelation, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, NullIf, Round
 from calendar import monthrange
 from .models import Video
 from .serializers import *
-from io import StringIO
+from .hihaho_client import HihahoAPIError, get_interactive_client
+from .export_cache import CHUNK_SIZE, cached_export, export_key, stream_and_cache
+from itertools import groupby
+from operator import itemgetter
 import warnings
-import requests
 import csv
-import json
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
-token = os.getenv('API_KEY')
-BASE_URL = "https://api.hihaho.com/v2"
-headers = {"Authorization": f"Bearer {token}"}
-
-class VideoListView(generics.ListAPIView):
+# Filters shared by the list views of rows belonging to a video, see ListFilter
+VIDEO_CHOICE_FIELDS = {
+    "video": ("video__video_id", int),
+    "folder": ("video__folder_number", int),
+    "status": ("video__status", int),
+}
+
+class InteractionFilters:
+    filter_backends = [ListFilter]
+    search_fields = ("title", "type", "action_type")
+    search_id_field = "interaction_id"
+    date_field = "created_at"
+    range_fields = {
+        "clicks": ("total_clicks", int),
+        "duration": ("duration_seconds", float),
+        "start_time": ("start_time_seconds", float),
+    }
+    choice_fields = {**VIDEO_CHOICE_FIELDS, "type": ("type", str), "action_type": ("action_type", str)}
+    ordering_fields = {
+        "clicks": "total_clicks",
+        "title": "title",
+        "type": "type",
+        "action_type": "action_type",
+        "start_time": "start_time_seconds",
+        "duration": "duration_seconds",
+        "created": "created_at",
+    }
+
+class QuestionFilters:
+    filter_backends = [ListFilter]
+    search_fields = ("search_title", "type")
+    search_id_field = "question_id"
+    date_field = "created_at"
+    range_fields = {
+        "answered": ("total_answered", int),
+        "answer_time": ("average_answer_time_seconds", float),
+        "video_time": ("video_time_seconds", float),
+    }
+    choice_fields = {**VIDEO_CHOICE_FIELDS, "type": ("type", str)}
+    ordering_fields = {
+        "answered": "total_answered",
+        "correct": "total_correctly_answered",
+        "answer_time": "average_answer_time_seconds",
+        "video_time": "video_time_seconds",
+        "title": "title",
+        "type": "type",
+        "created": "created_at",
+    }
+
+class ViewSessionFilters:
+    filter_backends = [ListFilter]
+    search_fields = ("profile__viewer_os", "profile__viewer_browser")
+    range_fields = {"viewers": ("viewer_count", int)}
+    choice_fields = {
+        **VIDEO_CHOICE_FIELDS,
+        "mobile": ("profile__viewer_mobile", parse_bool),
+        "bot": ("profile__is_bot", parse_bool),
+        "os": ("profile__viewer_os", str),
+        "browser": ("profile__viewer_browser", str),
+    }
+    ordering_fields = {"viewers": "viewer_count", "os": "profile__viewer_os", "browser": "profile__viewer_browser"}
+
+class VideoListView(ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     queryset = Video.objects.all()
     serializer_class = VideoSerializer
 
-class VideoStatsListView(generics.ListAPIView):
+class VideoStatsListView(ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     queryset = VideoStats.objects.all()
     serializer_class = VideoStatsSerializer
 
-class VideoStatsByVideoView(generics.ListAPIView):
+class VideoStatsByVideoView(ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = VideoStatsSerializer
     
@@ -47,27 +107,37 @@ class VideoToJsonExportView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, video_id):
-        api_response = requests.get(f"{BASE_URL}/video/{video_id}/export", headers=headers)
+        filename = f"video_data_{video_id}.json"
+        key = export_key(video_id)
+        path = cached_export(video_id, key) if key else None
+        if path:
+            return FileResponse(open(path, "rb"), as_attachment=True, filename=filename, content_type='application/json')
+
+        try:
+            api_response = get_interactive_client().get(f"/video/{video_id}/export", stream=True)
+        except HihahoAPIError:
+            return JsonResponse({"error": "Failed to fetch JSON data to export"}, status=500)
 
         if api_response.status_code != 200:
+            api_response.close()
             return JsonResponse({"error": "Failed to fetch JSON data to export"}, status=500)
-        
-        data = api_response.json()
 
-        response = HttpResponse(
-            json.dumps(data, indent=2),
-            content_type='application/json'
-        )
-        response['Content-Disposition'] = f'attachment; filename="video_data_{video_id}.json"'
+        # The body is passed through as it arrives instead of being parsed and re-serialized
+        if key:
+            body = stream_and_cache(api_response, video_id, key)
+        else:
+            body = api_response.iter_content(CHUNK_SIZE)
+        response = StreamingHttpResponse(body, content_type='application/json')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
-class InteractionStatsListView(generics.ListAPIView):
+class InteractionStatsListView(InteractionFilters, ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
-    queryset = InteractionStats.objects.all().order_by('-total_clicks')
+    queryset = InteractionStats.objects.all().order_by('-total_clicks', 'id')
     serializer_class = InteractionStatsSerializer
     pagination_class = ViewPagination
 
-class InteractionStatsByVideoView(generics.ListAPIView):
+class InteractionStatsByVideoView(InteractionFilters, ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = InteractionStatsSerializer
 
@@ -75,13 +145,13 @@ class InteractionStatsByVideoView(generics.ListAPIView):
         video_id = self.kwargs["video_id"]
         return InteractionStats.objects.filter(video__video_id=video_id)
 
-class MonthlyViewsListView(generics.ListAPIView):
+class MonthlyViewsListView(ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
-    queryset = MonthlyViews.objects.all()
+    queryset = MonthlyViews.objects.all().order_by('id')
     serializer_class = MonthlyViewsSerializer
     pagination_class = ViewPagination
 
-class MonthlyViewsByVideoView(generics.ListAPIView):
+class MonthlyViewsByVideoView(ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = MonthlyViewsSerializer
 
@@ -95,6 +165,22 @@ class Echo:
     def write(self, value):
         return value
         
+def end_of_month(month):
+    """Last second of the month starting at the given date, in the default timezone"""
+    last_day = monthrange(month.year, month.month)[1]
+    return timezone.make_aware(
+        datetime(month.year, month.month, last_day, 23, 59, 59),
+        timezone.get_default_timezone()
+    )
+
+def monthly_totals_by_video(start_month, end_month):
+    """Yields (video_id, {month: total_views}) for every video with views between the two months, ordered by video_id"""
+    rows = MonthlyViews.objects.filter(
+        month__range=(start_month, end_month)
+    ).order_by("video__video_id").values_list("video__video_id", "month", "total_views")
+    for video_id, group in groupby(rows.iterator(), key=itemgetter(0)):
+        yield video_id, {month: total_views for _, month, total_views in group}
+
 class ViewsByMonthFilteredExportView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -115,11 +201,11 @@ class ViewsByMonthFilteredExportView(APIView):
             startDate = date(start_year, start_month, 1)
             endDate = date(end_year, end_month, 1)
 
-            y_m_months_list = []
+            months_list = []
             current_date = startDate
 
             while current_date <= endDate:
-                y_m_months_list.append(current_date.strftime('%Y-%m'))
+                months_list.append(current_date)
                 current_date += relativedelta(months=1)
 
             def row_generator():
@@ -132,27 +218,21 @@ class ViewsByMonthFilteredExportView(APIView):
                 # Header
                 yield writer.writerow(["Month", "Video ID", "Video title", "Total Views"])
 
+                # Both are ordered by video id, so the views of the range are read in one query alongside the videos
+                totals = monthly_totals_by_video(startDate, endDate)
+                current = next(totals, None)
                 for video in videos.iterator():
-                    for y_m_month in y_m_months_list:
-                        year, month = map(int, y_m_month.split('-'))
-                        last_day = monthrange(year, month)[1]
-                        end_of_month = timezone.make_aware(
-                            datetime(year, month, last_day, 23, 59, 59),
-                            timezone.get_default_timezone()
-                        )
-
-                        if video.created_date <= end_of_month:
-                            month_stats = MonthlyViews.objects.filter(
-                                video__video_id=video.video_id, month=y_m_month
-                            ).first()
-
-                            total_views = month_stats.total_views if month_stats else 0
+                    while current and current[0] < video.video_id:
+                        current = next(totals, None)
+                    video_totals = current[1] if current and current[0] == video.video_id else {}
 
+                    for month in months_list:
+                        if video.created_date <= end_of_month(month):
                             yield writer.writerow([
-                                y_m_month,
+                                month.strftime('%Y-%m'),
                                 video.video_id,
                                 video.title,
-                                total_views
+                                video_totals.get(month, 0)
                             ])
 
             # Streaming response so that the frontend worker doesn't time out on deployed version
@@ -188,13 +268,17 @@ class ViewsByMonthSingleExportView(APIView):
             startDate = date(start_year, start_month, 1)
             endDate = date(end_year, end_month, 1)
 
-            y_m_months_list = []
+            months_list = []
             current_date = startDate
 
             while current_date <= endDate:
-                y_m_months_list.append(current_date.strftime('%Y-%m'))
+                months_list.append(current_date)
                 current_date += relativedelta(months=1)
 
+            video_totals = dict(MonthlyViews.objects.filter(
+                video=video, month__range=(startDate, endDate)
+            ).values_list("month", "total_views"))
+
             def row_generator():
                 # BOM for Excel to handle Japanese text
                 yield "\ufeff"
@@ -205,26 +289,13 @@ class ViewsByMonthSingleExportView(APIView):
                 # Header
                 yield writer.writerow(["Month", "Video ID", "Video title", "Total Views"])
 
-                for y_m_month in y_m_months_list:
-                    year, month = map(int, y_m_month.split('-'))
-                    last_day = monthrange(year, month)[1]
-                    end_of_month = timezone.make_aware(
-                        datetime(year, month, last_day, 23, 59, 59),
-                        timezone.get_default_timezone()
-                    )
-
-                    if video.created_date <= end_of_month:
-                        month_stats = MonthlyViews.objects.filter(
-                            video__video_id=video.video_id, month=y_m_month
-                        ).first()
-
-                        total_views = month_stats.total_views if month_stats else 0
-
+                for month in months_list:
+                    if video.created_date <= end_of_month(month):
                         yield writer.writerow([
-                            y_m_month,
+                            month.strftime('%Y-%m'),
                             video.video_id,
                             video.title,
-                            total_views
+                            video_totals.get(month, 0)
                         ])
 
             # Streaming response so that the frontend worker doesn't time out on deployed version
@@ -240,37 +311,203 @@ class ViewsByMonthSingleExportView(APIView):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
-class PastTwoMonthsPerformanceView(APIView):
+SUMMARY_FIELDS = ("total_views", "started_views", "finished_views", "passed_views", "failed_views")
+# Group by option: (values() lookups, names they are returned under)
+SUMMARY_GROUPS = {
+    "overall": ((), ()),
+    "video": (("video__video_id", "video__title"), ("video_id", "title")),
+    "folder": (("video__folder_number", "video__folder_name"), ("folder_number", "folder_name")),
+}
+
+class MonthlyViewsSummaryView(APIView):
+    """Sums the monthly views between two 'YYYY-MM' months, inclusive, overall or per video or folder.
+    ?video_id= and ?folder= narrow it down to one video or folder."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, startMonth, endMonth):
+        group_by = request.query_params.get("group_by", "overall")
+        if group_by not in SUMMARY_GROUPS:
+            return Response({"error": f"group_by must be one of {', '.join(SUMMARY_GROUPS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start_year, start_month = map(int, startMonth.split('-'))
+            end_year, end_month = map(int, endMonth.split('-'))
+            startDate = date(start_year, start_month, 1)
+            endDate = date(end_year, end_month, 1)
+            video_id = int(request.query_params["video_id"]) if request.query_params.get("video_id") else None
+            folder = int(request.query_params["folder"]) if request.query_params.get("folder") else None
+        except ValueError:
+            return Response({"error": "Months must look like YYYY-MM, video_id and folder must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = MonthlyViews.objects.filter(month__range=(startDate, endDate))
+        if video_id is not None:
+            queryset = queryset.filter(video__video_id=video_id)
+        if folder is not None:
+            queryset = queryset.filter(video__folder_number=folder)
+
+        totals = {field: Coalesce(Sum(field), 0) for field in SUMMARY_FIELDS}
+        lookups, names = SUMMARY_GROUPS[group_by]
+        if not lookups:
+            results = [queryset.aggregate(**totals)]
+        else:
+            results = [
+                {**{name: row.pop(lookup) for lookup, name in zip(lookups, names)}, **row}
+                for row in queryset.values(*lookups).annotate(**totals).order_by(*lookups)
+            ]
+
+        return Response({
+            "start_month": startDate.strftime('%Y-%m'),
+            "end_month": endDate.strftime('%Y-%m'),
+            "group_by": group_by,
+            "results": results,
+        })
+
+class DashboardRollupView(APIView):
+    """Global, per-folder and per-status VideoStats totals, precomputed by the last fetch"""
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        today = datetime.today()
-        last_month = (today.replace(day=1) - relativedelta(months=1)).strftime('%Y-%m')
-        two_months_ago = (today.replace(day=1) - relativedelta(months=2)).strftime('%Y-%m')
+        rollups = {"global": None, "folder": [], "status": []}
+        for rollup in DashboardRollup.objects.order_by("scope", "key"):
+            data = DashboardRollupSerializer(rollup).data
+            if rollup.scope == "global":
+                rollups["global"] = data
+            else:
+                rollups[rollup.scope].append(data)
+        return Response({"global": rollups["global"], "folders": rollups["folder"], "statuses": rollups["status"]})
+
+RATING_FIELDS = ("one_star", "two_star", "three_star", "four_star", "five_star")
+VIDEO_SUMMARY_TOTALS = ("total_views", "started_views", "finished_views", "interaction_clicks")
+
+def video_summary_queryset(today=None):
+    """VideoStats annotated with the video's rating breakdown, its views in the last two complete months,
+    the change between them in percent and the share of views that were started, all in one query.
+    Like the Summary page, a 0 average rating counts as no rating (-1)."""
+    this_month = (today or date.today()).replace(day=1)
+    ratings = VideoRating.objects.filter(video=OuterRef("video")).order_by("id")
+
+    def views_in(month):
+        return Coalesce(Subquery(
+            MonthlyViews.objects.filter(video=OuterRef("video"), month=month).values("total_views")[:1]
+        ), 0)
+
+    return VideoStats.objects.annotate(
+        average_rating=Coalesce(NullIf(Subquery(ratings.values("average_rating")[:1]), Value(0.0)), Value(-1.0)),
+        **{field: Coalesce(Subquery(ratings.values(field)[:1]), 0) for field in RATING_FIELDS},
+        views_last_month=views_in(this_month - relativedelta(months=1)),
+        views_two_months_ago=views_in(this_month - relativedelta(months=2)),
+    ).annotate(
+        view_change_percent=Case(
+            When(views_two_months_ago=0, views_last_month__gt=0, then=Value(100.0)), # Created last month
+            When(views_two_months_ago=0, then=Value(0.0)),
+            default=Round((F("views_last_month") - F("views_two_months_ago")) * 100.0 / F("views_two_months_ago"), 2),
+            output_field=FloatField(),
+        ),
+        view_rate=Case(
+            When(total_views__gt=0, then=Round(F("started_views") * 100.0 / F("total_views"))),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+
+class VideoSummaryView(APIView):
+    """Everything the Summary page shows per video, plus totals over the filtered videos.
+    Filters: ?start_date= and ?end_date= (YYYY-MM-DD, on the video's creation date),
+    ?folder= and ?status= (repeatable), ?min_views= (total views threshold)."""
+    permission_classes = [IsAuthenticated]
+    renderer_classes = ValuesListMixin.renderer_classes
 
-        dict = {}
-        videos = Video.objects.all()
+    def get(self, request):
+        params = request.query_params
+        try:
+            start_date = date.fromisoformat(params["start_date"]) if params.get("start_date") else None
+            end_date = date.fromisoformat(params["end_date"]) if params.get("end_date") else None
+            folders = [int(folder) for folder in params.getlist("folder")]
+            statuses = [int(video_status) for video_status in params.getlist("status")]
+            min_views = int(params.get("min_views") or 0)
+        except ValueError:
+            return Response(
+                {"error": "Dates must look like YYYY-MM-DD, folder, status and min_views must be numbers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        for video in videos:
-            video_id = str(video.video_id)
+        queryset = VideoStats.objects.filter(total_views__gte=min_views)
+        if start_date:
+            queryset = queryset.filter(video__created_date__gte=timezone.make_aware(datetime.combine(start_date, datetime.min.time())))
+        if end_date:
+            queryset = queryset.filter(video__created_date__lte=timezone.make_aware(datetime.combine(end_date, datetime.max.time())))
+        if folders:
+            queryset = queryset.filter(video__folder_number__in=folders)
+        if statuses:
+            queryset = queryset.filter(video__status__in=statuses)
+
+        totals = queryset.aggregate(num_videos=Count("id"), **{field: Coalesce(Sum(field), 0) for field in VIDEO_SUMMARY_TOTALS})
+        plan = values_plan(VideoSummarySerializer)
+        videos = video_summary_queryset().filter(pk__in=queryset.values("pk")).order_by("video__title", "video__video_id")
+        return Response({
+            "totals": totals,
+            "results": [plan.row(values) for values in videos.values_list(*plan.lookups)],
+        })
+
+# ?type= option: (model, serializer of its results)
+TITLE_SEARCH_TYPES = {
+    "videos": (Video, VideoSerializer),
+    "questions": (QuestionStats, QuestionStatsSerializer),
+}
+
+class TitleSearchView(APIView):
+    """Ranked search of video and question titles, best match first, on their plain-text search_title.
+    ?q= holds the words or "quoted strings" to look for, ?type= narrows it to videos or questions (repeatable)
+    and ?limit= caps the results per type."""
+    permission_classes = [IsAuthenticated]
+    renderer_classes = ValuesListMixin.renderer_classes
 
-            views_last_month = MonthlyViews.objects.filter(video=video, month=last_month).first()
-            views_two_months_ago = MonthlyViews.objects.filter(video=video, month=two_months_ago).first()
+    def get(self, request):
+        types = request.query_params.getlist("type") or list(TITLE_SEARCH_TYPES)
+        if any(search_type not in TITLE_SEARCH_TYPES for search_type in types):
+            return Response({"error": f"type must be one of {', '.join(TITLE_SEARCH_TYPES)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get("limit") or SEARCH_LIMIT), 1), MAX_SEARCH_LIMIT)
+        except ValueError:
+            return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+        query = request.query_params.get("q", "")
+        results = {"query": query}
+        for search_type in types:
+            model, serializer_class = TITLE_SEARCH_TYPES[search_type]
+            ranked = search_titles(model, query, limit)
+            plan = values_plan(serializer_class)
+            rows = {values[-1]: plan.row(values) for values in model.objects.filter(
+                pk__in=[pk for _, pk in ranked]
+            ).values_list(*plan.lookups, "pk")}
+            results[search_type] = [{**rows[pk], "rank": rank} for rank, pk in ranked if pk in rows]
+        return Response(results)
+
+class PastTwoMonthsPerformanceView(APIView):
+    """Every video's views in the last two complete months, {video_id: [last month, two months ago]}"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        this_month = date.today().replace(day=1)
+        last_month = this_month - relativedelta(months=1)
+        two_months_ago = this_month - relativedelta(months=2)
 
-            count_last_month = views_last_month.total_views if views_last_month else 0
-            count_two_months_ago = views_two_months_ago.total_views if views_two_months_ago else 0
+        # One grouped query, the join only reaches the two months' rows and videos without them count 0 views
+        videos = Video.objects.annotate(
+            recent=FilteredRelation("monthlyviews", condition=Q(monthlyviews__month__in=[last_month, two_months_ago])),
+        ).values("video_id").annotate(
+            views_last_month=Coalesce(Sum("recent__total_views", filter=Q(recent__month=last_month)), 0),
+            views_two_months_ago=Coalesce(Sum("recent__total_views", filter=Q(recent__month=two_months_ago)), 0),
+        ).values_list("video_id", "views_last_month", "views_two_months_ago")
 
-            dict[video_id] = [count_last_month, count_two_months_ago]
+        return Response({str(video_id): [last, earlier] for video_id, last, earlier in videos})
 
-        return Response(dict)
-    
-class ViewSessionListView(generics.ListAPIView):
+class ViewSessionListView(ViewSessionFilters, ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
-    queryset = ViewSession.objects.all()
+    queryset = ViewSession.objects.all().order_by('id')
     serializer_class = ViewSessionSerializer
     pagination_class = ViewPagination
 
-class ViewSessionByVideoView(generics.ListAPIView):
+class ViewSessionByVideoView(ViewSessionFilters, ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = ViewSessionSerializer
 
@@ -278,13 +515,13 @@ class ViewSessionByVideoView(generics.ListAPIView):
         video_id = self.kwargs["video_id"]
         return ViewSession.objects.filter(video__video_id=video_id)
     
-class QuestionStatsListView(generics.ListAPIView):
+class QuestionStatsListView(QuestionFilters, ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
-    queryset = QuestionStats.objects.all().order_by('-total_answered')
+    queryset = QuestionStats.objects.all().order_by('-total_answered', 'id')
     serializer_class = QuestionStatsSerializer
     pagination_class = ViewPagination
 
-class QuestionStatsByVideoView(generics.ListAPIView):
+class QuestionStatsByVideoView(QuestionFilters, ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = QuestionStatsSerializer
 
@@ -292,13 +529,13 @@ class QuestionStatsByVideoView(generics.ListAPIView):
         video_id = self.kwargs["video_id"]
         return QuestionStats.objects.filter(video__video_id=video_id)
     
-class QuestionAnswerListView(generics.ListAPIView):
+class QuestionAnswerListView(ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
-    queryset = QuestionAnswer.objects.all().order_by('-answered_count')
+    queryset = QuestionAnswer.objects.all().order_by('-answered_count', 'id')
     serializer_class = QuestionAnswerSerializer
     pagination_class = ViewPagination
 
-class QuestionAnswersByQuestionView(generics.ListAPIView):
+class QuestionAnswersByQuestionView(ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = QuestionAnswerSerializer
 
@@ -306,12 +543,12 @@ class QuestionAnswersByQuestionView(generics.ListAPIView):
         question_id = self.kwargs["question_id"]
         return QuestionAnswer.objects.filter(question__question_id=question_id)
         
-class VideoRatingListView(generics.ListAPIView):
+class VideoRatingListView(ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     queryset = VideoRating.objects.all()
     serializer_class = VideoRatingSerializer
 
-class VideoRatingByVideoView(generics.ListAPIView):
+class VideoRatingByVideoView(ValuesListMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = VideoRatingSerializer
 